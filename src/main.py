@@ -3,7 +3,9 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, jsonify
+import click
+from datetime import date
+from flask import Flask, send_from_directory, jsonify, request
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
@@ -14,7 +16,7 @@ from src.routes.search_config import search_config_bp
 from src.routes.datajud import datajud_bp
 from src.routes.search_target import search_target_bp
 from src.routes.admin import admin_bp  # Novo blueprint administrativo
-from src.services.comunicapje_service import run_daily_searches
+from src.services import job_service
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -34,8 +36,37 @@ app.register_blueprint(admin_bp, url_prefix="/api")  # Registrar rotas administr
 
 @app.route("/api/run-comunicapje-search", methods=["POST"])
 def trigger_comunicapje_search():
-    run_daily_searches()
-    return jsonify({"message": "ComunicaPJE daily search triggered"}), 200
+    data = request.get_json(silent=True) or {}
+
+    # Backfill opcional: consulta todos os alvos a partir de data_inicio (YYYY-MM-DD)
+    data_inicio = None
+    if data.get("data_inicio"):
+        try:
+            data_inicio = date.fromisoformat(data["data_inicio"])
+        except (ValueError, TypeError):
+            return jsonify({"message": "data_inicio must be in YYYY-MM-DD format"}), 400
+
+    dias_por_janela = data.get("dias_por_janela")
+    if dias_por_janela is not None and (not isinstance(dias_por_janela, int) or dias_por_janela < 1):
+        return jsonify({"message": "dias_por_janela must be a positive integer"}), 400
+
+    job, active_job = job_service.enqueue_daily_search(app, data_inicio, dias_por_janela)
+    if job is None:
+        return jsonify({
+            "message": "ComunicaPJE daily search already running",
+            "job": active_job.to_dict() if active_job else None
+        }), 409
+
+    return jsonify({
+        "message": "ComunicaPJE daily search queued",
+        "job_id": job.id,
+        "status_url": f"/api/run-comunicapje-search/{job.id}"
+    }), 202
+
+@app.route("/api/run-comunicapje-search/<int:job_id>", methods=["GET"])
+def get_comunicapje_search_job(job_id):
+    job = SearchJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict()), 200
 
 # Configuração do banco de dados
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
@@ -46,14 +77,18 @@ db.init_app(app)
 from src.models.user import User
 from src.models.plan import Plan
 from src.models.subscription import Subscription
-from src.models.publication import Publication
-from src.models.search_config import SearchConfig
+from src.models.publication import Publication, PublicationArchive, PublicationCounter, PublicationMatch
+from src.models.search_config import SearchConfig, SearchConfigTerm
 from src.models.search_target import SearchTarget
 from src.models.admin import Admin
+from src.models.search_job import SearchJob, JobLease
+from src.models.process_snapshot import ProcessSnapshot, ProcessMovement
+from src.models.migrations import upgrade_schema
 
 # Criar tabelas
 with app.app_context():
     db.create_all()
+    upgrade_schema()
     
     # Criar admin padrão se não existir
     admin = Admin.query.filter_by(username='admin').first()
@@ -69,6 +104,28 @@ with app.app_context():
         db.session.commit()
         print("Admin padrão criado: admin / admin123")
 
+@app.cli.command("rebuild-publication-counters")
+def rebuild_publication_counters_command():
+    """Reconstrói os contadores de publicações do zero"""
+    from src.services.publication_counter_service import rebuild_counters
+    rows = rebuild_counters()
+    print(f"Contadores reconstruídos: {rows} linhas")
+
+@app.cli.command("compress-publication-content")
+def compress_publication_content_command():
+    """Comprime o conteúdo das publicações gravadas antes da compressão"""
+    from src.services.publication_storage_service import compress_legacy_content
+    compressed = compress_legacy_content()
+    print(f"Publicações comprimidas: {compressed} (rode VACUUM para reduzir o arquivo)")
+
+@app.cli.command("archive-publications")
+@click.option("--days", type=int, default=None, help="Idade mínima em dias (padrão: PUBLICATION_ARCHIVE_AFTER_DAYS)")
+def archive_publications_command(days):
+    """Move as publicações antigas para o arquivo morto"""
+    from src.services.publication_archive_service import archive_publications
+    result = archive_publications(older_than_days=days)
+    print(f"Publicações arquivadas: {result['archived']} (anteriores a {result['cutoff']})")
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
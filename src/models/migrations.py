@@ -0,0 +1,241 @@
+import sqlite3
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.publication import Publication
+from src.models.search_config import SearchConfigTerm
+from src.services.publication_counter_service import rebuild_counters
+from src.services.publication_search_service import index_new_publications
+
+# Colunas adicionadas depois da criação das tabelas: (tabela, coluna, definição SQL)
+NEW_COLUMNS = [
+    ('search_target', 'last_synced_date', 'DATE'),
+    ('publication', 'source_hash', 'VARCHAR(64)'),
+]
+
+# Índice de texto completo das publicações (FTS5 sem conteúdo, content=''). O
+# tokenizador unicode61 com remove_diacritics 2 ignora acentos, então "acordao"
+# encontra "acórdão". O índice guarda só os termos: o texto fica apenas em
+# publication, comprimido, e os trechos destacados da busca são montados a
+# partir da linha (ver publication_search_service). Como publication.content
+# fica comprimido, o texto é gravado no índice pela aplicação (ver
+# index_new_publications e o evento after_insert de Publication). A coluna
+# owner ('u<user_id>') permite restringir o MATCH às publicações de um usuário.
+#
+# Uma tabela sem conteúdo não aceita UPDATE, e só aceita DELETE a partir do
+# SQLite 3.43 (contentless_delete=1). Nas versões anteriores as publicações
+# excluídas continuam no índice e são descartadas pelo JOIN com publication
+# (os ids nunca são reaproveitados). Título e conteúdo não são editados pela
+# aplicação; edições feitas fora dela não chegam ao índice.
+FTS_CONTENTLESS_DELETE = sqlite3.sqlite_version_info >= (3, 43)
+PUBLICATION_FTS = f"""
+    CREATE VIRTUAL TABLE publication_fts USING fts5(
+        title, content, process_number, owner,
+        content='',{" contentless_delete=1," if FTS_CONTENTLESS_DELETE else ""}
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+# As publicações arquivadas continuam no índice (com o mesmo id) e saem dele
+# quando são excluídas do arquivo morto
+PUBLICATION_FTS_TRIGGERS = {
+    'publication_fts_ad': """
+    CREATE TRIGGER publication_fts_ad AFTER DELETE ON publication
+    WHEN NOT EXISTS (SELECT 1 FROM publication_archive WHERE id = old.id) BEGIN
+        DELETE FROM publication_fts WHERE rowid = old.id;
+    END
+    """,
+    'publication_fts_archive_ad': """
+    CREATE TRIGGER publication_fts_archive_ad AFTER DELETE ON publication_archive BEGIN
+        DELETE FROM publication_fts WHERE rowid = old.id;
+    END
+    """,
+} if FTS_CONTENTLESS_DELETE else {}
+
+# Soma (sinal '+') ou subtrai (sinal '-') a publicação da linha new/old nos
+# contadores do usuário e tribunal dela
+_COUNTER_DELTA = """
+        INSERT INTO publication_counter (user_id, tribunal, total, unread)
+        VALUES ({row}.user_id, COALESCE({row}.tribunal, ''), {sign}1, {sign}(COALESCE({row}.is_read, 0) = 0))
+        ON CONFLICT (user_id, tribunal) DO UPDATE
+        SET total = total + excluded.total, unread = unread + excluded.unread;"""
+
+def _counter_triggers(table):
+    return {
+        f'{table}_counter_ai': f"""
+    CREATE TRIGGER {table}_counter_ai AFTER INSERT ON {table} BEGIN
+        {_COUNTER_DELTA.format(row='new', sign='+')}
+    END
+    """,
+        f'{table}_counter_ad': f"""
+    CREATE TRIGGER {table}_counter_ad AFTER DELETE ON {table} BEGIN
+        {_COUNTER_DELTA.format(row='old', sign='-')}
+    END
+    """,
+        f'{table}_counter_au': f"""
+    CREATE TRIGGER {table}_counter_au AFTER UPDATE OF user_id, tribunal, is_read ON {table} BEGIN
+        {_COUNTER_DELTA.format(row='old', sign='-')}
+        {_COUNTER_DELTA.format(row='new', sign='+')}
+    END
+    """,
+    }
+
+# Triggers que mantêm publication_counter na mesma transação de cada escrita em
+# publication, inclusive UPDATE/DELETE em lote e inserções em SQL puro. O arquivo
+# morto também conta, então mover uma publicação para lá não altera os contadores.
+PUBLICATION_COUNTER_TRIGGERS = {
+    **_counter_triggers('publication'),
+    **_counter_triggers('publication_archive'),
+}
+
+# Remove as correspondências de publicações excluídas (as arquivadas já estão em
+# publication_archive quando saem de publication) e de configurações excluídas
+PUBLICATION_MATCH_TRIGGERS = {
+    'publication_match_publication_ad': """
+    CREATE TRIGGER publication_match_publication_ad AFTER DELETE ON publication
+    WHEN NOT EXISTS (SELECT 1 FROM publication_archive WHERE id = old.id) BEGIN
+        DELETE FROM publication_match WHERE publication_id = old.id;
+    END
+    """,
+    'publication_match_archive_ad': """
+    CREATE TRIGGER publication_match_archive_ad AFTER DELETE ON publication_archive BEGIN
+        DELETE FROM publication_match WHERE publication_id = old.id;
+    END
+    """,
+    'publication_match_config_ad': """
+    CREATE TRIGGER publication_match_config_ad AFTER DELETE ON search_config BEGIN
+        DELETE FROM publication_match WHERE config_id = old.id;
+    END
+    """,
+}
+
+# Colunas antigas de SearchConfig (texto separado por vírgula) e o tipo de termo de cada uma
+SEARCH_CONFIG_TERM_COLUMNS = {
+    'keywords': 'keyword',
+    'tribunals': 'tribunal',
+    'process_types': 'process_type',
+}
+
+def _migrate_search_config_terms(connection):
+    """Copia os termos das colunas antigas de search_config para search_config_term e limpa as colunas"""
+    # Depois da primeira migração os termos só são gravados em search_config_term,
+    # então não é preciso varrer search_config a cada inicialização
+    if connection.execute(text("SELECT 1 FROM search_config_term LIMIT 1")).first():
+        return
+
+    columns = ', '.join(SEARCH_CONFIG_TERM_COLUMNS)
+    pending = connection.execute(text(
+        f"SELECT id, {columns} FROM search_config WHERE "
+        + ' OR '.join(f'{column} IS NOT NULL' for column in SEARCH_CONFIG_TERM_COLUMNS)
+    )).mappings().all()
+
+    rows = []
+    for config in pending:
+        for column, kind in SEARCH_CONFIG_TERM_COLUMNS.items():
+            seen = set()
+            for value in (config[column] or '').split(','):
+                value = value.strip()
+                normalized = SearchConfigTerm.normalize_value(kind, value)
+                if not normalized or normalized in seen:
+                    continue
+                seen.add(normalized)
+                rows.append({'config_id': config['id'], 'kind': kind, 'value': value,
+                             'normalized': normalized, 'position': len(seen)})
+
+    if rows:
+        connection.execute(
+            sqlite_insert(SearchConfigTerm.__table__).on_conflict_do_nothing(
+                index_elements=['config_id', 'kind', 'normalized']
+            ),
+            rows
+        )
+    if pending:
+        connection.execute(
+            text(
+                "UPDATE search_config SET "
+                + ', '.join(f'{column} = NULL' for column in SEARCH_CONFIG_TERM_COLUMNS)
+                + " WHERE id IN :ids"
+            ).bindparams(bindparam('ids', expanding=True)),
+            {'ids': [config['id'] for config in pending]}
+        )
+
+def _rebuild_publication_autoincrement(connection):
+    """
+    Recria publication com AUTOINCREMENT, preservando os ids.
+
+    Sem AUTOINCREMENT o SQLite gera o próximo id a partir do maior id da tabela
+    e pode repetir o id de uma publicação já arquivada. Os triggers da tabela
+    saem junto com a tabela antiga e são recriados pelo restante de
+    upgrade_schema().
+    """
+    table = Publication.__table__
+    columns = ', '.join(column.name for column in table.columns)
+
+    connection.execute(text('ALTER TABLE publication RENAME TO publication_old'))
+    for index in table.indexes:
+        connection.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    table.create(connection)
+    connection.execute(text(
+        f'INSERT INTO publication ({columns}) SELECT {columns} FROM publication_old'
+    ))
+    connection.execute(text('DROP TABLE publication_old'))
+
+    # A sequência parte do maior id já usado, inclusive no arquivo morto
+    last_id = connection.execute(text(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM publication), 0),"
+        " COALESCE((SELECT MAX(id) FROM publication_archive), 0))"
+    )).scalar()
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'publication'"))
+    connection.execute(
+        text("INSERT INTO sqlite_sequence (name, seq) VALUES ('publication', :seq)"),
+        {'seq': last_id}
+    )
+
+def upgrade_schema():
+    """
+    Atualiza bancos já existentes com o que o db.create_all() não cobre.
+
+    O create_all() só cria tabelas que ainda não existem; colunas e índices novos
+    em tabelas antigas precisam ser adicionados aqui. Deve ser chamado logo após o
+    create_all().
+    """
+    inspector = inspect(db.engine)
+
+    with db.engine.begin() as connection:
+        for table, column, definition in NEW_COLUMNS:
+            existing = {c['name'] for c in inspector.get_columns(table)}
+            if column not in existing:
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {definition}'))
+
+        if db.engine.dialect.name == 'sqlite':
+            publication_sql = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'publication'")
+            ).scalar()
+            if 'AUTOINCREMENT' not in publication_sql.upper():
+                _rebuild_publication_autoincrement(connection)
+
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+        if db.engine.dialect.name == 'sqlite' and not connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'publication_fts'")
+        ).scalar():
+            connection.execute(text(PUBLICATION_FTS))
+            # Indexa as publicações que já existiam antes da criação da tabela
+            index_new_publications(connection)
+
+        if db.engine.dialect.name == 'sqlite':
+            existing = set(connection.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            ).scalars())
+            missing = [name for name in PUBLICATION_COUNTER_TRIGGERS if name not in existing]
+            for name in missing:
+                connection.execute(text(PUBLICATION_COUNTER_TRIGGERS[name]))
+            # Contadores criados agora partem das publicações que já existiam
+            if missing:
+                rebuild_counters(connection)
+            for name, statement in {**PUBLICATION_FTS_TRIGGERS, **PUBLICATION_MATCH_TRIGGERS}.items():
+                if name not in existing:
+                    connection.execute(text(statement))
+
+        _migrate_search_config_terms(connection)
@@ -0,0 +1,47 @@
+from src.models.user import db
+from datetime import datetime
+import json
+
+class ProcessSnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    process_number = db.Column(db.String(100), unique=True, nullable=False)
+    movement_count = db.Column(db.Integer, default=0)  # Movimentações conhecidas
+    last_refreshed_at = db.Column(db.DateTime)           # Última consulta ao DataJud
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ProcessSnapshot {self.process_number}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'process_number': self.process_number,
+            'movement_count': self.movement_count,
+            'last_refreshed_at': self.last_refreshed_at.isoformat() if self.last_refreshed_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class ProcessMovement(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    process_number = db.Column(db.String(100), nullable=False)
+    movement_key = db.Column(db.String(64), nullable=False)  # Hash do conteúdo da movimentação
+    movement_date = db.Column(db.String(40))                 # Data informada pelo DataJud
+    data = db.Column(db.Text)                                # Movimentação completa (JSON)
+    first_seen_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ux_process_movement_key', 'process_number', 'movement_key', unique=True),
+        db.Index('ix_process_movement_seen', 'process_number', 'first_seen_at'),
+    )
+
+    def __repr__(self):
+        return f'<ProcessMovement {self.process_number} {self.movement_date}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'process_number': self.process_number,
+            'movement_date': self.movement_date,
+            'data': json.loads(self.data) if self.data else None,
+            'first_seen_at': self.first_seen_at.isoformat() if self.first_seen_at else None
+        }
@@ -1,35 +1,175 @@
 from src.models.user import db
 from datetime import datetime
+from sqlalchemy import event, text
+from sqlalchemy.orm import deferred
+import zlib
 
-class Publication(db.Model):
+# Textos menores que isso são gravados sem compressão (o ganho não compensa)
+COMPRESS_MIN_BYTES = 256
+
+def decompress_text(value):
+    """Devolve o texto original de um valor gravado por CompressedText"""
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+class CompressedText(db.TypeDecorator):
+    """
+    Texto gravado comprimido com zlib (como BLOB). Valores antigos, gravados
+    como texto puro, continuam sendo lidos normalmente.
+    """
+    impl = db.Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        encoded = value.encode('utf-8')
+        if len(encoded) < COMPRESS_MIN_BYTES:
+            return value
+        return zlib.compress(encoded, 6)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+# Indexa o texto (sem compressão) de uma publicação no índice FTS (ver migrations.py).
+# A coluna owner guarda o token 'u<user_id>', que restringe a busca ao dono.
+PUBLICATION_FTS_INSERT = text(
+    "INSERT INTO publication_fts (rowid, title, content, process_number, owner)"
+    " VALUES (:id, :title, :content, :process_number, 'u' || :user_id)"
+)
+
+class PublicationSerializerMixin:
+    """Serialização comum a Publication e PublicationArchive"""
+
+    def to_dict(self, include_content=True):
+        data = {
+            'id': self.id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'tribunal': self.tribunal,
+            'publication_date': self.publication_date.isoformat() if self.publication_date else None,
+            'source_url': self.source_url,
+            'process_number': self.process_number,
+            'source_hash': self.source_hash,
+            'is_read': self.is_read,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+        if include_content:
+            data['content'] = self.content
+        return data
+
+class Publication(PublicationSerializerMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(500), nullable=False)
-    content = db.Column(db.Text)
+    # Comprimido no banco e carregado só quando acessado (listagens não usam)
+    content = deferred(db.Column(CompressedText))
     tribunal = db.Column(db.String(100))
     publication_date = db.Column(db.DateTime)
     source_url = db.Column(db.String(500))
     process_number = db.Column(db.String(100))
+    source_hash = db.Column(db.String(64))  # Hash da comunicação no ComunicaPJE
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # A mesma comunicação só é gravada uma vez por usuário
+        db.Index('ux_publication_user_source_hash', 'user_id', 'source_hash', unique=True),
+        # Caixa de entrada: paginação por (created_at, id), com ou sem filtro de lidas
+        db.Index('ix_publication_user_read_created', 'user_id', 'is_read', 'created_at'),
+        db.Index('ix_publication_user_created', 'user_id', 'created_at'),
+        # Ids nunca são reaproveitados: as publicações arquivadas mantêm o id original
+        {'sqlite_autoincrement': True},
+    )
+
     # Relacionamento
     user = db.relationship('User', backref=db.backref('publications', lazy=True))
 
     def __repr__(self):
         return f'<Publication {self.title[:50]}>'
 
+@event.listens_for(Publication, 'after_insert')
+def _index_inserted_publication(mapper, connection, target):
+    # Inserções em lote (sem ORM) são indexadas por index_new_publications
+    if connection.dialect.name == 'sqlite':
+        connection.execute(PUBLICATION_FTS_INSERT, {
+            'id': target.id, 'user_id': target.user_id, 'title': target.title,
+            'content': target.content, 'process_number': target.process_number,
+        })
+
+class PublicationArchive(PublicationSerializerMixin, db.Model):
+    """
+    Publicações antigas movidas para fora da tabela principal pelo job de
+    arquivamento. Mantêm o mesmo id que tinham em publication.
+    """
+    __tablename__ = 'publication_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title = db.Column(db.String(500), nullable=False)
+    content = deferred(db.Column(CompressedText))
+    tribunal = db.Column(db.String(100))
+    publication_date = db.Column(db.DateTime)
+    source_url = db.Column(db.String(500))
+    process_number = db.Column(db.String(100))
+    source_hash = db.Column(db.String(64))
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ux_publication_archive_user_source_hash', 'user_id', 'source_hash', unique=True),
+        db.Index('ix_publication_archive_user_read_created', 'user_id', 'is_read', 'created_at'),
+        db.Index('ix_publication_archive_user_created', 'user_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<PublicationArchive {self.title[:50]}>'
+
+    def to_dict(self, include_content=True):
+        data = super().to_dict(include_content)
+        data['archived'] = True
+        data['archived_at'] = self.archived_at.isoformat() if self.archived_at else None
+        return data
+
+class PublicationMatch(db.Model):
+    """
+    Configuração de pesquisa do dono que casou com uma publicação no momento da
+    gravação (ver search_config_matcher.record_matches). Continua valendo depois
+    que a publicação vai para o arquivo morto, já que o id é o mesmo.
+    """
+    __tablename__ = 'publication_match'
+
+    publication_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    config_id = db.Column(db.Integer, db.ForeignKey('search_config.id'), primary_key=True)
+    matched_keywords = db.Column(db.Text)  # Palavras-chave encontradas (JSON)
+
+    __table_args__ = (
+        # "Publicações que casaram com a configuração X", das mais novas para as mais antigas
+        db.Index('ix_publication_match_config', 'config_id', 'publication_id'),
+    )
+
+    def __repr__(self):
+        return f'<PublicationMatch {self.publication_id} {self.config_id}>'
+
+class PublicationCounter(db.Model):
+    """
+    Contadores de publicações por usuário e tribunal, mantidos por triggers no
+    banco (ver migrations.py). Somam publication e publication_archive.
+    Publicações sem tribunal ficam com tribunal ''.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    tribunal = db.Column(db.String(100), primary_key=True, default='')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    unread = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<PublicationCounter {self.user_id} {self.tribunal}>'
+
     def to_dict(self):
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'title': self.title,
-            'content': self.content,
-            'tribunal': self.tribunal,
-            'publication_date': self.publication_date.isoformat() if self.publication_date else None,
-            'source_url': self.source_url,
-            'process_number': self.process_number,
-            'is_read': self.is_read,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'tribunal': self.tribunal or None,
+            'total': self.total,
+            'unread': self.unread
         }
-
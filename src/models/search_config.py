@@ -1,31 +1,64 @@
 from src.models.user import db
+from src.utils.text import normalize
 from datetime import datetime
 
 class SearchConfig(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)  # Nome da configuração
-    keywords = db.Column(db.Text)  # Palavras-chave separadas por vírgula
-    tribunals = db.Column(db.Text)  # Tribunais separados por vírgula
-    process_types = db.Column(db.Text)  # Tipos de processo
+    # Colunas antigas (texto separado por vírgula); os termos agora ficam em
+    # SearchConfigTerm e upgrade_schema() migra e limpa estes valores
+    keywords = db.Column(db.Text)
+    tribunals = db.Column(db.Text)
+    process_types = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relacionamento
+    # Relacionamentos
     user = db.relationship('User', backref=db.backref('search_configs', lazy=True))
+    terms = db.relationship(
+        'SearchConfigTerm', lazy='selectin', cascade='all, delete-orphan',
+        order_by='SearchConfigTerm.position', back_populates='config'
+    )
 
     def __repr__(self):
         return f'<SearchConfig {self.name}>'
 
+    def get_terms(self, kind):
+        return [term.value for term in self.terms if term.kind == kind]
+
+    def get_normalized_terms(self, kind):
+        return {term.normalized for term in self.terms if term.kind == kind}
+
+    def set_terms(self, kind, values):
+        """Substitui os termos de um tipo, na ordem informada e sem repetições"""
+        kept = [term for term in self.terms if term.kind != kind]
+        # Termos que continuam são reaproveitados (o flush insere antes de remover,
+        # e recriar o mesmo termo violaria o índice único)
+        existing = {term.normalized: term for term in self.terms if term.kind == kind}
+        seen = set()
+        for value in values:
+            value = value.strip()
+            normalized = SearchConfigTerm.normalize_value(kind, value)
+            if not normalized or normalized in seen:
+                continue
+            seen.add(normalized)
+            term = existing.get(normalized) or SearchConfigTerm(kind=kind, normalized=normalized)
+            term.value = value
+            term.position = len(seen)
+            kept.append(term)
+        self.terms = kept
+        self.updated_at = datetime.utcnow()
+
     def get_keywords_list(self):
-        return [k.strip() for k in self.keywords.split(',') if k.strip()] if self.keywords else []
+        return self.get_terms('keyword')
 
     def get_tribunals_list(self):
-        return [t.strip() for t in self.tribunals.split(',') if t.strip()] if self.tribunals else []
+        return self.get_terms('tribunal')
 
     def get_process_types_list(self):
-        return [p.strip() for p in self.process_types.split(',') if p.strip()] if self.process_types else []
+        return self.get_terms('process_type')
 
     def to_dict(self):
         return {
@@ -40,3 +73,31 @@ class SearchConfig(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class SearchConfigTerm(db.Model):
+    """Palavra-chave, tribunal ou tipo de processo de uma configuração de pesquisa"""
+    KINDS = ('keyword', 'tribunal', 'process_type')
+
+    id = db.Column(db.Integer, primary_key=True)
+    config_id = db.Column(db.Integer, db.ForeignKey('search_config.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.String(500), nullable=False)       # Como o usuário digitou
+    normalized = db.Column(db.String(500), nullable=False)  # Chave de busca (ver normalize_value)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # "Configurações que observam o tribunal X / a palavra Y"
+        db.Index('ix_search_config_term_lookup', 'kind', 'normalized', 'config_id'),
+        db.Index('ux_search_config_term', 'config_id', 'kind', 'normalized', unique=True),
+    )
+
+    config = db.relationship('SearchConfig', back_populates='terms')
+
+    @staticmethod
+    def normalize_value(kind, value):
+        """Tribunais viram sigla sem espaços em maiúsculas; os demais, texto sem acentos"""
+        if kind == 'tribunal':
+            return ''.join(value.split()).upper()
+        return normalize(value)
+
+    def __repr__(self):
+        return f'<SearchConfigTerm {self.kind} {self.value}>'
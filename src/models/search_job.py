@@ -0,0 +1,45 @@
+from src.models.user import db
+from datetime import datetime
+import json
+
+class SearchJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    params = db.Column(db.Text)                            # Parâmetros da execução (JSON)
+    total_queries = db.Column(db.Integer, default=0)       # Consultas únicas previstas
+    processed_queries = db.Column(db.Integer, default=0)   # Consultas já concluídas
+    total_found = db.Column(db.Integer, default=0)         # Publicações encontradas
+    new_publications = db.Column(db.Integer, default=0)    # Publicações novas gravadas
+    errors = db.Column(db.Text)                            # Erros por alvo (JSON)
+    error_message = db.Column(db.Text)                     # Erro que interrompeu a execução
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<SearchJob {self.id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'params': json.loads(self.params) if self.params else {},
+            'total_queries': self.total_queries,
+            'processed_queries': self.processed_queries,
+            'total_found': self.total_found,
+            'new_publications': self.new_publications,
+            'errors': json.loads(self.errors) if self.errors else [],
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class JobLease(db.Model):
+    """Trava com prazo de validade que impede duas execuções simultâneas do mesmo job."""
+    name = db.Column(db.String(100), primary_key=True)
+    job_id = db.Column(db.Integer)
+    expires_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<JobLease {self.name} job:{self.job_id}>'
@@ -9,6 +9,7 @@ class SearchTarget(db.Model):
     oab_uf = db.Column(db.String(2), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_synced_date = db.Column(db.Date)  # Último dia já sincronizado com o ComunicaPJE
 
     def __repr__(self):
         return f"<SearchTarget {self.oab_uf}{self.oab_number} for User {self.user.username}>"
@@ -20,6 +21,7 @@ class SearchTarget(db.Model):
             'oab_number': self.oab_number,
             'oab_uf': self.oab_uf,
             'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_synced_date': self.last_synced_date.isoformat() if self.last_synced_date else None
         }
 
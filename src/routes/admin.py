@@ -5,6 +5,9 @@ from src.models.plan import Plan
 from src.models.subscription import Subscription
 from src.models.search_target import SearchTarget
 from src.models.publication import Publication
+from src.services.upstream import gateway
+from src.services.publication_counter_service import rebuild_counters
+from src.services.publication_archive_service import archive_publications
 from datetime import datetime
 import jwt
 import os
@@ -285,7 +288,7 @@ def get_publications():
     
     result = []
     for pub in publications.items:
-        pub_dict = pub.to_dict()
+        pub_dict = pub.to_dict(include_content=False)
         pub_dict['user'] = pub.user.to_dict()
         result.append(pub_dict)
     
@@ -296,6 +299,31 @@ def get_publications():
         'current_page': page
     })
 
+@admin_bp.route('/admin/system/upstream', methods=['GET'])
+@admin_required
+def get_upstream_status():
+    # Estado do limitador de vazão e dos disjuntores por host externo
+    return jsonify({'hosts': gateway.snapshot()})
+
+@admin_bp.route('/admin/system/publication-counters/rebuild', methods=['POST'])
+@admin_required
+def rebuild_publication_counters():
+    # Recalcula os contadores de publicações a partir da tabela publication
+    rows = rebuild_counters()
+    return jsonify({'message': 'Contadores reconstruídos com sucesso', 'rows': rows})
+
+@admin_bp.route('/admin/system/publications/archive', methods=['POST'])
+@admin_required
+def archive_old_publications():
+    # Move para o arquivo morto as publicações mais antigas que older_than_days
+    data = request.get_json(silent=True) or {}
+    older_than_days = data.get('older_than_days')
+    if older_than_days is not None and (not isinstance(older_than_days, int) or older_than_days < 0):
+        return jsonify({'message': 'older_than_days deve ser um inteiro não negativo'}), 400
+    
+    result = archive_publications(older_than_days=older_than_days)
+    return jsonify({'message': 'Publicações arquivadas com sucesso', **result})
+
 @admin_bp.route('/admin/system/backup', methods=['POST'])
 @admin_required
 def create_backup():
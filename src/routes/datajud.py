@@ -1,5 +1,8 @@
-from flask import Blueprint, jsonify, request
-from src.services.datajud_service import DataJudService
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from datetime import datetime, timezone
+import json
+from src.services.datajud_service import DataJudService, DataJudPageError, DATAJUD_BATCH_MAX
+from src.services import process_snapshot_service
 
 datajud_bp = Blueprint('datajud', __name__)
 datajud_service = DataJudService()
@@ -18,6 +21,22 @@ def search_processes():
     page = request.args.get('page', 1, type=int)
     size = request.args.get('size', 20, type=int)
     
+    # Modo streaming: percorre todas as páginas e devolve NDJSON (um processo por linha)
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        max_results = request.args.get('max_results', type=int)
+        if max_results is not None and max_results < 1:
+            return jsonify({'error': True, 'message': 'max_results deve ser maior que zero'}), 400
+        return _stream_processes(
+            max_results=max_results,
+            size=request.args.get('size', type=int),
+            numero_processo=numero_processo,
+            tribunal=tribunal,
+            classe=classe,
+            assunto=assunto,
+            data_inicio=data_inicio,
+            data_fim=data_fim
+        )
+    
     result = datajud_service.search_processes(
         numero_processo=numero_processo,
         tribunal=tribunal,
@@ -34,6 +53,33 @@ def search_processes():
     
     return jsonify(result)
 
+def _stream_processes(**kwargs):
+    def generate():
+        try:
+            for item in datajud_service.iter_processes(**kwargs):
+                yield json.dumps(item, ensure_ascii=False) + '\n'
+        except DataJudPageError as e:
+            # O status HTTP já foi enviado; o erro vai como última linha
+            yield json.dumps({'error': True, 'message': str(e)}, ensure_ascii=False) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@datajud_bp.route('/datajud/processes/batch', methods=['POST'])
+def get_processes_batch():
+    """Obtém detalhes de vários processos em uma única requisição"""
+    
+    data = request.get_json(silent=True) or {}
+    processo_ids = data.get('process_numbers')
+    
+    if not isinstance(processo_ids, list) or not all(isinstance(p, str) and p.strip() for p in processo_ids):
+        return jsonify({'error': True, 'message': 'process_numbers deve ser uma lista de números de processo'}), 400
+    if len(processo_ids) > DATAJUD_BATCH_MAX:
+        return jsonify({'error': True, 'message': f'Máximo de {DATAJUD_BATCH_MAX} processos por requisição'}), 400
+    
+    result = datajud_service.get_processes_details_batch([p.strip() for p in processo_ids])
+    
+    return jsonify(result)
+
 @datajud_bp.route('/datajud/processes/<processo_id>', methods=['GET'])
 def get_process_details(processo_id):
     """Obtém detalhes de um processo específico"""
@@ -56,6 +102,38 @@ def get_process_movements(processo_id):
     
     return jsonify(result)
 
+@datajud_bp.route('/datajud/processes/<processo_id>/refresh', methods=['POST'])
+def refresh_process(processo_id):
+    """Atualiza o snapshot local do processo e retorna só as movimentações novas"""
+    
+    result = process_snapshot_service.refresh_process(datajud_service, processo_id)
+    
+    if result.get('error'):
+        return jsonify(result), 500
+    
+    return jsonify(result)
+
+@datajud_bp.route('/datajud/processes/<processo_id>/changes', methods=['GET'])
+def get_process_changes(processo_id):
+    """Retorna, do snapshot local, as movimentações vistas depois de `since`"""
+    
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({'error': True, 'message': 'since deve estar no formato ISO 8601'}), 400
+        if since.tzinfo:
+            # As datas são gravadas em UTC, sem fuso
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    result = process_snapshot_service.get_changes(processo_id, since)
+    
+    if result is None:
+        return jsonify({'error': True, 'message': 'Processo ainda não foi sincronizado'}), 404
+    
+    return jsonify(result)
+
 @datajud_bp.route('/datajud/tribunals', methods=['GET'])
 def get_tribunals():
     """Obtém lista de tribunais disponíveis"""
@@ -89,3 +167,32 @@ def get_process_subjects():
     
     return jsonify(result)
 
+
+@datajud_bp.route('/datajud/autocomplete', methods=['GET'])
+def autocomplete():
+    """Sugestões de tribunais, classes ou assuntos para o texto digitado"""
+    
+    kind = request.args.get('type', 'classes')
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    if kind not in ('tribunals', 'classes', 'subjects'):
+        return jsonify({'error': True, 'message': 'type deve ser tribunals, classes ou subjects'}), 400
+    
+    result = datajud_service.autocomplete(kind, query, limit)
+    
+    if result.get('error'):
+        return jsonify(result), 500
+    
+    return jsonify(result)
+
+@datajud_bp.route('/datajud/stats', methods=['GET'])
+def get_datajud_stats():
+    """Retorna estatísticas de uso da conexão com o DataJud"""
+    
+    return jsonify({
+        'connections': datajud_service.get_connection_stats(),
+        'reference_cache': datajud_service.reference_cache.get_stats(),
+        'details_cache': datajud_service.details_cache.get_stats(),
+        'coalescing': datajud_service.single_flight.get_stats()
+    })
@@ -1,7 +1,17 @@
-from flask import Blueprint, jsonify, request
-from src.models.publication import Publication, db
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context
+from sqlalchemy import and_, or_, select, tuple_
+from sqlalchemy.exc import OperationalError
+from src.models.publication import Publication, PublicationArchive, db
 from src.models.user import User
+from src.services.publication_search_service import search_publications
+from src.services.publication_counter_service import get_counters
+from src.services.publication_ingest_service import ingest_publications, IngestLimitError, DEDUP_FIELDS, INGEST_MAX_ROWS
+from src.services.search_config_matcher import record_matches
 from datetime import datetime
+import base64
+import csv
+import io
+import json
 
 publication_bp = Blueprint('publication', __name__)
 
@@ -9,7 +19,7 @@ publication_bp = Blueprint('publication', __name__)
 def get_publications():
     """Retorna todas as publicações"""
     publications = Publication.query.all()
-    return jsonify([publication.to_dict() for publication in publications])
+    return jsonify([publication.to_dict(include_content=False) for publication in publications])
 
 @publication_bp.route('/publications', methods=['POST'])
 def create_publication():
@@ -30,22 +40,152 @@ def create_publication():
     )
     
     db.session.add(publication)
+    db.session.flush()
+    record_matches([{
+        'id': publication.id, 'user_id': publication.user_id, 'title': publication.title,
+        'content': publication.content, 'tribunal': publication.tribunal,
+    }])
     db.session.commit()
     return jsonify(publication.to_dict()), 201
 
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def _read_ndjson(stream):
+    """Lê o corpo uma linha JSON por vez, sem carregá-lo inteiro; linhas inválidas viram (índice, erro)"""
+    index = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield (index, 'JSON inválido')
+        index += 1
+
+@publication_bp.route('/publications/bulk', methods=['POST'])
+def bulk_create_publications():
+    """Importa publicações em lote (array JSON ou NDJSON, uma publicação por linha)"""
+    dedup = request.args.get('dedup')
+    if dedup is not None and dedup not in DEDUP_FIELDS:
+        return jsonify({'error': f'dedup deve ser um de: {", ".join(DEDUP_FIELDS)}'}), 400
+    
+    if request.mimetype in NDJSON_MIMETYPES:
+        rows = _read_ndjson(request.stream)
+    else:
+        rows = request.get_json(silent=True)
+        if not isinstance(rows, list):
+            return jsonify({'error': 'Envie um array JSON ou NDJSON'}), 400
+    
+    try:
+        return jsonify(ingest_publications(rows, dedup=dedup, max_rows=INGEST_MAX_ROWS))
+    except IngestLimitError as e:
+        return jsonify({'error': str(e)}), 413
+
 @publication_bp.route('/publications/<int:publication_id>', methods=['GET'])
 def get_publication(publication_id):
-    """Retorna uma publicação específica"""
-    publication = Publication.query.get_or_404(publication_id)
+    """Retorna uma publicação específica (com include_archived, procura também no arquivo morto)"""
+    publication = db.session.get(Publication, publication_id)
+    if publication is None and _parse_bool(request.args.get('include_archived')):
+        publication = db.session.get(PublicationArchive, publication_id)
+    if publication is None:
+        return jsonify({'error': 'Publicação não encontrada'}), 404
     return jsonify(publication.to_dict())
 
+def _encode_cursor(publication):
+    created_at = publication.created_at.isoformat() if publication.created_at else None
+    payload = json.dumps([created_at, publication.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor):
+    created_at, publication_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return (datetime.fromisoformat(created_at) if created_at is not None else None), int(publication_id)
+
+def _after_cursor(model, created_at, publication_id):
+    """Publicações depois do cursor na ordem (created_at, id) decrescente, com created_at nulo no fim"""
+    if created_at is None:
+        return and_(model.created_at.is_(None), model.id < publication_id)
+    return or_(
+        tuple_(model.created_at, model.id) < tuple_(created_at, publication_id),
+        model.created_at.is_(None)
+    )
+
+def _parse_bool(value):
+    if value is None:
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+def _publication_models():
+    """Publicações recentes e, com include_archived, também as do arquivo morto"""
+    if _parse_bool(request.args.get('include_archived')):
+        return [Publication, PublicationArchive]
+    return [Publication]
+
+def _newest_first(publications, limit):
+    """Junta resultados das duas tabelas na ordem (created_at, id) decrescente"""
+    publications = sorted(
+        publications, key=lambda pub: (pub.created_at or datetime.min, pub.id), reverse=True
+    )
+    return publications[:limit]
+
+def _get_user_publications_by_cursor(user_id):
+    """
+    Paginação por cursor em (created_at, id): cada página custa o mesmo,
+    independente da profundidade. O total só é calculado se pedido.
+    """
+    cursor = request.args.get('cursor')
+    limit = min(max(request.args.get('limit', request.args.get('per_page', 20, type=int), type=int), 1), 100)
+    is_read = _parse_bool(request.args.get('is_read'))
+    include_total = _parse_bool(request.args.get('include_total'))
+    
+    if cursor:
+        try:
+            created_at, publication_id = _decode_cursor(cursor)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Cursor inválido'}), 400
+    
+    total = 0 if include_total else None
+    publications = []
+    for model in _publication_models():
+        query = model.query.filter_by(user_id=user_id)
+        if is_read is not None:
+            query = query.filter_by(is_read=is_read)
+        
+        if include_total:
+            total += query.count()
+        
+        if cursor:
+            query = query.filter(_after_cursor(model, created_at, publication_id))
+        
+        publications += query.order_by(
+            model.created_at.desc(), model.id.desc()
+        ).limit(limit + 1).all()
+    
+    publications = _newest_first(publications, limit + 1)
+    has_more = len(publications) > limit
+    publications = publications[:limit]
+    
+    return jsonify({
+        'publications': [pub.to_dict(include_content=False) for pub in publications],
+        'next_cursor': _encode_cursor(publications[-1]) if has_more else None,
+        'has_more': has_more,
+        'per_page': limit,
+        'total': total
+    })
+
 @publication_bp.route('/publications/user/<int:user_id>', methods=['GET'])
 def get_user_publications(user_id):
     """Retorna todas as publicações de um usuário"""
+    # Com o parâmetro cursor (vazio na primeira página) usa paginação por cursor
+    if 'cursor' in request.args:
+        return _get_user_publications_by_cursor(user_id)
+    
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     is_read = request.args.get('is_read', type=bool)
     
+    if _parse_bool(request.args.get('include_archived')):
+        return _get_user_publications_with_archive(user_id, page, per_page, is_read)
+    
     query = Publication.query.filter_by(user_id=user_id)
     
     if is_read is not None:
@@ -56,34 +196,291 @@ def get_user_publications(user_id):
     )
     
     return jsonify({
-        'publications': [pub.to_dict() for pub in publications.items],
+        'publications': [pub.to_dict(include_content=False) for pub in publications.items],
         'total': publications.total,
         'pages': publications.pages,
         'current_page': page,
         'per_page': per_page
     })
 
+def _get_user_publications_with_archive(user_id, page, per_page, is_read):
+    """Paginação por página sobre as publicações recentes e arquivadas juntas"""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    
+    total = 0
+    publications = []
+    for model in _publication_models():
+        query = model.query.filter_by(user_id=user_id)
+        if is_read is not None:
+            query = query.filter_by(is_read=is_read)
+        total += query.count()
+        # A página pedida está entre os primeiros page * per_page de cada tabela
+        publications += query.order_by(
+            model.created_at.desc(), model.id.desc()
+        ).limit(page * per_page).all()
+    
+    publications = _newest_first(publications, page * per_page)[(page - 1) * per_page:]
+    
+    return jsonify({
+        'publications': [pub.to_dict(include_content=False) for pub in publications],
+        'total': total,
+        'pages': -(-total // per_page),
+        'current_page': page,
+        'per_page': per_page
+    })
+
+@publication_bp.route('/publications/user/<int:user_id>/counters', methods=['GET'])
+def get_user_publication_counters(user_id):
+    """Retorna os contadores de publicações (total, não lidas e por tribunal)"""
+    return jsonify(get_counters(user_id))
+
+@publication_bp.route('/publications/user/<int:user_id>/search', methods=['GET'])
+def search_user_publications(user_id):
+    """Busca textual nas publicações de um usuário, com trechos destacados (com include_archived, também no arquivo morto)"""
+    User.query.get_or_404(user_id)
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    
+    try:
+        result = search_publications(
+            user_id, query, limit=limit, offset=offset,
+            include_total=_parse_bool(request.args.get('include_total')) or False,
+            include_archived=_parse_bool(request.args.get('include_archived')) or False
+        )
+    except OperationalError:
+        return jsonify({'error': 'Busca inválida'}), 400
+    
+    return jsonify({
+        'query': query,
+        'publications': result['results'],
+        'total': result['total'],
+        'limit': limit,
+        'offset': offset
+    })
+
+def _get_any_publication_or_404(publication_id):
+    # Os contadores somam o arquivo morto, então as alterações valem para as duas tabelas
+    publication = db.session.get(Publication, publication_id)
+    if publication is None:
+        publication = db.session.get(PublicationArchive, publication_id)
+    if publication is None:
+        abort(404)
+    return publication
+
 @publication_bp.route('/publications/<int:publication_id>/read', methods=['PUT'])
 def mark_as_read(publication_id):
-    """Marca uma publicação como lida"""
-    publication = Publication.query.get_or_404(publication_id)
+    """Marca uma publicação (recente ou arquivada) como lida"""
+    publication = _get_any_publication_or_404(publication_id)
     publication.is_read = True
     db.session.commit()
     return jsonify(publication.to_dict())
 
 @publication_bp.route('/publications/<int:publication_id>/unread', methods=['PUT'])
 def mark_as_unread(publication_id):
-    """Marca uma publicação como não lida"""
-    publication = Publication.query.get_or_404(publication_id)
+    """Marca uma publicação (recente ou arquivada) como não lida"""
+    publication = _get_any_publication_or_404(publication_id)
     publication.is_read = False
     db.session.commit()
     return jsonify(publication.to_dict())
 
 @publication_bp.route('/publications/<int:publication_id>', methods=['DELETE'])
 def delete_publication(publication_id):
-    """Remove uma publicação"""
-    publication = Publication.query.get_or_404(publication_id)
+    """Remove uma publicação, recente ou arquivada"""
+    publication = _get_any_publication_or_404(publication_id)
     db.session.delete(publication)
     db.session.commit()
     return '', 204
 
+
+# Tamanho dos blocos de ids em cada UPDATE/DELETE, abaixo do limite de
+# parâmetros por comando do SQLite
+BULK_IDS_CHUNK = 500
+
+def _filter_conditions(filters, model=Publication):
+    """
+    Condições para os filtros date_from/date_to (publication_date), tribunal e
+    is_read. Retorna (condições, erro).
+    """
+    conditions = []
+    try:
+        if filters.get('date_from'):
+            conditions.append(model.publication_date >= datetime.fromisoformat(filters['date_from']))
+        if filters.get('date_to'):
+            conditions.append(model.publication_date <= datetime.fromisoformat(filters['date_to']))
+    except (TypeError, ValueError):
+        return None, 'Datas devem estar no formato ISO'
+    if filters.get('tribunal'):
+        conditions.append(model.tribunal == filters['tribunal'])
+    if filters.get('is_read') is not None:
+        # Só booleanos JSON: bool("false") seria True
+        if not isinstance(filters['is_read'], bool):
+            return None, 'is_read deve ser true ou false'
+        conditions.append(model.is_read == filters['is_read'])
+    return conditions, None
+
+def _parse_bulk_request(data, model=Publication, confirm_all=False):
+    """
+    Monta os blocos de condições de uma operação em lote sobre a tabela de model
+
+    O corpo precisa de user_id e de ids, filter ou "all": true (filter vazio
+    também seleciona todas as publicações do usuário, mas com confirm_all isso
+    exige "all": true).
+    Retorna (blocos, erro).
+    """
+    if not isinstance(data, dict) or data.get('user_id') is None:
+        return None, 'Campo user_id é obrigatório'
+    if 'ids' not in data and 'filter' not in data and data.get('all') is not True:
+        return None, 'Informe ids, filter ou all'
+    
+    filters = data.get('filter') or {}
+    if not isinstance(filters, dict):
+        return None, 'filter deve ser um objeto'
+    conditions, error = _filter_conditions(filters, model)
+    if error:
+        return None, error
+    conditions.insert(0, model.user_id == data['user_id'])
+    
+    if 'ids' not in data:
+        if confirm_all and len(conditions) == 1 and data.get('all') is not True:
+            return None, 'filter vazio seleciona todas as publicações; envie "all": true para confirmar'
+        return [conditions], None
+    
+    ids = data['ids']
+    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+        return None, 'ids deve ser uma lista de inteiros'
+    ids = sorted(set(ids))
+    return [
+        conditions + [model.id.in_(ids[start:start + BULK_IDS_CHUNK])]
+        for start in range(0, len(ids), BULK_IDS_CHUNK)
+    ], None
+
+# Operações em lote valem também para o arquivo morto, que entra nos contadores
+BULK_MODELS = (Publication, PublicationArchive)
+
+def _bulk_set_read(is_read):
+    data = request.get_json(silent=True)
+    
+    # Só conta (e altera) as publicações que de fato mudam de estado
+    updated = 0
+    for model in BULK_MODELS:
+        chunks, error = _parse_bulk_request(data, model)
+        if error:
+            return jsonify({'error': error}), 400
+        for conditions in chunks:
+            updated += model.query.filter(*conditions, model.is_read != is_read).update(
+                {model.is_read: is_read}, synchronize_session=False
+            )
+    db.session.commit()
+    return jsonify({'updated': updated})
+
+@publication_bp.route('/publications/bulk/read', methods=['POST'])
+def bulk_mark_as_read():
+    """Marca como lidas as publicações selecionadas por ids ou filtro"""
+    return _bulk_set_read(True)
+
+@publication_bp.route('/publications/bulk/unread', methods=['POST'])
+def bulk_mark_as_unread():
+    """Marca como não lidas as publicações selecionadas por ids ou filtro"""
+    return _bulk_set_read(False)
+
+@publication_bp.route('/publications/bulk/delete', methods=['POST'])
+def bulk_delete_publications():
+    """Remove as publicações selecionadas por ids ou filtro (todas, só com "all": true)"""
+    data = request.get_json(silent=True)
+    
+    deleted = 0
+    for model in BULK_MODELS:
+        chunks, error = _parse_bulk_request(data, model, confirm_all=True)
+        if error:
+            return jsonify({'error': error}), 400
+        for conditions in chunks:
+            deleted += model.query.filter(*conditions).delete(synchronize_session=False)
+    db.session.commit()
+    return jsonify({'deleted': deleted})
+
+# Publicações lidas do banco por vez durante a exportação
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    'id', 'title', 'tribunal', 'publication_date', 'process_number',
+    'source_url', 'source_hash', 'is_read', 'created_at', 'content'
+]
+
+def _export_rows(user_id, filters, columns, models):
+    """
+    Percorre as publicações de cada tabela em lotes por id. Cada lote é uma
+    consulta curta, então a exportação não segura o banco enquanto o cliente
+    baixa a resposta.
+    """
+    for model in models:
+        conditions, _ = _filter_conditions(filters, model)
+        table = model.__table__
+        table_columns = [table.c[name] for name in columns]
+        last_id = 0
+        while True:
+            rows = db.session.execute(
+                select(*table_columns)
+                .where(table.c.user_id == user_id, *conditions, table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(EXPORT_BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                yield {
+                    name: value.isoformat() if isinstance(value, datetime) else value
+                    for name, value in zip(columns, row)
+                }
+            last_id = rows[-1][0]
+
+@publication_bp.route('/publications/user/<int:user_id>/export', methods=['GET'])
+def export_user_publications(user_id):
+    """Exporta as publicações de um usuário em NDJSON ou CSV, sem montar a resposta em memória"""
+    User.query.get_or_404(user_id)
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format deve ser ndjson ou csv'}), 400
+    
+    filters = {
+        'date_from': request.args.get('date_from'),
+        'date_to': request.args.get('date_to'),
+        'tribunal': request.args.get('tribunal'),
+        'is_read': _parse_bool(request.args.get('is_read'))
+    }
+    _, error = _filter_conditions(filters)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    include_content = _parse_bool(request.args.get('include_content'))
+    columns = EXPORT_COLUMNS if include_content is not False else EXPORT_COLUMNS[:-1]
+    rows = _export_rows(user_id, filters, columns, _publication_models())
+    
+    if export_format == 'ndjson':
+        def generate():
+            for row in rows:
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+        mimetype = 'application/x-ndjson'
+    else:
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow([row[name] for name in columns])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        mimetype = 'text/csv'
+    
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename=publications_{user_id}.{export_format}'
+    )
+    return response
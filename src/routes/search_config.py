@@ -1,9 +1,27 @@
-from flask import Blueprint, jsonify, request
-from src.models.search_config import SearchConfig, db
+import json
+from flask import Blueprint, abort, jsonify, request
+from src.models.search_config import SearchConfig, SearchConfigTerm, db
 from src.models.user import User
+from src.models.publication import Publication, PublicationArchive, PublicationMatch
+from src.services.search_config_matcher import get_matcher
 
 search_config_bp = Blueprint('search_config', __name__)
 
+# Campo do JSON -> tipo de termo
+TERM_FIELDS = {
+    'keywords': 'keyword',
+    'tribunals': 'tribunal',
+    'process_types': 'process_type',
+}
+
+def _term_values(value):
+    """Aceita lista ou texto separado por vírgula"""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return str(value).split(',')
+
 @search_config_bp.route('/search-configs', methods=['GET'])
 def get_search_configs():
     """Retorna todas as configurações de pesquisa"""
@@ -18,19 +36,13 @@ def create_search_config():
     # Verificar se o usuário existe
     user = User.query.get_or_404(data['user_id'])
     
-    # Converter listas para strings separadas por vírgula
-    keywords = ','.join(data.get('keywords', [])) if isinstance(data.get('keywords'), list) else data.get('keywords', '')
-    tribunals = ','.join(data.get('tribunals', [])) if isinstance(data.get('tribunals'), list) else data.get('tribunals', '')
-    process_types = ','.join(data.get('process_types', [])) if isinstance(data.get('process_types'), list) else data.get('process_types', '')
-    
     config = SearchConfig(
         user_id=data['user_id'],
         name=data['name'],
-        keywords=keywords,
-        tribunals=tribunals,
-        process_types=process_types,
         is_active=data.get('is_active', True)
     )
+    for field, kind in TERM_FIELDS.items():
+        config.set_terms(kind, _term_values(data.get(field)))
     
     db.session.add(config)
     db.session.commit()
@@ -48,6 +60,32 @@ def get_user_search_configs(user_id):
     configs = SearchConfig.query.filter_by(user_id=user_id).all()
     return jsonify([config.to_dict() for config in configs])
 
+@search_config_bp.route('/search-configs/lookup', methods=['GET'])
+def lookup_search_configs():
+    """
+    Configurações que observam um termo: ?tribunal=TJSP, ?keyword=... ou
+    ?process_type=... (só as ativas, a menos que active=false)
+    """
+    params = {kind: request.args.get(kind) for kind in SearchConfigTerm.KINDS if request.args.get(kind)}
+    if len(params) != 1:
+        return jsonify({'error': 'Informe exatamente um entre keyword, tribunal e process_type'}), 400
+    kind, value = params.popitem()
+    
+    query = SearchConfig.query.join(SearchConfig.terms).filter(
+        SearchConfigTerm.kind == kind,
+        SearchConfigTerm.normalized == SearchConfigTerm.normalize_value(kind, value)
+    )
+    if request.args.get('active', 'true').lower() not in ('0', 'false', 'no'):
+        query = query.filter(SearchConfig.is_active.is_(True))
+    
+    configs = query.order_by(SearchConfig.id).all()
+    return jsonify({
+        'kind': kind,
+        'value': value,
+        'configs': [config.to_dict() for config in configs],
+        'user_ids': sorted({config.user_id for config in configs})
+    })
+
 @search_config_bp.route('/search-configs/user/<int:user_id>/active', methods=['GET'])
 def get_user_active_search_configs(user_id):
     """Retorna as configurações de pesquisa ativas de um usuário"""
@@ -62,20 +100,10 @@ def update_search_config(config_id):
     
     config.name = data.get('name', config.name)
     
-    # Atualizar keywords
-    if 'keywords' in data:
-        keywords = ','.join(data['keywords']) if isinstance(data['keywords'], list) else data['keywords']
-        config.keywords = keywords
-    
-    # Atualizar tribunals
-    if 'tribunals' in data:
-        tribunals = ','.join(data['tribunals']) if isinstance(data['tribunals'], list) else data['tribunals']
-        config.tribunals = tribunals
-    
-    # Atualizar process_types
-    if 'process_types' in data:
-        process_types = ','.join(data['process_types']) if isinstance(data['process_types'], list) else data['process_types']
-        config.process_types = process_types
+    # Atualizar keywords, tribunals e process_types
+    for field, kind in TERM_FIELDS.items():
+        if field in data:
+            config.set_terms(kind, _term_values(data[field]))
     
     config.is_active = data.get('is_active', config.is_active)
     
@@ -98,3 +126,65 @@ def delete_search_config(config_id):
     db.session.commit()
     return '', 204
 
+@search_config_bp.route('/search-configs/match', methods=['POST'])
+def match_search_configs():
+    """
+    Casa uma publicação com as configurações ativas de todos os usuários.
+    Aceita publication_id ou text (com tribunal e process_type opcionais).
+    """
+    data = request.get_json(silent=True) or {}
+    
+    process_type = data.get('process_type')
+    if data.get('publication_id') is not None:
+        # Os ids são únicos entre as duas tabelas, então procura também no arquivo morto
+        publication = (db.session.get(Publication, data['publication_id'])
+                       or db.session.get(PublicationArchive, data['publication_id']))
+        if publication is None:
+            abort(404)
+        text = ' '.join(filter(None, [publication.title, publication.content]))
+        tribunal = publication.tribunal
+        # Como na gravação, o tipo do processo é procurado no título
+        process_type = process_type or publication.title
+    elif data.get('text'):
+        text = data['text']
+        tribunal = data.get('tribunal')
+    else:
+        return jsonify({'error': 'Informe publication_id ou text'}), 400
+    
+    matcher = get_matcher()
+    return jsonify({
+        'matches': matcher.match(text, tribunal=tribunal, process_type=process_type),
+        'stats': matcher.get_stats()
+    })
+
+
+@search_config_bp.route('/search-configs/<int:config_id>/publications', methods=['GET'])
+def get_search_config_publications(config_id):
+    """
+    Publicações que casaram com a configuração ao serem gravadas, das mais novas
+    para as mais antigas (inclui as arquivadas). Pagina com before_id.
+    """
+    SearchConfig.query.get_or_404(config_id)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    before_id = request.args.get('before_id', type=int)
+    
+    query = PublicationMatch.query.filter_by(config_id=config_id)
+    if before_id is not None:
+        query = query.filter(PublicationMatch.publication_id < before_id)
+    matches = query.order_by(PublicationMatch.publication_id.desc()).limit(limit).all()
+    
+    ids = [match.publication_id for match in matches]
+    publications = {}
+    for model in (Publication, PublicationArchive):
+        publications.update((pub.id, pub) for pub in model.query.filter(model.id.in_(ids)))
+    
+    return jsonify({
+        'publications': [
+            dict(
+                publications[match.publication_id].to_dict(include_content=False),
+                matched_keywords=json.loads(match.matched_keywords or '[]')
+            )
+            for match in matches if match.publication_id in publications
+        ],
+        'next_before_id': ids[-1] if len(ids) == limit else None
+    })
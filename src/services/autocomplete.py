@@ -0,0 +1,122 @@
+import bisect
+import threading
+from typing import Any, Dict, Hashable, List, Tuple
+from src.utils.text import normalize
+
+
+def _trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class AutocompleteIndex:
+    """
+    Índice em memória para busca por prefixo e por trecho (infixo) em rótulos.
+
+    As palavras dos rótulos ficam em uma lista ordenada (prefixo via bisect) e os
+    trigramas em um índice invertido (infixo). Acentos e maiúsculas são ignorados.
+    Ordem dos resultados: rótulo igual à busca, rótulo começando pela busca,
+    palavras começando pelos termos da busca e, por fim, trecho no meio do rótulo;
+    empates favorecem rótulos mais curtos.
+    """
+
+    def __init__(self):
+        self._entries = {}   # id -> (rótulo, rótulo normalizado, dados)
+        self._words = []     # lista ordenada de (palavra, id)
+        self._trigrams = {}  # trigrama -> ids
+        self._lock = threading.Lock()
+        self.source = None   # Objeto a partir do qual o índice foi sincronizado
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, entry_id, label, data):
+        normalized = normalize(label)
+        self._entries[entry_id] = (label, normalized, data)
+        for word in set(normalized.split()):
+            bisect.insort(self._words, (word, entry_id))
+        for trigram in _trigrams(normalized):
+            self._trigrams.setdefault(trigram, set()).add(entry_id)
+
+    def _remove(self, entry_id):
+        label, normalized, _ = self._entries.pop(entry_id)
+        for word in set(normalized.split()):
+            position = bisect.bisect_left(self._words, (word, entry_id))
+            if position < len(self._words) and self._words[position] == (word, entry_id):
+                del self._words[position]
+        for trigram in _trigrams(normalized):
+            ids = self._trigrams.get(trigram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._trigrams[trigram]
+
+    def sync(self, entries: Dict[Hashable, Tuple[str, Any]], source: Any = None) -> Dict:
+        """
+        Atualiza o índice de forma incremental a partir de {id: (rótulo, dados)}:
+        só entradas novas, removidas ou com rótulo alterado são reindexadas.
+        """
+        with self._lock:
+            removed = [entry_id for entry_id in self._entries if entry_id not in entries]
+            changed = [
+                entry_id for entry_id, (label, _) in entries.items()
+                if entry_id in self._entries and self._entries[entry_id][0] != label
+            ]
+            added = [entry_id for entry_id in entries if entry_id not in self._entries]
+
+            for entry_id in removed + changed:
+                self._remove(entry_id)
+            for entry_id in changed + added:
+                label, data = entries[entry_id]
+                self._add(entry_id, label, data)
+            # Dados podem mudar sem mudar o rótulo
+            for entry_id, (label, data) in entries.items():
+                if self._entries[entry_id][2] is not data:
+                    self._entries[entry_id] = (self._entries[entry_id][0], self._entries[entry_id][1], data)
+
+            self.source = source
+            return {'added': len(added), 'removed': len(removed), 'changed': len(changed)}
+
+    def _word_prefix_matches(self, prefix) -> set:
+        # Percorre a lista a partir da posição do prefixo, sem copiá-la
+        position = bisect.bisect_left(self._words, (prefix,))
+        ids = set()
+        while position < len(self._words):
+            word, entry_id = self._words[position]
+            if not word.startswith(prefix):
+                break
+            ids.add(entry_id)
+            position += 1
+        return ids
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        normalized_query = normalize(query)
+        if not normalized_query:
+            return []
+        terms = normalized_query.split()
+
+        with self._lock:
+            candidates = self._word_prefix_matches(max(terms, key=len))
+            if len(normalized_query) >= 3:
+                trigram_sets = [self._trigrams.get(t, set()) for t in _trigrams(normalized_query)]
+                candidates |= set.intersection(*trigram_sets) if trigram_sets else set()
+
+            ranked = []
+            for entry_id in candidates:
+                label, normalized, data = self._entries[entry_id]
+                if normalized == normalized_query:
+                    score = 0
+                elif normalized.startswith(normalized_query):
+                    score = 1
+                elif all(any(word.startswith(term) for word in normalized.split()) for term in terms):
+                    score = 2
+                elif normalized_query in normalized:
+                    score = 3
+                else:
+                    continue
+                ranked.append((score, len(normalized), normalized, entry_id, label, data))
+
+        ranked.sort(key=lambda item: item[:3])
+        return [
+            {'id': entry_id, 'label': label, 'score': score, 'data': data}
+            for score, _, _, entry_id, label, data in ranked[:limit]
+        ]
@@ -0,0 +1,183 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class TTLCache:
+    """
+    Cache em memória limitado (LRU), com validade por entrada e stale-while-revalidate.
+
+    Uma entrada vale por `ttl` segundos. Depois disso, e por mais `stale_ttl`
+    segundos, ela continua sendo devolvida na hora enquanto uma atualização roda em
+    segundo plano. Passado esse prazo, a próxima leitura busca o valor de novo.
+
+    Com `snapshot_path`, o conteúdo é gravado em um arquivo JSON a cada alteração e
+    recarregado na criação, para sobreviver a reinícios (chaves e valores precisam
+    ser serializáveis em JSON).
+    """
+
+    def __init__(self, max_entries: int = 256, snapshot_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.snapshot_path = snapshot_path
+        self._entries = OrderedDict()  # chave -> (valor, gravado_em, ttl, stale_ttl)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+        if snapshot_path:
+            self._load_snapshot()
+
+    def get_or_load(self,
+                    key: str,
+                    loader: Callable[[], Any],
+                    ttl: float,
+                    stale_ttl: float = 0,
+                    cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        Retorna o valor da chave, chamando `loader()` quando não há valor utilizável.
+
+        Valores para os quais `cacheable(valor)` é falso (ex.: respostas de erro)
+        são devolvidos, mas não guardados.
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at, entry_ttl, entry_stale_ttl = entry
+                age = now - stored_at
+                if age < entry_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+                if age < entry_ttl + entry_stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats['stale_hits'] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._executor.submit(self._refresh, key, loader, ttl, stale_ttl, cacheable)
+                    return value
+            self.stats['misses'] += 1
+
+        value = loader()
+        if cacheable(value):
+            self.set(key, value, ttl, stale_ttl)
+        return value
+
+    def _refresh(self, key, loader, ttl, stale_ttl, cacheable):
+        try:
+            value = loader()
+            if cacheable(value):
+                self.set(key, value, ttl, stale_ttl)
+                with self._lock:
+                    self.stats['refreshes'] += 1
+            else:
+                # Mantém o valor antigo; a próxima leitura tenta de novo
+                with self._lock:
+                    self.stats['refresh_errors'] += 1
+        except Exception:
+            with self._lock:
+                self.stats['refresh_errors'] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0):
+        with self._lock:
+            self._entries[key] = (value, time.time(), ttl, stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            snapshot = dict(self._entries) if self.snapshot_path else None
+
+        if snapshot is not None:
+            self._save_snapshot(snapshot)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
+
+    def _save_snapshot(self, entries):
+        data = {
+            key: {'value': value, 'stored_at': stored_at, 'ttl': ttl, 'stale_ttl': stale_ttl}
+            for key, (value, stored_at, ttl, stale_ttl) in entries.items()
+        }
+        directory = os.path.dirname(self.snapshot_path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as snapshot_file:
+                json.dump(data, snapshot_file, ensure_ascii=False)
+            os.replace(temporary, self.snapshot_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f'Não foi possível gravar o snapshot do cache em {self.snapshot_path}: {e}')
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as snapshot_file:
+                data = json.load(snapshot_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f'Snapshot do cache ignorado ({self.snapshot_path}): {e}')
+            return
+
+        # Mais antigas primeiro, para que a ordem LRU seja preservada
+        for key, entry in sorted(data.items(), key=lambda item: item[1]['stored_at']):
+            self._entries[key] = (entry['value'], entry['stored_at'], entry['ttl'], entry['stale_ttl'])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SingleFlight:
+    """
+    Faz chamadas idênticas e simultâneas compartilharem uma única execução.
+
+    A primeira chamada de uma chave executa a função; as que chegam enquanto ela
+    está em andamento esperam e recebem o mesmo resultado (ou a mesma exceção).
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'executions': 0, 'coalesced': 0}
+
+    def do(self, key, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.stats['calls'] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.stats['executions'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._in_flight))
@@ -0,0 +1,122 @@
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future
+
+# Hashes do ComunicaPJE são usados como nome de arquivo; nada além disso é aceito
+HASH_VALIDO = re.compile(r'[A-Za-z0-9_-]+')
+
+
+class CertidaoCache:
+    """
+    Cache em disco das certidões em PDF, endereçado pelo hash da comunicação.
+
+    Os arquivos ficam em `diretorio/<2 primeiros caracteres>/<hash>.pdf`. Quando o
+    total passa de `max_bytes`, os arquivos usados há mais tempo (data de
+    modificação, atualizada a cada acerto) são removidos até sobrar 90% do limite.
+    """
+
+    def __init__(self, diretorio, max_bytes):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self._tamanho = None
+
+    def caminho(self, hash_certidao):
+        if not HASH_VALIDO.fullmatch(hash_certidao or ''):
+            raise ValueError(f'Hash de certidão inválido: {hash_certidao!r}')
+        return os.path.join(self.diretorio, hash_certidao[:2], f'{hash_certidao}.pdf')
+
+    def obter(self, hash_certidao):
+        """Retorna o caminho da certidão em cache, ou None se ela não estiver lá."""
+        caminho = self.caminho(hash_certidao)
+        try:
+            os.utime(caminho)  # Marca como usada recentemente
+        except FileNotFoundError:
+            return None
+        return caminho
+
+    def gravar(self, hash_certidao, conteudo):
+        """Grava a certidão de forma atômica e retorna o caminho no cache."""
+        caminho = self.caminho(hash_certidao)
+        pasta = os.path.dirname(caminho)
+        os.makedirs(pasta, exist_ok=True)
+
+        fd, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as arquivo:
+                arquivo.write(conteudo)
+            os.replace(temporario, caminho)
+        except BaseException:
+            os.unlink(temporario)
+            raise
+
+        with self._lock:
+            if self._tamanho is not None:
+                self._tamanho += len(conteudo)
+        self._liberar_espaco()
+        return caminho
+
+    def obter_ou_baixar(self, hash_certidao, baixar):
+        """
+        Retorna o caminho da certidão, chamando `baixar(hash)` em caso de falta.
+
+        Pedidos simultâneos do mesmo hash esperam um único download. Se `baixar`
+        não devolver conteúdo, retorna None.
+        """
+        caminho = self.obter(hash_certidao)
+        if caminho:
+            return caminho
+
+        with self._lock:
+            future = self._em_andamento.get(hash_certidao)
+            responsavel = future is None
+            if responsavel:
+                future = self._em_andamento[hash_certidao] = Future()
+
+        if not responsavel:
+            return future.result()
+
+        try:
+            conteudo = baixar(hash_certidao)
+            caminho = self.gravar(hash_certidao, conteudo) if conteudo else None
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(caminho)
+            return caminho
+        finally:
+            with self._lock:
+                self._em_andamento.pop(hash_certidao, None)
+
+    def _arquivos(self):
+        for raiz, _, nomes in os.walk(self.diretorio):
+            for nome in nomes:
+                if not nome.endswith('.pdf'):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    info = os.stat(caminho)
+                except FileNotFoundError:
+                    continue
+                yield info.st_mtime, info.st_size, caminho
+
+    def _liberar_espaco(self):
+        with self._lock:
+            if self._tamanho is None:
+                self._tamanho = sum(tamanho for _, tamanho, _ in self._arquivos())
+            if self._tamanho <= self.max_bytes:
+                return
+
+            alvo = self.max_bytes * 0.9
+            for _, tamanho, caminho in sorted(self._arquivos()):
+                if self._tamanho <= alvo:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    continue
+                self._tamanho -= tamanho
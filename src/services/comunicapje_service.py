@@ -1,33 +1,151 @@
+import hashlib
+import os
+import re
 import requests
 import json
-from datetime import date
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from urllib.parse import urlparse
+from flask import current_app
+from sqlalchemy.orm import joinedload
 from src.models.user import User
 from src.models.search_target import SearchTarget
+from src.services.certidao_cache import CertidaoCache
+from src.services.publication_archive_service import archived_source_hashes
+from src.services.publication_ingest_service import insert_publications
+from src.services.upstream import gateway
 from src.models.user import db # Importar db do user.py para inicializar
 
 API_BASE_URL = "https://comunicaapi.pje.jus.br"
 
-def obter_certidao(hash_certidao):
-    # Stub para a função obter_certidao
-    # Em um ambiente real, esta função faria uma requisição para obter o PDF da certidão
-    print(f"DEBUG: Solicitada certidão para hash: {hash_certidao}")
-    return None # Retorna None por enquanto
+# Número de alvos processados em paralelo e limite de requisições simultâneas por host
+MAX_WORKERS = int(os.environ.get("COMUNICAPJE_MAX_WORKERS", "8"))
+MAX_REQUESTS_PER_HOST = int(os.environ.get("COMUNICAPJE_MAX_REQUESTS_PER_HOST", "4"))
+
+# Tamanho da página pedida ao ComunicaPJE
+ITENS_POR_PAGINA = int(os.environ.get("COMUNICAPJE_ITENS_POR_PAGINA", "100"))
+# Janelas de recuperação maiores que isto são divididas em blocos deste tamanho (em dias)
+DIAS_POR_JANELA = int(os.environ.get("COMUNICAPJE_DIAS_POR_JANELA", "7"))
+# Quantidade de publicações gravadas por transação
+LOTE_PUBLICACOES = int(os.environ.get("COMUNICAPJE_LOTE_PUBLICACOES", "500"))
+# Acima deste tamanho o corpo do email em montagem deixa a memória e passa para disco
+MAX_CORPO_EM_MEMORIA = 512 * 1024
+
+
+# Cache local das certidões em PDF e limite de downloads simultâneos de certidões
+CERTIDAO_CACHE_DIR = os.environ.get(
+    "CERTIDAO_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'certidoes'),
+)
+CERTIDAO_CACHE_MAX_BYTES = int(os.environ.get("CERTIDAO_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CERTIDAO_MAX_WORKERS = int(os.environ.get("CERTIDAO_MAX_WORKERS", "8"))
+
+certidao_cache = CertidaoCache(CERTIDAO_CACHE_DIR, CERTIDAO_CACHE_MAX_BYTES)
+_executor_certidoes = ThreadPoolExecutor(max_workers=CERTIDAO_MAX_WORKERS, thread_name_prefix='certidao')
+
+# O SQLite aceita um único escritor por vez; as threads do robô se revezam aqui
+lock_escrita = threading.Lock()
+
+
+class PaginacaoIncompletaError(requests.exceptions.RequestException):
+    """A API parou de devolver itens antes de atingir o total informado em `count`."""
+
+
+class LimitadorPorHost:
+    """Limita o número de requisições simultâneas enviadas a um mesmo host."""
+
+    def __init__(self, limite):
+        self.limite = max(1, limite)
+        self._semaforos = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def reservar(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaforo = self._semaforos.get(host)
+            if semaforo is None:
+                semaforo = self._semaforos[host] = threading.BoundedSemaphore(self.limite)
+        with semaforo:
+            yield
+
+    def get(self, url, **kwargs):
+        with self.reservar(url):
+            return gateway.get(url, **kwargs)
+
+def _baixar_certidao(hash_certidao, limitador=None):
+    url = f"{API_BASE_URL}/api/v1/comunicacao/{hash_certidao}/certidao"
+    response = (limitador or gateway).get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+def obter_certidao(hash_certidao, limitador=None):
+    """
+    Retorna o caminho da certidão em PDF no cache local, baixando-a se necessário.
+
+    Retorna None se a certidão não puder ser obtida; a falta de uma certidão não
+    interrompe a notificação.
+    """
+    try:
+        return certidao_cache.obter_ou_baixar(
+            hash_certidao, lambda hash_: _baixar_certidao(hash_, limitador)
+        )
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"Certidão {hash_certidao} indisponível: {e}")
+        return None
+
+def _vincular_certidao(hash_certidao, pasta_anexos, limitador=None):
+    """
+    Obtém a certidão e a vincula na pasta do envio (hard link, sem cópia quando
+    possível), o que a protege da limpeza do cache até o email sair.
+    """
+    caminho_cache = obter_certidao(hash_certidao, limitador)
+    if not caminho_cache:
+        return None
+
+    caminho = os.path.join(pasta_anexos, f'certidao_{hash_certidao}.pdf')
+    try:
+        try:
+            os.link(caminho_cache, caminho)
+        except OSError:
+            shutil.copyfile(caminho_cache, caminho)
+    except OSError as e:
+        print(f"Certidão {hash_certidao} removida do cache antes do envio: {e}")
+        return None
+    return caminho
+
+def baixar_certidoes(hashes, pasta_anexos, limitador=None):
+    """
+    Obtém em paralelo as certidões de um lote, no máximo CERTIDAO_MAX_WORKERS
+    downloads por vez, vinculando-as em `pasta_anexos`.
+    Retorna {hash: caminho na pasta ou None}.
+    """
+    hashes = list(dict.fromkeys(hash_ for hash_ in hashes if hash_))
+    futures = {
+        hash_: _executor_certidoes.submit(_vincular_certidao, hash_, pasta_anexos, limitador)
+        for hash_ in hashes
+    }
+    return {hash_: future.result() for hash_, future in futures.items()}
 
 def enviar_email_notificacao(assunto, corpo_html, destinatario, anexos=None):
     # Stub para a função enviar_email_notificacao
     # Em um ambiente real, esta função usaria um serviço de envio de e-mails (e.g., SendGrid, Mailgun)
+    # corpo_html pode ser uma string ou um arquivo aberto (lido em partes, sem carregar tudo na memória)
+    # e cada anexo traz 'nome' e 'caminho' do arquivo em disco
     print(f"DEBUG: Enviando e-mail para {destinatario} com assunto: {assunto}")
-    print("DEBUG: Conteúdo HTML (parcial):", corpo_html[:200])
+    trecho = corpo_html[:200] if isinstance(corpo_html, str) else corpo_html.read(200)
+    print("DEBUG: Conteúdo HTML (parcial):", trecho)
     if anexos:
         print(f"DEBUG: Anexos: {len(anexos)}")
     return True
 
-def formatar_email_html(target_str, items):
-    """Cria o corpo do email em HTML."""
-    
-    processos_unicos = sorted(list(set(item.get('numeroprocessocommascara', 'N/A') for item in items)))
-
-    html = f"""
+def formatar_cabecalho_html(target_str, total, processos_unicos):
+    """Cria o início do email em HTML, com o resumo das publicações."""
+    return f"""
     <html>
     <head>
         <style>
@@ -50,37 +168,41 @@ def formatar_email_html(target_str, items):
             </div>
             
             <div class="summary">
-                <p>Olá! Encontramos <strong>{len(items)} nova(s) publicação(ões)</strong> para o seu alvo de busca: <strong>{target_str}</strong>.</p>
+                <p>Olá! Encontramos <strong>{total} nova(s) publicação(ões)</strong> para o seu alvo de busca: <strong>{target_str}</strong>.</p>
                 <p><strong>Processos envolvidos:</strong> {', '.join(processos_unicos)}</p>
             </div>
 
     """
-    for item in items:
-        partes_polo_a = [p['nome'] for p in item.get('destinatarios', []) if p['polo'] == 'A']
-        partes_polo_p = [p['nome'] for p in item.get('destinatarios', []) if p['polo'] == 'P']
-        texto_formatado = item.get('texto', '').replace('\n', '<br>')
-
-        html += f"""
-        <div class="publication">
-            <h2>Processo: {item.get('numeroprocessocommascara', 'N/A')}</h2>
-            <p>
-                <strong>Data de Disponibilização:</strong> {item.get('datadisponibilizacao', 'N/A')}<br>
-                <strong>Tipo de Comunicação:</strong> {item.get('tipoComunicacao', 'N/A')}<br>
-                <strong>Órgão Julgador:</strong> {item.get('nomeOrgao', 'N/A')}
-            </p>
 
-            <h3>Partes Envolvidas</h3>
-            <p><strong>Polo Ativo:</strong> {', '.join(partes_polo_a) or 'N/A'}</p>
-            <p><strong>Polo Passivo:</strong> {', '.join(partes_polo_p) or 'N/A'}</p>
+def formatar_item_html(item):
+    """Cria o bloco HTML de uma publicação."""
+    partes_polo_a = [p['nome'] for p in item.get('destinatarios', []) if p['polo'] == 'A']
+    partes_polo_p = [p['nome'] for p in item.get('destinatarios', []) if p['polo'] == 'P']
+    texto_formatado = item.get('texto', '').replace('\n', '<br>')
 
-            <h3>Texto da Publicação</h3>
-            <p>{texto_formatado}</p>
+    return f"""
+    <div class="publication">
+        <h2>Processo: {item.get('numeroprocessocommascara', 'N/A')}</h2>
+        <p>
+            <strong>Data de Disponibilização:</strong> {item.get('datadisponibilizacao', 'N/A')}<br>
+            <strong>Tipo de Comunicação:</strong> {item.get('tipoComunicacao', 'N/A')}<br>
+            <strong>Órgão Julgador:</strong> {item.get('nomeOrgao', 'N/A')}
+        </p>
 
-            <a href="{item.get('link', '#')}" class="cta-button" target="_blank">Acessar Publicação no PJe</a>
-        </div>
+        <h3>Partes Envolvidas</h3>
+        <p><strong>Polo Ativo:</strong> {', '.join(partes_polo_a) or 'N/A'}</p>
+        <p><strong>Polo Passivo:</strong> {', '.join(partes_polo_p) or 'N/A'}</p>
+
+        <h3>Texto da Publicação</h3>
+        <p>{texto_formatado}</p>
+
+        <a href="{item.get('link', '#')}" class="cta-button" target="_blank">Acessar Publicação no PJe</a>
+    </div>
         """
-    
-    html += """
+
+def formatar_rodape_html():
+    """Cria o fim do email em HTML."""
+    return """
             <p class="footer">
                 As certidões em PDF e os detalhes técnicos (JSON) de cada publicação estão em anexo.<br>
                 Este é um email automático enviado pelo sistema JurisAlerta.
@@ -89,65 +211,463 @@ def formatar_email_html(target_str, items):
     </body>
     </html>
     """
+
+def formatar_email_html(target_str, items):
+    """Cria o corpo do email em HTML."""
+
+    processos_unicos = sorted(list(set(item.get('numeroprocessocommascara', 'N/A') for item in items)))
+
+    html = formatar_cabecalho_html(target_str, len(items), processos_unicos)
+    for item in items:
+        html += formatar_item_html(item)
+    html += formatar_rodape_html()
     return html
 
-def run_daily_searches():
+def normalizar_oab(oab_uf, oab_number):
+    """Normaliza UF e número da OAB para que grafias diferentes gerem a mesma chave."""
+    uf = (oab_uf or '').strip().upper()
+    numero = re.sub(r'[^0-9A-Za-z]', '', oab_number or '').upper().lstrip('0')
+    return uf, numero
+
+def _inicio_da_janela(target, hoje, data_inicio=None):
+    """
+    Define o primeiro dia a consultar para um alvo.
+
+    Sem `data_inicio` (backfill), retoma a partir do dia seguinte à marca d'água;
+    alvos nunca sincronizados começam em `hoje`.
+    """
+    if data_inicio:
+        return data_inicio
+    if target.last_synced_date:
+        return target.last_synced_date + timedelta(days=1)
+    return hoje
+
+def dividir_janela(inicio, fim, dias_por_janela=None):
+    """Divide o intervalo [inicio, fim] em blocos consecutivos de até `dias_por_janela` dias."""
+    passo = timedelta(days=max(1, dias_por_janela or DIAS_POR_JANELA))
+    janelas = []
+    while inicio <= fim:
+        fim_janela = min(inicio + passo - timedelta(days=1), fim)
+        janelas.append((inicio, fim_janela))
+        inicio = fim_janela + timedelta(days=1)
+    return janelas
+
+def _carregar_alvos(hoje, data_inicio=None):
+    """
+    Carrega os alvos ativos agrupados pela OAB normalizada e pelo início da janela.
+
+    Cada grupo é um dicionário simples, seguro para uso entre threads, com a lista
+    de usuários (sem repetição) que acompanham aquela OAB e os ids dos alvos cuja
+    marca d'água deve avançar. Como a marca d'água nunca chega a `hoje`, o dia
+    corrente é sempre consultado de novo.
+    """
+    targets = (
+        SearchTarget.query.options(joinedload(SearchTarget.user))
+        .filter_by(is_active=True)
+        .filter(SearchTarget.oab_number != "")
+        .all()
+    )
+
+    grupos = {}
+    for target in targets:
+        oab_uf, oab_number = normalizar_oab(target.oab_uf, target.oab_number)
+        inicio = _inicio_da_janela(target, hoje, data_inicio)
+        if not oab_number or inicio > hoje:
+            continue
+
+        grupo = grupos.setdefault((oab_uf, oab_number, inicio), {
+            'target_str': f'{oab_uf}{oab_number}',
+            'oab_number': oab_number,
+            'oab_uf': oab_uf,
+            'inicio': inicio,
+            'fim': hoje,
+            'target_ids': [],
+            'assinantes': {},
+        })
+        grupo['target_ids'].append(target.id)
+        grupo['assinantes'].setdefault(target.user_id, {
+            'user_id': target.user_id,
+            'username': target.user.username,
+            'email': target.user.email,
+        })
+
+    return [
+        dict(grupo, assinantes=list(grupo['assinantes'].values()))
+        for grupo in grupos.values()
+    ], len(targets)
+
+def _avancar_marca_dagua(target_ids, sincronizado_ate):
+    """Avança a marca d'água dos alvos, sem nunca retroceder (ex.: após um backfill)."""
+    with lock_escrita:
+        SearchTarget.query.filter(
+            SearchTarget.id.in_(target_ids),
+            db.or_(SearchTarget.last_synced_date.is_(None), SearchTarget.last_synced_date < sincronizado_ate),
+        ).update({SearchTarget.last_synced_date: sincronizado_ate}, synchronize_session=False)
+        db.session.commit()
+
+def iterar_comunicacoes(params, limitador):
+    """
+    Percorre todas as páginas da consulta ao ComunicaPJE, gerando um item por vez.
+
+    Apenas uma página fica em memória. Se a API deixar de devolver itens antes de
+    completar o `count` informado, levanta PaginacaoIncompletaError em vez de
+    descartar as páginas restantes em silêncio.
+    """
+    pagina = 1
+    recebidos = 0
+
+    while True:
+        params_pagina = dict(params, pagina=pagina, itensPorPagina=ITENS_POR_PAGINA)
+        response = limitador.get(f"{API_BASE_URL}/api/v1/comunicacao", params=params_pagina, timeout=30)
+        response.raise_for_status()
+        resultados = response.json()
+        total = resultados.get("count", 0)
+        items = resultados.get("items") or []
+
+        for item in items:
+            recebidos += 1
+            yield item
+
+        if recebidos >= total:
+            return
+        if not items:
+            raise PaginacaoIncompletaError(
+                f'página {pagina} veio vazia após {recebidos} de {total} item(ns)'
+            )
+        pagina += 1
+
+def _hash_do_item(item):
+    """
+    Hash que identifica a comunicação para evitar gravá-la duas vezes.
+
+    Usa o hash do próprio ComunicaPJE; itens que vierem sem ele recebem um hash
+    derivado do tribunal, do processo, da data e do texto, para que uma nova
+    execução não os grave de novo.
+    """
+    if item.get('hash'):
+        return item['hash']
+    partes = (
+        item.get('siglaTribunal') or '',
+        item.get('numeroprocessocommascara') or '',
+        (item.get('datadisponibilizacao') or '')[:10],
+        hashlib.sha256((item.get('texto') or '').encode('utf-8')).hexdigest(),
+    )
+    return hashlib.sha256('|'.join(partes).encode('utf-8')).hexdigest()
+
+def _publicacao_de_item(item, user_id):
+    """Converte um item do ComunicaPJE nos valores de uma linha de Publication."""
+    processo = item.get('numeroprocessocommascara')
+    tipo = item.get('tipoComunicacao') or 'Comunicação'
+
+    publication_date = None
+    if item.get('datadisponibilizacao'):
+        try:
+            publication_date = datetime.strptime(item['datadisponibilizacao'][:10], '%Y-%m-%d')
+        except ValueError:
+            pass
+
+    return {
+        'user_id': user_id,
+        'title': (f'{tipo} - {processo}' if processo else tipo)[:500],
+        'content': item.get('texto'),
+        'tribunal': item.get('siglaTribunal'),
+        'publication_date': publication_date,
+        'source_url': item.get('link'),
+        'process_number': processo,
+        'source_hash': _hash_do_item(item),
+    }
+
+def _salvar_publicacoes(linhas, inseridas=None):
+    """
+    Insere um lote de publicações em uma única transação.
+
+    Comunicações já gravadas para o mesmo usuário (mesmo hash) são ignoradas pelo
+    próprio banco, via índice único; as que já foram para o arquivo morto são
+    descartadas antes do INSERT. As publicações novas são indexadas para a busca
+    e casadas com as configurações de pesquisa dos donos. Retorna quantas linhas
+    foram inseridas; se informado, o conjunto `inseridas` recebe os pares
+    (user_id, source_hash) dessas linhas.
+    """
+    with lock_escrita:
+        try:
+            chaves = [(linha['user_id'], linha['source_hash']) for linha in linhas]
+            arquivadas = archived_source_hashes(set(chaves))
+            linhas = [linha for linha, chave in zip(linhas, chaves) if chave not in arquivadas]
+            gravadas = insert_publications(linhas, chunk_size=len(linhas)) if linhas else []
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    if inseridas is not None:
+        inseridas.update((linha['user_id'], linha['source_hash']) for linha in gravadas)
+    return len(gravadas)
+
+def _gravar_lote(pendentes, contagem):
+    """Grava as linhas dos itens pendentes e gera (item, usuários para quem ele é novo)."""
+    inseridas = set()
+    contagem['novas'] += _salvar_publicacoes(
+        [linha for _, linhas in pendentes for linha in linhas], inseridas
+    )
+    for item, linhas in pendentes:
+        novos = []
+        for linha in linhas:
+            chave = (linha['user_id'], linha['source_hash'])
+            # Um item repetido na resposta da API só é notificado uma vez
+            if chave in inseridas:
+                inseridas.discard(chave)
+                novos.append(linha['user_id'])
+        if novos:
+            yield item, novos
+
+def persistir_em_lotes(itens, user_ids, contagem, tamanho_lote=None):
+    """
+    Grava os itens como Publication para cada usuário e repassa adiante só os novos.
+
+    As linhas são acumuladas e gravadas a cada `tamanho_lote` linhas; depois de
+    cada gravação, os itens do lote que geraram ao menos uma publicação nova são
+    repassados como (item, ids dos usuários para quem ele é novo). Itens já
+    gravados em execuções anteriores (a véspera e o dia corrente são consultados
+    de novo) não são repassados. Os itens recebidos são somados em
+    contagem['encontradas'] e as publicações novas em contagem['novas'].
+    """
+    tamanho_lote = tamanho_lote or LOTE_PUBLICACOES
+    pendentes = []
+    linhas_pendentes = 0
+
+    for item in itens:
+        contagem['encontradas'] += 1
+        linhas = [_publicacao_de_item(item, user_id) for user_id in user_ids]
+        pendentes.append((item, linhas))
+        linhas_pendentes += len(linhas)
+
+        if linhas_pendentes >= tamanho_lote:
+            yield from _gravar_lote(pendentes, contagem)
+            pendentes = []
+            linhas_pendentes = 0
+
+    if pendentes:
+        yield from _gravar_lote(pendentes, contagem)
+
+def _em_lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def _gravar_anexos(item, pasta_anexos, certidoes):
+    """
+    Prepara os anexos de um item: a certidão em PDF, já vinculada na pasta do envio
+    por baixar_certidoes, e os detalhes em JSON gravados em disco.
+    """
+    hash_certidao = item.get("hash")
+    if not hash_certidao:
+        return []
+
+    anexos = []
+
+    # Anexa a certidão em PDF
+    if certidoes.get(hash_certidao):
+        anexos.append({'nome': f'certidao_{hash_certidao}.pdf', 'caminho': certidoes[hash_certidao]})
+
+    # Anexa os detalhes em JSON
+    caminho = os.path.join(pasta_anexos, f'detalhes_{hash_certidao}.json')
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump(item, arquivo, indent=2, ensure_ascii=False)
+    anexos.append({'nome': f'detalhes_{hash_certidao}.json', 'caminho': caminho})
+
+    return anexos
+
+def _montar_notificacoes(target_str, itens, pasta_anexos, limitador=None):
+    """
+    Consome em fluxo os pares (item, usuários para quem ele é novo), formatando
+    cada item no email de cada um desses usuários e gravando seus anexos em disco.
+    As certidões de cada lote são baixadas em paralelo antes de o lote ser formatado.
+
+    Retorna {user_id: (total, corpo_html, anexos)} só para os usuários com
+    publicações novas, onde corpo_html é um arquivo temporário posicionado no início.
+    """
+    notificacoes = {}
+
+    def _notificacao(user_id):
+        if user_id not in notificacoes:
+            notificacoes[user_id] = {
+                'total': 0,
+                'processos': set(),
+                'anexos': [],
+                'corpo': tempfile.SpooledTemporaryFile(
+                    max_size=MAX_CORPO_EM_MEMORIA, mode='w+', encoding='utf-8'
+                ),
+            }
+        return notificacoes[user_id]
+
+    try:
+        for lote in _em_lotes(itens, ITENS_POR_PAGINA):
+            certidoes = baixar_certidoes((item.get("hash") for item, _ in lote), pasta_anexos, limitador)
+            for item, user_ids in lote:
+                html = formatar_item_html(item)
+                anexos = _gravar_anexos(item, pasta_anexos, certidoes)
+                for user_id in user_ids:
+                    notificacao = _notificacao(user_id)
+                    notificacao['total'] += 1
+                    notificacao['processos'].add(item.get('numeroprocessocommascara', 'N/A'))
+                    notificacao['corpo'].write(html)
+                    notificacao['anexos'].extend(anexos)
+
+        resultado = {}
+        for user_id, notificacao in notificacoes.items():
+            # O cabeçalho depende do total, então só é escrito ao final do fluxo
+            corpo_html = tempfile.SpooledTemporaryFile(max_size=MAX_CORPO_EM_MEMORIA, mode='w+', encoding='utf-8')
+            corpo_html.write(formatar_cabecalho_html(
+                target_str, notificacao['total'], sorted(notificacao['processos'])
+            ))
+            notificacao['corpo'].seek(0)
+            shutil.copyfileobj(notificacao['corpo'], corpo_html)
+            corpo_html.write(formatar_rodape_html())
+            corpo_html.seek(0)
+            resultado[user_id] = (notificacao['total'], corpo_html, notificacao['anexos'])
+        return resultado
+    finally:
+        for notificacao in notificacoes.values():
+            notificacao['corpo'].close()
+
+def _processar_janela(alvo, inicio, fim, limitador):
+    """
+    Consulta o ComunicaPJE uma única vez para a OAB do grupo no intervalo informado,
+    grava as publicações e envia a cada assinante só as que são novas para ele.
+
+    Retorna (total encontrado, publicações novas gravadas).
+    """
+    params = {
+        "numeroOab": alvo['oab_number'],
+        "ufOab": alvo['oab_uf'],
+        "dataDisponibilizacaoInicio": inicio.strftime("%Y-%m-%d"),
+        "dataDisponibilizacaoFim": fim.strftime("%Y-%m-%d"),
+    }
+    target_str = alvo['target_str']
+    user_ids = [assinante['user_id'] for assinante in alvo['assinantes']]
+    contagem = {'encontradas': 0, 'novas': 0}
+
+    with tempfile.TemporaryDirectory(prefix='comunicapje_') as pasta_anexos:
+        itens = persistir_em_lotes(iterar_comunicacoes(params, limitador), user_ids, contagem)
+        notificacoes = _montar_notificacoes(target_str, itens, pasta_anexos, limitador)
+
+        for assinante in alvo['assinantes']:
+            if assinante['user_id'] not in notificacoes:
+                continue
+            total, corpo_html, anexos = notificacoes[assinante['user_id']]
+            assunto = f"JurisAlerta: {total} Novas Publicações para {target_str}"
+            if inicio != fim:
+                assunto += f" ({inicio.strftime('%d/%m/%Y')} a {fim.strftime('%d/%m/%Y')})"
+            with corpo_html:
+                enviar_email_notificacao(assunto, corpo_html, assinante['email'], anexos)
+
+    return contagem['encontradas'], contagem['novas']
+
+def _processar_alvo(app, alvo, limitador, dias_por_janela=None):
+    """
+    Processa a janela do grupo em blocos, do mais antigo para o mais recente.
+
+    Retorna um dicionário com 'total', 'novas', 'sincronizado_ate' e 'erro', onde
+    `sincronizado_ate` é o último dia do último bloco concluído (None se nenhum
+    foi), para que uma falha no meio de uma recuperação preserve o progresso feito.
+    """
+    resultado = {'total': 0, 'novas': 0, 'sincronizado_ate': None, 'erro': None}
+
+    # Cada thread usa o próprio contexto da aplicação, e portanto a própria sessão
+    with app.app_context():
+        for inicio, fim in dividir_janela(alvo['inicio'], alvo['fim'], dias_por_janela):
+            try:
+                total, novas = _processar_janela(alvo, inicio, fim, limitador)
+            except Exception as e:
+                # Uma falha (de rede, de gravação ou de dados inesperados) interrompe
+                # só este alvo; os demais seguem e o erro entra no resumo
+                db.session.rollback()
+                resultado['erro'] = e
+                break
+            resultado['total'] += total
+            resultado['novas'] += novas
+            resultado['sincronizado_ate'] = fim
+
+    return resultado
+
+def run_daily_searches(max_workers=None, max_requests_per_host=None, data_inicio=None, dias_por_janela=None,
+                       progresso=None):
+    """
+    Executa a busca diária para todos os alvos ativos.
+
+    Alvos que compartilham a mesma OAB são agrupados e consultados uma única vez;
+    o resultado é enviado a cada usuário que acompanha aquela OAB.
+
+    Cada alvo guarda o último dia sincronizado (marca d'água) e só o intervalo a
+    partir dele é consultado. O dia corrente ainda pode receber publicações, então
+    a marca d'água para na véspera: rodar de novo no mesmo dia consulta só hoje, e
+    o hash de cada comunicação evita gravá-la (e notificá-la) duas vezes. Com
+    `data_inicio` (backfill) todos os alvos são consultados a partir daquela data.
+    Janelas longas são divididas em blocos de `dias_por_janela` dias e a marca
+    d'água avança a cada bloco concluído.
+
+    Os grupos são processados em paralelo por até `max_workers` threads, respeitando
+    no máximo `max_requests_per_host` requisições simultâneas por host. Os resultados
+    são reportados na thread principal, à medida que cada alvo termina.
+
+    Retorna um resumo da execução (consultas, totais e erros por alvo). Se informado,
+    `progresso` é chamado com esse resumo no início e após cada consulta concluída.
+    """
     print("--- Iniciando o robô de busca e notificação ---")
-    
-    active_targets = SearchTarget.query.filter_by(is_active=True).filter(SearchTarget.oab_number != "").all()
-    data_hoje = date.today().strftime("%Y-%m-%d")
-
-    for target in active_targets:
-        target_str = f'{target.oab_uf.upper()}{target.oab_number}'
-        print(f'\n--- Processando alvo: {target_str} (Usuário: {target.user.username}) ---')
-        
-        params = {
-            "numeroOab": target.oab_number,
-            "ufOab": target.oab_uf,
-            "dataDisponibilizacaoInicio": data_hoje,
-            "dataDisponibilizacaoFim": data_hoje,
+
+    hoje = date.today()
+    alvos, total_alvos = _carregar_alvos(hoje, data_inicio)
+    print(f'{total_alvos} alvo(s) ativo(s) agrupado(s) em {len(alvos)} consulta(s) única(s).')
+    limitador = LimitadorPorHost(max_requests_per_host or MAX_REQUESTS_PER_HOST)
+    app = current_app._get_current_object()
+
+    resumo = {
+        'total_alvos': total_alvos,
+        'consultas': len(alvos),
+        'processadas': 0,
+        'total': 0,
+        'novas': 0,
+        'erros': [],
+    }
+    if progresso:
+        progresso(resumo)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers or MAX_WORKERS)) as executor:
+        futures = {
+            executor.submit(_processar_alvo, app, alvo, limitador, dias_por_janela): alvo
+            for alvo in alvos
         }
 
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/v1/comunicacao", params=params, timeout=30)
-            response.raise_for_status()
-            resultados = response.json()
-            total_encontrado = resultados.get("count", 0)
-
-            if total_encontrado > 0:
-                print(f'>>> SUCESSO! {total_encontrado} publicação(ões) encontrada(s).')
-                
-                items = resultados.get("items", [])
-                anexos = []
-                
-                for item in items:
-                    hash_certidao = item.get("hash")
-                    if hash_certidao:
-                        # Anexa a certidão em PDF
-                        conteudo_pdf = obter_certidao(hash_certidao)
-                        if conteudo_pdf:
-                            anexos.append({
-                                'nome': f'certidao_{hash_certidao}.pdf',
-                                'conteudo': conteudo_pdf
-                            })
-                        
-                        # Anexa os detalhes em JSON
-                        detalhes_json = json.dumps(item, indent=2, ensure_ascii=False)
-                        anexos.append({
-                            'nome': f'detalhes_{hash_certidao}.json',
-                            'conteudo': detalhes_json.encode('utf-8') # Converte string para bytes
-                        })
-                
-                assunto = f"JurisAlerta: {total_encontrado} Novas Publicações para {target_str}"
-                corpo_html = formatar_email_html(target_str, items)
-                destinatario = target.user.email
-                
-                enviar_email_notificacao(assunto, corpo_html, destinatario, anexos)
+        for future in as_completed(futures):
+            alvo = futures[future]
+            target_str = alvo['target_str']
+            usuarios = ', '.join(assinante['username'] for assinante in alvo['assinantes'])
+            print(f'\n--- Processando alvo: {target_str} (Usuários: {usuarios}) ---')
 
+            resultado = future.result()
+            if resultado['sincronizado_ate']:
+                # Dia em aberto não conta como sincronizado
+                sincronizado_ate = min(resultado['sincronizado_ate'], hoje - timedelta(days=1))
+                _avancar_marca_dagua(alvo['target_ids'], sincronizado_ate)
+
+            resumo['processadas'] += 1
+            resumo['total'] += resultado['total']
+            resumo['novas'] += resultado['novas']
+            if resultado['erro']:
+                resumo['erros'].append({'alvo': target_str, 'erro': str(resultado['erro'])})
+            if progresso:
+                progresso(resumo)
+
+            if resultado['erro']:
+                print(f'Erro ao buscar para a OAB {target_str}: {resultado["erro"]}')
+            elif resultado['total'] > 0:
+                print(f'>>> SUCESSO! {resultado["total"]} publicação(ões) encontrada(s), {resultado["novas"]} nova(s) gravada(s).')
             else:
                 print(f'Nenhuma publicação nova para {target_str}.')
 
-        except requests.exceptions.RequestException as e:
-            print(f'Erro ao buscar para a OAB {target_str}: {e}')
-
-    print('\n--- Robô finalizado com sucesso! ---')
\ No newline at end of file
+    print('\n--- Robô finalizado com sucesso! ---')
+    return resumo
@@ -1,16 +1,156 @@
+import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from src.services.autocomplete import AutocompleteIndex
+from src.services.cache import SingleFlight, TTLCache
+from src.services.upstream import gateway
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional
+
+# Validade (segundos) das listas de referência em cache e por quanto tempo, depois
+# disso, ainda podem ser servidas enquanto são atualizadas em segundo plano
+REFERENCE_TTLS = {
+    'tribunals': int(os.environ.get("DATAJUD_TRIBUNALS_TTL", str(24 * 3600))),
+    'classes': int(os.environ.get("DATAJUD_CLASSES_TTL", str(7 * 24 * 3600))),
+    'subjects': int(os.environ.get("DATAJUD_SUBJECTS_TTL", str(7 * 24 * 3600))),
+}
+REFERENCE_STALE_TTL = int(os.environ.get("DATAJUD_REFERENCE_STALE_TTL", str(30 * 24 * 3600)))
+REFERENCE_SNAPSHOT_PATH = os.environ.get(
+    "DATAJUD_REFERENCE_SNAPSHOT",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'datajud_reference_cache.json'),
+)
+
+# Detalhes de processos ficam em cache por pouco tempo; consultas em lote usam até
+# DATAJUD_BATCH_WORKERS chamadas simultâneas e aceitam até DATAJUD_BATCH_MAX processos
+DATAJUD_DETAILS_TTL = int(os.environ.get("DATAJUD_DETAILS_TTL", "300"))
+DATAJUD_DETAILS_CACHE_SIZE = int(os.environ.get("DATAJUD_DETAILS_CACHE_SIZE", "5000"))
+DATAJUD_BATCH_WORKERS = int(os.environ.get("DATAJUD_BATCH_WORKERS", "8"))
+DATAJUD_BATCH_MAX = int(os.environ.get("DATAJUD_BATCH_MAX", "500"))
+
+# Limite de resultados de uma busca em modo streaming e tamanho de página usado nela
+DATAJUD_STREAM_MAX_RESULTS = int(os.environ.get("DATAJUD_STREAM_MAX_RESULTS", "10000"))
+DATAJUD_STREAM_PAGE_SIZE = int(os.environ.get("DATAJUD_STREAM_PAGE_SIZE", "100"))
+
+# Conexões mantidas abertas com o DataJud e tempos limite de conexão e de leitura (segundos)
+DATAJUD_POOL_SIZE = int(os.environ.get("DATAJUD_POOL_SIZE", "20"))
+DATAJUD_CONNECT_TIMEOUT = float(os.environ.get("DATAJUD_CONNECT_TIMEOUT", "5"))
+DATAJUD_READ_TIMEOUT = float(os.environ.get("DATAJUD_READ_TIMEOUT", "30"))
+
+class DataJudPageError(Exception):
+    """Uma página da busca paginada falhou; os resultados anteriores já foram entregues."""
+
+def _extract_items(result: Dict) -> List[Any]:
+    """Extrai a lista de itens de uma página de resultados do DataJud"""
+    for key in ('data', 'items', 'content', 'processos'):
+        if isinstance(result.get(key), list):
+            return result[key]
+    hits = result.get('hits')
+    if isinstance(hits, dict) and isinstance(hits.get('hits'), list):
+        return hits['hits']
+    return []
+
+def _extract_total(result: Dict) -> Optional[int]:
+    """Total de resultados informado pela resposta, se houver"""
+    hits = result.get('hits')
+    total = hits.get('total') if isinstance(hits, dict) else result.get('total')
+    if isinstance(total, dict):
+        total = total.get('value')
+    return total if isinstance(total, int) and not isinstance(total, bool) else None
+
+def _reference_entries(items: List[Any]) -> Dict[str, tuple]:
+    """Converte uma lista de referência do DataJud em {id: (rótulo, item)} para o autocomplete"""
+    entries = {}
+    for item in items:
+        if isinstance(item, dict):
+            label = item.get('nome') or item.get('descricao') or item.get('sigla')
+            entry_id = item.get('codigo') or item.get('id') or item.get('sigla') or label
+        else:
+            label = entry_id = item
+        if label:
+            entries[str(entry_id)] = (str(label), item)
+    return entries
 
 class DataJudService:
     """Serviço para integração com a API Pública do DataJud"""
     
-    def __init__(self):
+    def __init__(self,
+                 pool_size: Optional[int] = None,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None):
         self.base_url = "https://api-publica.datajud.cnj.jus.br"
         self.headers = {
             'Content-Type': 'application/json',
             'User-Agent': 'SaaS-Advogados/1.0'
         }
+        self.pool_size = pool_size or DATAJUD_POOL_SIZE
+        self.timeout = (connect_timeout or DATAJUD_CONNECT_TIMEOUT, read_timeout or DATAJUD_READ_TIMEOUT)
+        
+        # Sessão com conexões keep-alive reaproveitadas entre as threads do Flask.
+        # Ela não é alterada depois de criada e não guarda cookies, então não há
+        # estado de uma requisição vazando para outra.
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        
+        # Listas de referência (tribunais, classes, assuntos) mudam raramente
+        self.reference_cache = TTLCache(max_entries=16, snapshot_path=REFERENCE_SNAPSHOT_PATH)
+        self.autocomplete_indexes = {key: AutocompleteIndex() for key in REFERENCE_TTLS}
+        self.details_cache = TTLCache(max_entries=DATAJUD_DETAILS_CACHE_SIZE)
+        self.single_flight = SingleFlight()
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=DATAJUD_BATCH_WORKERS, thread_name_prefix='datajud-batch'
+        )
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='datajud-prefetch')
+    
+    def get_connection_stats(self) -> Dict:
+        """
+        Estatísticas de reaproveitamento de conexões com o DataJud
+        
+        Returns:
+            Dict com requisições feitas, conexões abertas e taxa de reaproveitamento
+        """
+        
+        # A sessão só fala com o DataJud, então todos os pools do adapter são dele
+        pools = self._adapter.poolmanager.pools
+        requests_made = 0
+        connections_opened = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requests_made += pool.num_requests
+                connections_opened += pool.num_connections
+        
+        return {
+            'pool_maxsize': self.pool_size,
+            'connect_timeout': self.timeout[0],
+            'read_timeout': self.timeout[1],
+            'requests': requests_made,
+            'connections_opened': connections_opened,
+            'connections_reused': max(0, requests_made - connections_opened),
+            'reuse_ratio': round(1 - connections_opened / requests_made, 3) if requests_made else None
+        }
+    
+    def _get_json(self, url: str, params: Optional[Dict] = None):
+        """
+        Faz o GET no DataJud e retorna o JSON da resposta
+        
+        Chamadas simultâneas com a mesma URL e os mesmos parâmetros compartilham
+        uma única requisição. Erros de rede e HTTP são levantados para o chamador.
+        """
+        
+        key = (url, tuple(sorted((params or {}).items())))
+        
+        def fetch():
+            response = gateway.get(url, params=params, session=self.session, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        
+        return self.single_flight.do(key, fetch)
     
     def search_processes(self, 
                         numero_processo: Optional[str] = None,
@@ -57,14 +197,7 @@ class DataJudService:
             params['dataFim'] = data_fim
         
         try:
-            response = requests.get(
-                f"{self.base_url}/processos",
-                params=params,
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"{self.base_url}/processos", params)
         except requests.exceptions.RequestException as e:
             return {
                 'error': True,
@@ -72,9 +205,61 @@ class DataJudService:
                 'data': []
             }
     
-    def get_process_details(self, processo_id: str) -> Dict:
+    def iter_processes(self,
+                       max_results: Optional[int] = None,
+                       size: Optional[int] = None,
+                       **filters) -> Iterator[Any]:
         """
-        Obtém detalhes de um processo específico
+        Percorre todas as páginas de uma busca de processos, um item por vez
+        
+        Enquanto os itens de uma página são consumidos, a página seguinte já é
+        buscada em segundo plano; no máximo duas páginas ficam em memória.
+        
+        Args:
+            max_results: Máximo de itens a retornar (limitado a DATAJUD_STREAM_MAX_RESULTS)
+            size: Tamanho de cada página
+            **filters: Os mesmos filtros de search_processes
+            
+        Raises:
+            DataJudPageError: Se uma página falhar no meio da busca
+        """
+        
+        max_results = min(max_results or DATAJUD_STREAM_MAX_RESULTS, DATAJUD_STREAM_MAX_RESULTS)
+        size = size or DATAJUD_STREAM_PAGE_SIZE
+        
+        def fetch(page):
+            return self.search_processes(page=page, size=size, **filters)
+        
+        page = 1
+        pending = self._prefetch_executor.submit(fetch, page)
+        delivered = 0
+        
+        while pending is not None:
+            result = pending.result()
+            if result.get('error'):
+                raise DataJudPageError(result.get('message'))
+            
+            items = _extract_items(result)
+            # Página menor que `size` não indica o fim: o DataJud pode limitar o
+            # tamanho da página. A busca termina na primeira página vazia ou ao
+            # atingir o total informado na resposta.
+            total = _extract_total(result)
+            last_page = (
+                not items
+                or delivered + len(items) >= max_results
+                or (total is not None and delivered + len(items) >= total)
+            )
+            
+            page += 1
+            pending = None if last_page else self._prefetch_executor.submit(fetch, page)
+            
+            for item in items[:max_results - delivered]:
+                delivered += 1
+                yield item
+    
+    def _fetch_process_details(self, processo_id: str) -> Dict:
+        """
+        Obtém detalhes de um processo específico diretamente do DataJud
         
         Args:
             processo_id: ID do processo
@@ -84,13 +269,7 @@ class DataJudService:
         """
         
         try:
-            response = requests.get(
-                f"{self.base_url}/processos/{processo_id}",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"{self.base_url}/processos/{processo_id}")
         except requests.exceptions.RequestException as e:
             return {
                 'error': True,
@@ -110,13 +289,7 @@ class DataJudService:
         """
         
         try:
-            response = requests.get(
-                f"{self.base_url}/processos/{processo_id}/movimentacoes",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"{self.base_url}/processos/{processo_id}/movimentacoes")
         except requests.exceptions.RequestException as e:
             return {
                 'error': True,
@@ -124,7 +297,7 @@ class DataJudService:
                 'data': []
             }
     
-    def get_tribunals(self) -> Dict:
+    def _fetch_tribunals(self) -> Dict:
         """
         Obtém lista de tribunais disponíveis
         
@@ -133,13 +306,7 @@ class DataJudService:
         """
         
         try:
-            response = requests.get(
-                f"{self.base_url}/tribunais",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"{self.base_url}/tribunais")
         except requests.exceptions.RequestException as e:
             return {
                 'error': True,
@@ -147,7 +314,7 @@ class DataJudService:
                 'data': []
             }
     
-    def get_process_classes(self) -> Dict:
+    def _fetch_process_classes(self) -> Dict:
         """
         Obtém lista de classes processuais
         
@@ -156,13 +323,7 @@ class DataJudService:
         """
         
         try:
-            response = requests.get(
-                f"{self.base_url}/classes",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"{self.base_url}/classes")
         except requests.exceptions.RequestException as e:
             return {
                 'error': True,
@@ -170,7 +331,7 @@ class DataJudService:
                 'data': []
             }
     
-    def get_process_subjects(self) -> Dict:
+    def _fetch_process_subjects(self) -> Dict:
         """
         Obtém lista de assuntos processuais
         
@@ -179,17 +340,142 @@ class DataJudService:
         """
         
         try:
-            response = requests.get(
-                f"{self.base_url}/assuntos",
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._get_json(f"{self.base_url}/assuntos")
         except requests.exceptions.RequestException as e:
             return {
                 'error': True,
                 'message': f'Erro ao obter assuntos processuais: {str(e)}',
                 'data': []
             }
-
+    
+    def _cached_reference(self, key: str, loader) -> Dict:
+        return self.reference_cache.get_or_load(
+            key,
+            loader,
+            ttl=REFERENCE_TTLS[key],
+            stale_ttl=REFERENCE_STALE_TTL,
+            cacheable=lambda result: not result.get('error')
+        )
+    
+    def get_tribunals(self) -> Dict:
+        """
+        Obtém lista de tribunais disponíveis, a partir do cache quando possível
+        
+        Returns:
+            Dict com a lista de tribunais
+        """
+        
+        return self._cached_reference('tribunals', self._fetch_tribunals)
+    
+    def get_process_classes(self) -> Dict:
+        """
+        Obtém lista de classes processuais, a partir do cache quando possível
+        
+        Returns:
+            Dict com a lista de classes processuais
+        """
+        
+        return self._cached_reference('classes', self._fetch_process_classes)
+    
+    def get_process_subjects(self) -> Dict:
+        """
+        Obtém lista de assuntos processuais, a partir do cache quando possível
+        
+        Returns:
+            Dict com a lista de assuntos processuais
+        """
+        
+        return self._cached_reference('subjects', self._fetch_process_subjects)
+    
+    def get_process_details(self, processo_id: str) -> Dict:
+        """
+        Obtém detalhes de um processo específico, a partir do cache quando possível
+        
+        Args:
+            processo_id: ID do processo
+            
+        Returns:
+            Dict com os detalhes do processo
+        """
+        
+        return self.details_cache.get_or_load(
+            processo_id,
+            lambda: self._fetch_process_details(processo_id),
+            ttl=DATAJUD_DETAILS_TTL,
+            cacheable=lambda result: not result.get('error')
+        )
+    
+    def get_processes_details_batch(self, processo_ids: List[str]) -> Dict:
+        """
+        Obtém detalhes de vários processos de uma vez, com no máximo
+        DATAJUD_BATCH_WORKERS consultas simultâneas ao DataJud
+        
+        Args:
+            processo_ids: Lista de números de processo (repetições são ignoradas)
+            
+        Returns:
+            Dict com o resultado de cada processo, na ordem recebida, e a
+            contagem de sucessos e erros
+        """
+        
+        processo_ids = list(dict.fromkeys(processo_ids))
+        futures = [
+            (processo_id, self._batch_executor.submit(self.get_process_details, processo_id))
+            for processo_id in processo_ids
+        ]
+        
+        results = []
+        for processo_id, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'error': True, 'message': f'Erro ao obter detalhes do processo: {str(e)}', 'data': None}
+            
+            if result.get('error'):
+                results.append({'processo_id': processo_id, 'error': True, 'message': result.get('message')})
+            else:
+                results.append({'processo_id': processo_id, 'error': False, 'data': result})
+        
+        error_count = sum(1 for item in results if item['error'])
+        return {
+            'results': results,
+            'count': len(results),
+            'success_count': len(results) - error_count,
+            'error_count': error_count
+        }
+    
+    def autocomplete(self, kind: str, query: str, limit: int = 10) -> Dict:
+        """
+        Sugestões por prefixo ou trecho em uma lista de referência
+        
+        O índice é montado a partir do cache de referência e atualizado de forma
+        incremental sempre que o cache devolve uma versão nova da lista.
+        
+        Args:
+            kind: 'tribunals', 'classes' ou 'subjects'
+            query: Texto digitado (acentos e maiúsculas são ignorados)
+            limit: Quantidade máxima de sugestões
+            
+        Returns:
+            Dict com as sugestões ordenadas por relevância
+        """
+        
+        loaders = {
+            'tribunals': self.get_tribunals,
+            'classes': self.get_process_classes,
+            'subjects': self.get_process_subjects,
+        }
+        reference = loaders[kind]()
+        index = self.autocomplete_indexes[kind]
+        
+        if reference.get('error'):
+            if not len(index):
+                return reference
+        elif reference is not index.source:
+            index.sync(_reference_entries(_extract_items(reference)), source=reference)
+        
+        return {
+            'type': kind,
+            'query': query,
+            'results': index.search(query, limit)
+        }
@@ -0,0 +1,150 @@
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.search_job import SearchJob, JobLease
+from src.services.comunicapje_service import lock_escrita, run_daily_searches
+
+DAILY_SEARCH_LEASE = 'comunicapje-daily-search'
+# Validade da trava; uma thread a renova enquanto o job roda, então só expira se o job morrer
+LEASE_SECONDS = 15 * 60
+# Intervalo entre as renovações da trava, bem abaixo da validade
+LEASE_HEARTBEAT_SECONDS = 60
+# Quantidade máxima de erros por alvo guardados no job
+MAX_STORED_ERRORS = 200
+
+# Executor em segundo plano, fora do ciclo das requisições HTTP
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-job')
+
+
+def _acquire_lease(name, job_id):
+    """Tenta obter a trava `name` para o job. Retorna False se outro job a detém."""
+    now = datetime.utcnow()
+
+    db.session.execute(
+        sqlite_insert(JobLease.__table__).values(name=name).on_conflict_do_nothing(index_elements=['name'])
+    )
+    acquired = JobLease.query.filter(
+        JobLease.name == name,
+        db.or_(JobLease.expires_at.is_(None), JobLease.expires_at < now),
+    ).update(
+        {JobLease.job_id: job_id, JobLease.expires_at: now + timedelta(seconds=LEASE_SECONDS)},
+        synchronize_session=False,
+    )
+    return acquired == 1
+
+def _renew_lease(name, job_id):
+    JobLease.query.filter_by(name=name, job_id=job_id).update(
+        {JobLease.expires_at: datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)},
+        synchronize_session=False,
+    )
+
+def _release_lease(name, job_id):
+    JobLease.query.filter_by(name=name, job_id=job_id).update(
+        {JobLease.job_id: None, JobLease.expires_at: None},
+        synchronize_session=False,
+    )
+
+@contextmanager
+def _lease_heartbeat(app, name, job_id):
+    """
+    Renova a trava a cada LEASE_HEARTBEAT_SECONDS enquanto o bloco executa.
+
+    A renovação roda em uma thread própria, independente do progresso do job: um
+    único alvo pode levar mais que LEASE_SECONDS sem reportar nada.
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        with app.app_context():
+            while not stop.wait(LEASE_HEARTBEAT_SECONDS):
+                with lock_escrita:
+                    try:
+                        _renew_lease(name, job_id)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        traceback.print_exc()
+
+    thread = threading.Thread(target=heartbeat, name=f'lease-{name}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def get_active_job():
+    """Retorna o job que detém a trava da busca diária, se ela ainda for válida."""
+    lease = db.session.get(JobLease, DAILY_SEARCH_LEASE)
+    if not lease or not lease.job_id or not lease.expires_at or lease.expires_at < datetime.utcnow():
+        return None
+    return db.session.get(SearchJob, lease.job_id)
+
+def enqueue_daily_search(app, data_inicio=None, dias_por_janela=None):
+    """
+    Cria um job da busca diária e o agenda no executor em segundo plano.
+
+    Retorna (job, None) quando o job foi agendado ou (None, job_ativo) quando já
+    existe uma execução em andamento.
+    """
+    params = {
+        'data_inicio': data_inicio.isoformat() if data_inicio else None,
+        'dias_por_janela': dias_por_janela,
+    }
+    job = SearchJob(status='queued', params=json.dumps(params))
+    db.session.add(job)
+    db.session.flush()
+
+    if not _acquire_lease(DAILY_SEARCH_LEASE, job.id):
+        db.session.rollback()
+        return None, get_active_job()
+
+    # Jobs que perderam a trava (ex.: processo reiniciado no meio da execução) não voltam mais
+    SearchJob.query.filter(
+        SearchJob.id != job.id,
+        SearchJob.status.in_(['queued', 'running']),
+    ).update(
+        {SearchJob.status: 'failed', SearchJob.error_message: 'Execução interrompida (trava expirada)',
+         SearchJob.finished_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+    _executor.submit(_run_daily_search_job, app, job.id, data_inicio, dias_por_janela)
+    return job, None
+
+def _run_daily_search_job(app, job_id, data_inicio, dias_por_janela):
+    with app.app_context():
+        job = db.session.get(SearchJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        def progresso(resumo):
+            # Mesmo escritor único das gravações do robô
+            with lock_escrita:
+                job.total_queries = resumo['consultas']
+                job.processed_queries = resumo['processadas']
+                job.total_found = resumo['total']
+                job.new_publications = resumo['novas']
+                job.errors = json.dumps(resumo['erros'][-MAX_STORED_ERRORS:], ensure_ascii=False)
+                db.session.commit()
+
+        try:
+            with _lease_heartbeat(app, DAILY_SEARCH_LEASE, job_id):
+                run_daily_searches(data_inicio=data_inicio, dias_por_janela=dias_por_janela, progresso=progresso)
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            job.status = 'failed'
+            job.error_message = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            _release_lease(DAILY_SEARCH_LEASE, job_id)
+            db.session.commit()
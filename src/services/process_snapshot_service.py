@@ -0,0 +1,131 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.process_snapshot import ProcessSnapshot, ProcessMovement
+
+
+def _extract_movements(result) -> List[Dict]:
+    """Extrai a lista de movimentações da resposta do DataJud"""
+    if isinstance(result, list):
+        return result
+    for key in ('data', 'movimentacoes', 'movimentos', 'items'):
+        if isinstance(result.get(key), list):
+            return result[key]
+    return []
+
+def _movement_key(movement) -> str:
+    """Identifica uma movimentação pelo seu conteúdo, independente da ordem das chaves"""
+    canonical = json.dumps(movement, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+def _movement_date(movement) -> Optional[str]:
+    if not isinstance(movement, dict):
+        return None
+    value = movement.get('dataHora') or movement.get('data')
+    return str(value)[:40] if value else None
+
+def refresh_process(datajud_service, processo_id: str) -> Dict:
+    """
+    Consulta as movimentações de um processo e grava apenas as que ainda não
+    estavam no snapshot local
+    
+    Args:
+        datajud_service: Instância de DataJudService usada para a consulta
+        processo_id: Número do processo
+        
+    Returns:
+        Dict com as movimentações novas e o total conhecido, ou o erro do DataJud
+    """
+    
+    result = datajud_service.get_process_movements(processo_id)
+    if isinstance(result, dict) and result.get('error'):
+        return result
+    
+    now = datetime.utcnow()
+    known = {
+        key for (key,) in db.session.query(ProcessMovement.movement_key)
+        .filter(ProcessMovement.process_number == processo_id)
+    }
+    
+    new_movements = []
+    rows = []
+    for movement in _extract_movements(result):
+        key = _movement_key(movement)
+        if key in known:
+            continue
+        known.add(key)
+        new_movements.append(movement)
+        rows.append({
+            'process_number': processo_id,
+            'movement_key': key,
+            'movement_date': _movement_date(movement),
+            'data': json.dumps(movement, ensure_ascii=False),
+            'first_seen_at': now,
+        })
+    
+    if rows:
+        # Atualizações simultâneas do mesmo processo não duplicam movimentações
+        db.session.execute(
+            sqlite_insert(ProcessMovement.__table__).on_conflict_do_nothing(
+                index_elements=['process_number', 'movement_key']
+            ),
+            rows
+        )
+    
+    # Upsert: duas primeiras atualizações simultâneas não colidem no índice único,
+    # e a contagem vem do banco (inclui o que a outra atualização gravou)
+    movement_count = (
+        select(func.count())
+        .where(ProcessMovement.process_number == processo_id)
+        .scalar_subquery()
+    )
+    stmt = sqlite_insert(ProcessSnapshot.__table__).values(
+        process_number=processo_id, movement_count=movement_count, last_refreshed_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['process_number'],
+        set_={
+            'movement_count': stmt.excluded.movement_count,
+            'last_refreshed_at': stmt.excluded.last_refreshed_at,
+        }
+    ).returning(ProcessSnapshot.__table__.c.movement_count)
+    total_movements = db.session.execute(stmt).scalar()
+    db.session.commit()
+    
+    return {
+        'process_number': processo_id,
+        'new_movements': new_movements,
+        'new_count': len(new_movements),
+        'total_movements': total_movements,
+        'refreshed_at': now.isoformat()
+    }
+
+def get_changes(processo_id: str, since: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Retorna, a partir do snapshot local, as movimentações vistas pela primeira
+    vez depois de `since` (todas, se não informado)
+    
+    Returns:
+        Dict com as movimentações, ou None se o processo nunca foi atualizado
+    """
+    
+    snapshot = ProcessSnapshot.query.filter_by(process_number=processo_id).first()
+    if snapshot is None:
+        return None
+    
+    query = ProcessMovement.query.filter_by(process_number=processo_id)
+    if since:
+        query = query.filter(ProcessMovement.first_seen_at > since)
+    movements = query.order_by(ProcessMovement.first_seen_at, ProcessMovement.id).all()
+    
+    return {
+        'process_number': processo_id,
+        'since': since.isoformat() if since else None,
+        'last_refreshed_at': snapshot.last_refreshed_at.isoformat() if snapshot.last_refreshed_at else None,
+        'movements': [movement.to_dict() for movement in movements],
+        'count': len(movements)
+    }
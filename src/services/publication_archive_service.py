@@ -0,0 +1,103 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import DateTime, bindparam, text, tuple_
+from src.models.user import db
+from src.models.publication import PublicationArchive
+
+# Idade (em dias) a partir da qual uma publicação vai para o arquivo morto
+ARCHIVE_AFTER_DAYS = int(os.environ.get("PUBLICATION_ARCHIVE_AFTER_DAYS", "90"))
+# Publicações movidas por transação
+ARCHIVE_BATCH_SIZE = int(os.environ.get("PUBLICATION_ARCHIVE_BATCH_SIZE", "1000"))
+
+_ARCHIVE_COLUMNS = (
+    'id, user_id, title, content, tribunal, publication_date, source_url, '
+    'process_number, source_hash, is_read, created_at'
+)
+
+# publication usa AUTOINCREMENT, então um id arquivado nunca volta a ser gerado
+_SELECT_BATCH_SQL = text("""
+    SELECT id FROM publication
+    WHERE id > :last_id
+      AND COALESCE(publication_date, created_at) < :cutoff
+    ORDER BY id
+    LIMIT :batch_size
+""").bindparams(bindparam('cutoff', type_=DateTime()))
+
+# content é copiado como está (já comprimido), sem passar pelo Python. Uma
+# publicação cujo hash já está no arquivo morto (gravada de novo depois de
+# arquivada) não é copiada, e o DELETE seguinte remove a duplicata.
+_COPY_SQL = text(f"""
+    INSERT INTO publication_archive ({_ARCHIVE_COLUMNS}, archived_at)
+    SELECT {_ARCHIVE_COLUMNS}, :archived_at FROM publication WHERE id IN :ids
+    ON CONFLICT DO NOTHING
+""").bindparams(bindparam('ids', expanding=True), bindparam('archived_at', type_=DateTime()))
+
+_DELETE_SQL = text("DELETE FROM publication WHERE id IN :ids").bindparams(
+    bindparam('ids', expanding=True)
+)
+
+
+def archived_source_hashes(keys: Iterable[Tuple[int, str]]) -> Set[Tuple[int, str]]:
+    """
+    Filtra os pares (user_id, source_hash) que já estão no arquivo morto
+
+    Args:
+        keys: Pares (user_id, source_hash) a verificar
+
+    Returns:
+        Conjunto com os pares encontrados em publication_archive
+    """
+
+    keys = list(keys)
+    found = set()
+    for start in range(0, len(keys), 400):
+        chunk = keys[start:start + 400]
+        found.update(
+            db.session.query(PublicationArchive.user_id, PublicationArchive.source_hash)
+            .filter(tuple_(PublicationArchive.user_id, PublicationArchive.source_hash).in_(chunk))
+            .all()
+        )
+    return found
+
+def archive_publications(older_than_days: Optional[int] = None,
+                         batch_size: Optional[int] = None) -> Dict:
+    """
+    Move para publication_archive as publicações mais antigas que o limite
+
+    A idade é contada pela data da publicação (ou pela data de criação, quando
+    ela não existe). Cada lote é copiado e removido da tabela principal na mesma
+    transação. As publicações arquivadas continuam no índice FTS (com o mesmo
+    id), e os triggers mantêm os contadores, que somam as duas tabelas.
+
+    Args:
+        older_than_days: Idade mínima em dias (padrão: ARCHIVE_AFTER_DAYS)
+        batch_size: Publicações por transação (padrão: ARCHIVE_BATCH_SIZE)
+
+    Returns:
+        Dict com a data de corte e a quantidade de publicações arquivadas
+    """
+
+    older_than_days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    archived = 0
+    last_id = 0
+    while True:
+        ids = list(db.session.execute(_SELECT_BATCH_SQL, {
+            'last_id': last_id, 'cutoff': cutoff, 'batch_size': batch_size
+        }).scalars())
+        if not ids:
+            break
+        try:
+            db.session.execute(_COPY_SQL, {'ids': ids, 'archived_at': datetime.utcnow()})
+            db.session.execute(_DELETE_SQL, {'ids': ids})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        archived += len(ids)
+        last_id = ids[-1]
+
+    return {'cutoff': cutoff.isoformat(), 'archived': archived}
@@ -0,0 +1,66 @@
+from typing import Dict
+from sqlalchemy import text
+from src.models.user import db
+from src.models.publication import PublicationCounter
+
+# Recalcula todos os contadores a partir das publicações (incluindo as arquivadas)
+REBUILD_STATEMENTS = [
+    "DELETE FROM publication_counter",
+    """
+    INSERT INTO publication_counter (user_id, tribunal, total, unread)
+    SELECT user_id, COALESCE(tribunal, ''), COUNT(*), SUM(COALESCE(is_read, 0) = 0)
+    FROM (
+        SELECT user_id, tribunal, is_read FROM publication
+        UNION ALL
+        SELECT user_id, tribunal, is_read FROM publication_archive
+    )
+    GROUP BY user_id, COALESCE(tribunal, '')
+    """,
+]
+
+
+def get_counters(user_id: int) -> Dict:
+    """
+    Lê os contadores de publicações de um usuário
+
+    Args:
+        user_id: Dono das publicações
+
+    Returns:
+        Dict com total, não lidas e a divisão por tribunal
+    """
+
+    counters = (
+        PublicationCounter.query
+        .filter(PublicationCounter.user_id == user_id, PublicationCounter.total > 0)
+        .order_by(PublicationCounter.tribunal)
+        .all()
+    )
+    return {
+        'user_id': user_id,
+        'total': sum(c.total for c in counters),
+        'unread': sum(c.unread for c in counters),
+        'tribunals': [c.to_dict() for c in counters]
+    }
+
+def rebuild_counters(connection=None) -> int:
+    """
+    Reconstrói os contadores do zero, numa única transação
+
+    Args:
+        connection: Conexão já em transação (usada pelas migrações); sem ela,
+            usa e confirma a sessão atual
+
+    Returns:
+        Quantidade de linhas de contador gravadas
+    """
+
+    if connection is not None:
+        for statement in REBUILD_STATEMENTS:
+            connection.execute(text(statement))
+        return connection.execute(text("SELECT COUNT(*) FROM publication_counter")).scalar()
+
+    for statement in REBUILD_STATEMENTS:
+        db.session.execute(text(statement))
+    db.session.commit()
+    return PublicationCounter.query.count()
@@ -0,0 +1,218 @@
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db, User
+from src.models.publication import Publication, PublicationArchive
+from src.services.publication_search_service import fts_watermark, index_new_publications, index_publications
+from src.services.search_config_matcher import record_matches
+
+# Linhas por executemany; todas as partes vão na mesma transação
+INGEST_CHUNK_SIZE = int(os.environ.get("PUBLICATION_INGEST_CHUNK_SIZE", "1000"))
+# Limite de linhas por requisição
+INGEST_MAX_ROWS = int(os.environ.get("PUBLICATION_INGEST_MAX_ROWS", "100000"))
+
+DEDUP_FIELDS = ('source_hash', 'source_url')
+
+
+class IngestLimitError(Exception):
+    """A carga tem mais linhas que o permitido por requisição"""
+
+_TEXT_FIELDS = {
+    'content': None,
+    'tribunal': 100,
+    'source_url': 500,
+    'process_number': 100,
+    'source_hash': 64,
+}
+
+
+def insert_publications(rows: List[Dict], chunk_size: Optional[int] = None) -> List[Dict]:
+    """
+    Insere publicações em partes, ignorando as já gravadas para o mesmo usuário
+    (mesmo source_hash), e as indexa e casa com as configurações dos donos
+
+    O INSERT só devolve id, user_id e source_hash; a indexação e o casamento
+    usam o texto que já está em memória, sem ler de volta (e descomprimir) o
+    conteúdo gravado. Publicações inseridas por outras ferramentas desde a
+    última indexação também entram no índice. Não confirma a transação.
+
+    Args:
+        rows: Valores das linhas de Publication
+        chunk_size: Linhas por executemany (padrão: INGEST_CHUNK_SIZE)
+
+    Returns:
+        As linhas efetivamente inseridas, com o id gerado
+    """
+
+    chunk_size = chunk_size or INGEST_CHUNK_SIZE
+    table = Publication.__table__
+    stmt = sqlite_insert(table).on_conflict_do_nothing(
+        index_elements=['user_id', 'source_hash']
+    ).returning(table.c.id, table.c.user_id, table.c.source_hash)
+
+    indexed_up_to = fts_watermark()
+    inserted = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        # Só a primeira ocorrência de um (user_id, source_hash) é inserida
+        by_key = {}
+        for row in chunk:
+            if row.get('source_hash') is not None:
+                by_key.setdefault((row['user_id'], row['source_hash']), row)
+        # Sem source_hash não há conflito: todas entram, com ids na ordem do lote
+        without_hash = iter([row for row in chunk if row.get('source_hash') is None])
+        for publication_id, user_id, source_hash in sorted(db.session.execute(stmt, chunk).all()):
+            row = next(without_hash) if source_hash is None else by_key[(user_id, source_hash)]
+            inserted.append(dict(row, id=publication_id))
+
+    index_publications(inserted)
+    index_new_publications(after=indexed_up_to)
+    record_matches(inserted)
+    return inserted
+
+def _parse_row(row) -> Tuple[Optional[Dict], Optional[str]]:
+    """Valida uma linha recebida e a converte para os valores da tabela"""
+    if not isinstance(row, dict):
+        return None, 'Linha deve ser um objeto JSON'
+
+    user_id = row.get('user_id')
+    if not isinstance(user_id, int) or isinstance(user_id, bool):
+        return None, 'user_id deve ser um inteiro'
+
+    title = row.get('title')
+    if not isinstance(title, str) or not title.strip():
+        return None, 'title é obrigatório'
+    if len(title) > 500:
+        return None, 'title deve ter no máximo 500 caracteres'
+
+    is_read = row.get('is_read')
+    if is_read is not None and not isinstance(is_read, bool):
+        return None, 'is_read deve ser true ou false'
+
+    values = {'user_id': user_id, 'title': title, 'is_read': bool(is_read)}
+    for field, max_length in _TEXT_FIELDS.items():
+        value = row.get(field)
+        if value is not None and not isinstance(value, str):
+            return None, f'{field} deve ser texto'
+        if value is not None and max_length and len(value) > max_length:
+            return None, f'{field} deve ter no máximo {max_length} caracteres'
+        values[field] = value
+
+    values['publication_date'] = None
+    if row.get('publication_date'):
+        try:
+            values['publication_date'] = datetime.fromisoformat(row['publication_date'])
+        except (TypeError, ValueError):
+            return None, 'publication_date deve estar no formato ISO'
+
+    return values, None
+
+def _existing_keys(field: str, keys: List[Tuple[int, str]]) -> set:
+    """Pares (user_id, valor) de field que já estão gravados, inclusive no arquivo morto"""
+    existing = set()
+    for model in (Publication, PublicationArchive):
+        column = getattr(model, field)
+        for start in range(0, len(keys), 400):
+            chunk = keys[start:start + 400]
+            existing.update(
+                db.session.query(model.user_id, column)
+                .filter(tuple_(model.user_id, column).in_(chunk))
+                .all()
+            )
+    return existing
+
+def ingest_publications(rows: Iterable, dedup: Optional[str] = None,
+                        max_rows: Optional[int] = None) -> Dict:
+    """
+    Grava publicações em lote, numa única transação
+
+    Cada linha é validada individualmente; linhas inválidas entram no relatório
+    de erros e não impedem a gravação das demais. Publicações com source_hash já
+    gravado para o mesmo usuário (ou repetido na própria carga) sempre são
+    ignoradas; com dedup='source_url' o mesmo vale para source_url. As
+    publicações gravadas são casadas com as configurações de pesquisa dos donos.
+
+    Args:
+        rows: Linhas a gravar (dicts), ou pares (índice, erro) já detectados na leitura
+        dedup: Campo adicional para ignorar duplicadas ('source_url')
+        max_rows: Máximo de linhas aceitas (padrão: INGEST_MAX_ROWS)
+
+    Returns:
+        Dict com recebidas, inseridas, duplicadas e a lista de erros por linha
+
+    Raises:
+        IngestLimitError: Se rows tiver mais que max_rows linhas (nada é gravado)
+    """
+
+    max_rows = max_rows or INGEST_MAX_ROWS
+    errors = []
+    parsed = []  # (índice, valores)
+    received = 0
+    for index, row in enumerate(rows):
+        received += 1
+        if received > max_rows:
+            raise IngestLimitError(f'Máximo de {max_rows} publicações por requisição')
+        if isinstance(row, tuple):
+            errors.append({'index': index, 'error': row[1]})
+            continue
+        values, error = _parse_row(row)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            parsed.append((index, values))
+
+    # Usuários validados em uma consulta
+    user_ids = {values['user_id'] for _, values in parsed}
+    known_users = {
+        user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(user_ids))
+    } if user_ids else set()
+
+    dedup_fields = ['source_hash'] + (['source_url'] if dedup == 'source_url' else [])
+    existing = {}
+    for field in dedup_fields:
+        keys = list({(v['user_id'], v[field]) for _, v in parsed if v[field] is not None})
+        existing[field] = _existing_keys(field, keys)
+
+    duplicates = 0
+    pending = []
+    for index, values in parsed:
+        if values['user_id'] not in known_users:
+            errors.append({'index': index, 'error': 'Usuário não encontrado'})
+            continue
+        duplicate = False
+        for field in dedup_fields:
+            key = (values['user_id'], values[field])
+            if values[field] is None:
+                continue
+            if key in existing[field]:
+                duplicate = True
+                break
+        if duplicate:
+            duplicates += 1
+            continue
+        # Também descarta repetições dentro da própria carga
+        for field in dedup_fields:
+            if values[field] is not None:
+                existing[field].add((values['user_id'], values[field]))
+        pending.append(values)
+
+    try:
+        inserted = len(insert_publications(pending))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Gravadas por outra requisição entre a verificação e o INSERT
+    duplicates += len(pending) - inserted
+
+    errors.sort(key=lambda error: error['index'])
+    return {
+        'received': received,
+        'inserted': inserted,
+        'duplicates': duplicates,
+        'failed': len(errors),
+        'errors': errors,
+    }
@@ -0,0 +1,270 @@
+import html
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import Integer, text
+from src.models.user import db
+from src.models.publication import CompressedText, PUBLICATION_FTS_INSERT
+from src.utils.text import normalize
+
+# Pesos do bm25 por coluna do índice: title, content, process_number, owner
+BM25_WEIGHTS = (10.0, 1.0, 5.0, 0.0)
+
+# Colunas pesquisáveis; owner só serve para restringir a busca ao dono
+_TEXT_COLUMNS = '{title content process_number}'
+
+# Tamanho (em palavras) do trecho do conteúdo devolvido com cada resultado
+SNIPPET_TOKENS = 16
+
+# Palavras como o tokenizador unicode61 as separa (letras e dígitos, com os
+# acentos combinados que o remove_diacritics descarta)
+_TOKEN = re.compile(r'(?:[^\W_]|[\u0300-\u036f])+')
+
+# O MATCH já vem restrito ao dono (coluna owner), então o índice só devolve as
+# publicações do usuário. O CROSS JOIN fixa a ordem das tabelas: o SQLite percorre
+# os resultados do MATCH e só então lê as linhas da tabela. O índice não guarda
+# o texto (ver migrations.py), então os destaques são montados a partir da
+# própria linha. As publicações arquivadas continuam no índice com o mesmo id e
+# são lidas de publication_archive.
+_SEARCH_SELECT = f"""
+    SELECT p.id, p.title, p.content, p.tribunal, p.publication_date, p.source_url,
+           p.process_number, p.is_read, p.created_at,
+           bm25(publication_fts, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS score
+    FROM publication_fts
+    CROSS JOIN {{table}} p ON p.id = publication_fts.rowid
+    WHERE publication_fts MATCH :match AND p.user_id = :user_id
+"""
+
+_COUNT_SELECT = """
+    SELECT COUNT(*)
+    FROM publication_fts
+    CROSS JOIN {table} p ON p.id = publication_fts.rowid
+    WHERE publication_fts MATCH :match AND p.user_id = :user_id
+"""
+
+def _search_sql(tables):
+    return text(
+        ' UNION ALL '.join(_SEARCH_SELECT.format(table=table) for table in tables)
+        + ' ORDER BY score LIMIT :limit OFFSET :offset'
+    ).columns(content=CompressedText)
+
+def _count_sql(tables):
+    return text('SELECT ' + ' + '.join(f'({_COUNT_SELECT.format(table=table)})' for table in tables))
+
+# Com e sem o arquivo morto (include_archived)
+_SEARCH_SQL = {
+    False: _search_sql(['publication']),
+    True: _search_sql(['publication', 'publication_archive']),
+}
+_COUNT_SQL = {
+    False: _count_sql(['publication']),
+    True: _count_sql(['publication', 'publication_archive']),
+}
+
+# Publicações gravadas fora do ORM (em lote ou por outras ferramentas) e ainda
+# não indexadas. Os ids só crescem, então basta olhar acima do maior já indexado.
+_UNINDEXED_SQL = text("""
+    SELECT id, user_id, title, content, process_number FROM publication p
+    WHERE id > :after
+      AND NOT EXISTS (SELECT 1 FROM publication_fts f WHERE f.rowid = p.id)
+    ORDER BY id
+    LIMIT :batch_size
+""").columns(id=Integer, content=CompressedText)
+
+# Publicações indexadas por comando em index_new_publications
+FTS_INDEX_BATCH_SIZE = 1000
+
+
+def fts_watermark(connection=None) -> int:
+    """Maior id já presente no índice FTS"""
+    executor = connection if connection is not None else db.session
+    return executor.execute(text("SELECT COALESCE(MAX(rowid), 0) FROM publication_fts")).scalar()
+
+def index_publications(publications) -> int:
+    """
+    Grava no índice FTS publicações recém-inseridas cujo texto já está em memória
+
+    Evita ler de volta (e descomprimir) o conteúdo que acabou de ser gravado.
+    Não confirma a transação.
+
+    Args:
+        publications: Dicts com id, user_id, title, content e process_number
+
+    Returns:
+        Quantidade de publicações indexadas
+    """
+
+    rows = [
+        {key: publication.get(key) for key in ('id', 'user_id', 'title', 'content', 'process_number')}
+        for publication in publications
+    ]
+    if rows:
+        db.session.execute(PUBLICATION_FTS_INSERT, rows)
+    return len(rows)
+
+def index_new_publications(connection=None, after: Optional[int] = None) -> int:
+    """
+    Grava no índice FTS o texto das publicações ainda não indexadas
+
+    Deve ser chamada na mesma transação das inserções em lote; não confirma a
+    transação.
+
+    Args:
+        connection: Conexão já em transação (usada pelas migrações); sem ela,
+            usa a sessão atual
+        after: Só considera ids acima deste (padrão: o maior já indexado)
+
+    Returns:
+        Quantidade de publicações indexadas
+    """
+
+    executor = connection if connection is not None else db.session
+    if after is None:
+        after = fts_watermark(connection)
+    indexed = 0
+    while True:
+        rows = executor.execute(_UNINDEXED_SQL, {
+            'after': after, 'batch_size': FTS_INDEX_BATCH_SIZE
+        }).mappings().all()
+        if not rows:
+            break
+        executor.execute(PUBLICATION_FTS_INSERT, [dict(row) for row in rows])
+        indexed += len(rows)
+        after = rows[-1]['id']
+    return indexed
+
+def _query_phrases(query: str) -> List[Tuple[Tuple[str, ...], bool]]:
+    # Mesmos termos de build_match_query, já normalizados: (palavras, casa por prefixo)
+    phrases = []
+    for term in query.split():
+        words = tuple(filter(None, (normalize(word) for word in _TOKEN.findall(term))))
+        if words:
+            phrases.append((words, False))
+    if phrases:
+        phrases[-1] = (phrases[-1][0], True)
+    return phrases
+
+def _find_hits(tokens: List[str], phrases) -> List[Tuple[int, int]]:
+    # Intervalos [início, fim) de palavras de cada ocorrência das frases
+    hits = []
+    for words, prefix in phrases:
+        size = len(words)
+        for start in range(len(tokens) - size + 1):
+            if tokens[start:start + size - 1] != list(words[:-1]):
+                continue
+            last = tokens[start + size - 1]
+            if last == words[-1] or (prefix and last.startswith(words[-1])):
+                hits.append((start, start + size))
+    return sorted(hits)
+
+def _highlight_html(value: Optional[str], phrases, max_tokens: Optional[int] = None) -> Optional[str]:
+    """
+    Escapa o texto e marca com <mark> as ocorrências das frases da busca
+
+    Com max_tokens, devolve só um trecho com essa quantidade de palavras,
+    começando um pouco antes da primeira ocorrência (como o snippet do FTS5).
+    """
+    # O texto vem da fonte externa: escapa tudo e só então insere as marcações
+    if value is None:
+        return None
+    matches = list(_TOKEN.finditer(value))
+    hits = _find_hits([normalize(match.group()) for match in matches], phrases)
+
+    first, last = 0, len(matches)
+    if max_tokens is not None and len(matches) > max_tokens:
+        first = max(0, min(hits[0][0] - 2 if hits else 0, len(matches) - max_tokens))
+        last = first + max_tokens
+    begin = matches[first].start() if first > 0 else 0
+    end = matches[last - 1].end() if last < len(matches) else len(value)
+
+    parts = ['…'] if first > 0 else []
+    position = begin
+    for start, stop in hits:
+        start, stop = max(start, first), min(stop, last)
+        if start >= stop or matches[start].start() < position:
+            continue
+        parts.append(html.escape(value[position:matches[start].start()]))
+        parts.append(f'<mark>{html.escape(value[matches[start].start():matches[stop - 1].end()])}</mark>')
+        position = matches[stop - 1].end()
+    parts.append(html.escape(value[position:end]))
+    if last < len(matches):
+        parts.append('…')
+    return ''.join(parts)
+
+def _isoformat(value) -> Optional[str]:
+    # Consultas em SQL puro devolvem as datas como texto do SQLite
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.isoformat()
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Converte o texto digitado pelo usuário numa expressão MATCH segura
+
+    Cada termo separado por espaço vira uma frase entre aspas (assim
+    "0001234-56.2024" busca os números em sequência e nenhum caractere é
+    interpretado como operador do FTS5). O último termo casa por prefixo.
+
+    Args:
+        query: Texto da busca
+
+    Returns:
+        Expressão para o MATCH, ou None se não houver termos pesquisáveis
+    """
+
+    terms = [term.replace('"', '') for term in query.split() if re.search(r'\w', term)]
+    if not terms:
+        return None
+
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+def search_publications(user_id: int, query: str, limit: int = 20, offset: int = 0,
+                        include_total: bool = False, include_archived: bool = False) -> Dict:
+    """
+    Busca textual nas publicações de um usuário, ordenada por relevância
+
+    Args:
+        user_id: Dono das publicações
+        query: Texto da busca (partes, palavras-chave ou número do processo)
+        limit: Quantidade máxima de resultados
+        offset: Deslocamento para paginação
+        include_total: Se True, conta todos os resultados da busca
+        include_archived: Se True, busca também no arquivo morto
+
+    Returns:
+        Dict com os resultados (com trechos destacados) e, se pedido, o total
+    """
+
+    match = build_match_query(query)
+    if match is None:
+        return {'results': [], 'total': 0 if include_total else None}
+
+    params = {
+        'match': f'owner : u{user_id} AND {_TEXT_COLUMNS} : ({match})',
+        'user_id': user_id, 'limit': limit, 'offset': offset,
+    }
+    rows = db.session.execute(_SEARCH_SQL[include_archived], params).mappings().all()
+    phrases = _query_phrases(query)
+
+    results = []
+    for row in rows:
+        results.append({
+            'id': row['id'],
+            'title': row['title'],
+            'title_highlight': _highlight_html(row['title'], phrases),
+            'snippet': _highlight_html(row['content'], phrases, SNIPPET_TOKENS),
+            'tribunal': row['tribunal'],
+            'publication_date': _isoformat(row['publication_date']),
+            'source_url': row['source_url'],
+            'process_number': row['process_number'],
+            'is_read': bool(row['is_read']),
+            'created_at': _isoformat(row['created_at']),
+            'score': row['score'],
+        })
+
+    total = db.session.execute(_COUNT_SQL[include_archived], params).scalar() if include_total else None
+    return {'results': results, 'total': total}
@@ -0,0 +1,46 @@
+from sqlalchemy import bindparam, text
+from src.models.user import db
+from src.models.publication import Publication, COMPRESS_MIN_BYTES
+
+# Publicações ainda gravadas como texto puro e grandes o bastante para comprimir
+_LEGACY_CONTENT_SQL = text("""
+    SELECT id, content FROM publication
+    WHERE id > :last_id AND typeof(content) = 'text'
+      AND length(CAST(content AS BLOB)) >= :min_bytes
+    ORDER BY id
+    LIMIT :batch_size
+""")
+
+
+def compress_legacy_content(batch_size: int = 500) -> int:
+    """
+    Comprime o conteúdo das publicações gravadas antes da compressão, em lotes
+
+    O arquivo do banco só diminui depois de um VACUUM.
+
+    Args:
+        batch_size: Publicações por transação
+
+    Returns:
+        Quantidade de publicações comprimidas
+    """
+
+    update = (
+        Publication.__table__.update()
+        .where(Publication.__table__.c.id == bindparam('row_id'))
+        .values(content=bindparam('row_content'))
+    )
+
+    last_id = 0
+    compressed = 0
+    while True:
+        rows = db.session.execute(_LEGACY_CONTENT_SQL, {
+            'last_id': last_id, 'min_bytes': COMPRESS_MIN_BYTES, 'batch_size': batch_size
+        }).all()
+        if not rows:
+            break
+        db.session.execute(update, [{'row_id': row.id, 'row_content': row.content} for row in rows])
+        db.session.commit()
+        compressed += len(rows)
+        last_id = rows[-1].id
+    return compressed
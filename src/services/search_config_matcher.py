@@ -0,0 +1,386 @@
+import json
+import re
+import threading
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.publication import PublicationMatch
+from src.models.search_config import SearchConfig, SearchConfigTerm
+from src.utils.text import normalize
+
+
+class KeywordAutomaton:
+    """
+    Autômato de Aho–Corasick para encontrar vários termos em uma única passada.
+
+    Os termos são normalizados (sem acentos, sem diferenciar maiúsculas) e só
+    contam quando aparecem como palavras inteiras. O autômato é montado uma vez,
+    a partir de todos os termos; para incluir ou remover termos, monta-se outro
+    (assim a trie nunca guarda nós de termos que saíram).
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self._goto = [{}]       # nó -> {caractere: nó seguinte}
+        self._fail = [0]        # nó -> nó de falha
+        self._output = [None]   # nó -> termo que termina neste nó
+        self._dict_link = [0]   # nó -> próximo nó terminal na cadeia de falhas
+        self._patterns = set()
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self._patterns
+
+    def _add(self, pattern: str):
+        if not pattern or pattern in self._patterns:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._dict_link.append(0)
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node] = pattern
+        self._patterns.add(pattern)
+
+    def _build(self):
+        # Busca em largura: o link de falha de um nó é o maior sufixo próprio que também está na trie
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._dict_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail
+                self._dict_link[child] = fail if self._output[fail] is not None else self._dict_link[fail]
+                queue.append(child)
+
+    def find(self, text: str) -> Set[str]:
+        """Retorna os termos encontrados como palavras inteiras em um texto já normalizado"""
+        found = set()
+        node = 0
+        length = len(text)
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+
+            match = node if self._output[node] is not None else self._dict_link[node]
+            if not match:
+                continue
+            after_ok = position + 1 == length or not text[position + 1].isalnum()
+            while match:
+                pattern = self._output[match]
+                start = position - len(pattern) + 1
+                if after_ok and (start == 0 or not text[start - 1].isalnum()):
+                    found.add(pattern)
+                match = self._dict_link[match]
+        return found
+
+
+class SearchConfigMatcher:
+    """
+    Casa publicações com as configurações de pesquisa ativas de todos os usuários.
+
+    Um único autômato reúne as palavras-chave de todas as configurações e um
+    índice reverso leva cada tribunal às configurações que o filtram. Uma
+    configuração casa quando alguma palavra-chave aparece no texto e a
+    publicação passa nos filtros de tribunal e tipo de processo (listas vazias
+    não filtram; publicação sem tribunal ou tipo não passa no filtro
+    correspondente). Configurações sem palavras-chave nunca casam.
+
+    As configurações são atualizadas uma a uma (ver refresh). O autômato só é
+    remontado quando o conjunto de palavras-chave muda, e remontá-lo custa
+    proporcional ao total de palavras-chave, não ao de configurações.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._automaton = KeywordAutomaton()
+        self._configs = {}           # config_id -> dados compilados da configuração
+        self._keyword_configs = {}   # palavra-chave normalizada -> config_ids
+        self._tribunal_configs = {}  # tribunal -> config_ids que filtram por ele
+        self._any_tribunal = set()   # config_ids sem filtro de tribunal
+        self._user_configs = {}      # user_id -> config_ids
+        self._user_patterns = {}     # user_id -> regex com as palavras-chave do usuário
+        self.version = None
+        self.last_update = None
+
+    def __len__(self):
+        return len(self._configs)
+
+    def _discard(self, config_id):
+        compiled = self._configs.pop(config_id, None)
+        if compiled is None:
+            return
+        for keyword in compiled['keywords']:
+            ids = self._keyword_configs[keyword]
+            ids.discard(config_id)
+            if not ids:
+                del self._keyword_configs[keyword]
+        for tribunal in compiled['tribunals']:
+            ids = self._tribunal_configs[tribunal]
+            ids.discard(config_id)
+            if not ids:
+                del self._tribunal_configs[tribunal]
+        self._any_tribunal.discard(config_id)
+        user_ids = self._user_configs[compiled['user_id']]
+        user_ids.discard(config_id)
+        if not user_ids:
+            del self._user_configs[compiled['user_id']]
+        self._user_patterns.pop(compiled['user_id'], None)
+
+    def _add(self, config):
+        keywords = config.get_normalized_terms('keyword')
+        tribunals = config.get_normalized_terms('tribunal')
+        process_types = config.get_normalized_terms('process_type')
+        self._configs[config.id] = {
+            'user_id': config.user_id,
+            'name': config.name,
+            'keywords': keywords,
+            'tribunals': tribunals,
+            'process_types': process_types,
+        }
+
+        for keyword in keywords:
+            self._keyword_configs.setdefault(keyword, set()).add(config.id)
+        for tribunal in tribunals:
+            self._tribunal_configs.setdefault(tribunal, set()).add(config.id)
+        if not tribunals:
+            self._any_tribunal.add(config.id)
+        self._user_configs.setdefault(config.user_id, set()).add(config.id)
+        self._user_patterns.pop(config.user_id, None)
+
+    def load(self, configs: Iterable, version: Hashable = None):
+        """Recompila o matcher do zero a partir das configurações ativas informadas"""
+        with self._lock:
+            self._reset()
+            self.refresh(configs, version=version)
+
+    def refresh(self, configs: Iterable, removed_ids: Iterable = (), version: Hashable = None):
+        """
+        Atualiza só as configurações informadas (as inativas saem do matcher) e
+        remove as de removed_ids
+        """
+        with self._lock:
+            keywords = set(self._keyword_configs)
+            for config_id in removed_ids:
+                self._discard(config_id)
+            for config in configs:
+                self._discard(config.id)
+                if config.is_active:
+                    self._add(config)
+                if config.updated_at and (self.last_update is None or config.updated_at > self.last_update):
+                    self.last_update = config.updated_at
+            if set(self._keyword_configs) != keywords:
+                self._automaton = KeywordAutomaton(self._keyword_configs)
+            self.version = version
+
+    def users(self) -> Set:
+        """Donos de pelo menos uma configuração ativa"""
+        with self._lock:
+            return set(self._user_configs)
+
+    def _user_pattern(self, user_id):
+        # Palavras-chave do usuário terminando em fim de palavra; descarta num
+        # único passo do motor de regex os textos em que nenhuma delas aparece.
+        # Sem exigir o início de palavra a busca é bem mais rápida (o autômato
+        # confere depois), e o falso positivo só custa uma passada do autômato
+        pattern = self._user_patterns.get(user_id)
+        if pattern is None:
+            keywords = {
+                keyword
+                for config_id in self._user_configs.get(user_id, ())
+                for keyword in self._configs[config_id]['keywords']
+            }
+            alternatives = '|'.join(re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True))
+            pattern = re.compile(rf'(?:{alternatives})(?![^\W_])') if keywords else _NO_MATCH
+            self._user_patterns[user_id] = pattern
+        return pattern
+
+    def match(self, text: str, tribunal: Optional[str] = None,
+              process_type: Optional[str] = None, user_ids: Optional[Iterable] = None) -> List[Dict]:
+        """
+        Casa um texto de publicação com as configurações compiladas
+
+        Args:
+            text: Texto da publicação (título e conteúdo)
+            tribunal: Sigla do tribunal da publicação, se conhecida
+            process_type: Classe/tipo do processo, se conhecido (basta conter o
+                tipo configurado, então o título da publicação também serve)
+            user_ids: Se informado, só as configurações destes usuários são avaliadas
+
+        Returns:
+            Lista de configurações que casaram, com as palavras-chave encontradas
+        """
+
+        with self._lock:
+            if user_ids is not None:
+                user_ids = [user_id for user_id in set(user_ids) if user_id in self._user_configs]
+                if not user_ids:
+                    return []
+
+            normalized_text = normalize(text or '')
+            if user_ids is not None:
+                hits = [self._user_pattern(user_id).search(normalized_text) for user_id in user_ids]
+                hits = [hit.start() for hit in hits if hit]
+                if not hits:
+                    return []
+                # Antes do primeiro acerto não há palavra-chave destes usuários; o
+                # recorte começa depois de um espaço, que é fronteira de palavra
+                normalized_text = normalized_text[normalized_text.rfind(' ', 0, min(hits)) + 1:]
+            normalized_type = normalize(process_type) if process_type else None
+            found = self._automaton.find(normalized_text)
+
+            # Sem tribunal informado, só passam as configurações que não filtram por tribunal
+            allowed = self._any_tribunal
+            if tribunal:
+                key = SearchConfigTerm.normalize_value('tribunal', tribunal)
+                allowed = self._tribunal_configs.get(key, set()) | allowed
+
+            matched = {}
+            for keyword in found:
+                for config_id in self._keyword_configs.get(keyword, ()):
+                    if config_id not in allowed:
+                        continue
+                    matched.setdefault(config_id, set()).add(keyword)
+
+            results = []
+            for config_id, keywords in matched.items():
+                compiled = self._configs[config_id]
+                if user_ids is not None and compiled['user_id'] not in user_ids:
+                    continue
+                if compiled['process_types'] and not (
+                    normalized_type and any(p in normalized_type for p in compiled['process_types'])
+                ):
+                    continue
+                results.append({
+                    'config_id': config_id,
+                    'user_id': compiled['user_id'],
+                    'name': compiled['name'],
+                    'matched_keywords': sorted(keywords),
+                })
+
+        results.sort(key=lambda item: (item['user_id'], item['config_id']))
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'configs': len(self._configs),
+                'keywords': len(self._automaton),
+                'tribunals': len(self._tribunal_configs),
+                'users': len(self._user_configs),
+            }
+
+
+# Regex que nunca casa, para usuários sem palavras-chave
+_NO_MATCH = re.compile(r'(?!)')
+
+# Matcher compartilhado pelo processo, atualizado quando as configurações mudam
+matcher = SearchConfigMatcher()
+
+def _configs_version():
+    # Criar, alterar ou (des)ativar muda o maior updated_at; excluir muda a contagem.
+    # Como o carimbo vem do banco, vale para todos os processos (workers) da aplicação.
+    count, last_update = db.session.query(
+        func.count(SearchConfig.id), func.max(SearchConfig.updated_at)
+    ).one()
+    return count, last_update
+
+def get_matcher() -> SearchConfigMatcher:
+    """
+    Retorna o matcher compartilhado, atualizado com as configurações que mudaram
+
+    Na primeira chamada compila todas as configurações ativas. Depois, quando o
+    carimbo do banco muda, recarrega só as alteradas desde a última atualização
+    (updated_at) e descarta as que foram excluídas.
+    """
+    version = _configs_version()
+    if matcher.version == version:
+        return matcher
+
+    with matcher._lock:
+        if matcher.version == version:
+            return matcher
+        if matcher.version is None:
+            matcher.load(SearchConfig.query.filter_by(is_active=True).all(), version)
+            return matcher
+
+        existing = {config_id for (config_id,) in db.session.query(SearchConfig.id)}
+        removed = [config_id for config_id in list(matcher._configs) if config_id not in existing]
+        changed = SearchConfig.query
+        if matcher.last_update is not None:
+            # >= para não perder alterações gravadas no mesmo instante da última lida
+            changed = changed.filter(SearchConfig.updated_at >= matcher.last_update)
+        matcher.refresh(changed.all(), removed_ids=removed, version=version)
+    return matcher
+
+def record_matches(publications: Iterable[Dict]) -> int:
+    """
+    Grava as configurações do dono que casam com publicações recém-inseridas
+
+    Só são avaliadas as configurações dos donos do lote: publicações de quem
+    não tem configuração ativa nem chegam a ser normalizadas. Cada texto
+    distinto é avaliado uma única vez (o robô grava a mesma comunicação para
+    todos os assinantes da OAB). O tipo do processo é procurado no título, que
+    no robô começa pelo tipo da comunicação. Não confirma a transação.
+
+    Args:
+        publications: Publicações gravadas, com id, user_id, title, content e tribunal
+
+    Returns:
+        Quantidade de correspondências gravadas
+    """
+
+    current = get_matcher()
+    owners = current.users()
+    if not owners:
+        return 0
+
+    # Texto -> publicações com aquele texto cujos donos têm configurações
+    by_text = {}
+    for publication in publications:
+        if publication['user_id'] in owners:
+            key = (publication['title'], publication['content'], publication.get('tribunal'))
+            by_text.setdefault(key, []).append(publication)
+
+    rows = []
+    for (title, content, tribunal), same_text in by_text.items():
+        matches = current.match(
+            ' '.join(filter(None, (title, content))), tribunal=tribunal, process_type=title,
+            user_ids={publication['user_id'] for publication in same_text}
+        )
+        for publication in same_text:
+            for match in matches:
+                if match['user_id'] != publication['user_id']:
+                    continue
+                rows.append({
+                    'publication_id': publication['id'],
+                    'config_id': match['config_id'],
+                    'matched_keywords': json.dumps(match['matched_keywords'], ensure_ascii=False),
+                })
+
+    if rows:
+        db.session.execute(sqlite_insert(PublicationMatch.__table__).on_conflict_do_nothing(), rows)
+    return len(rows)
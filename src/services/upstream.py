@@ -0,0 +1,265 @@
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+# Vazão inicial e limites do controle adaptativo (requisições por segundo, por host)
+UPSTREAM_RATE = float(os.environ.get("UPSTREAM_RATE", "10"))
+UPSTREAM_MIN_RATE = float(os.environ.get("UPSTREAM_MIN_RATE", "0.5"))
+UPSTREAM_MAX_RATE = float(os.environ.get("UPSTREAM_MAX_RATE", "20"))
+UPSTREAM_BURST = int(os.environ.get("UPSTREAM_BURST", "10"))
+# Novas tentativas e espera entre elas (segundos)
+UPSTREAM_MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.environ.get("UPSTREAM_BACKOFF_MAX", "30"))
+# Falhas seguidas que abrem o circuito e tempo até a próxima tentativa
+UPSTREAM_FAILURE_THRESHOLD = int(os.environ.get("UPSTREAM_FAILURE_THRESHOLD", "5"))
+UPSTREAM_RESET_TIMEOUT = float(os.environ.get("UPSTREAM_RESET_TIMEOUT", "30"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """O circuito do host está aberto; a chamada nem chegou a ser feita."""
+
+
+class TokenBucket:
+    """
+    Balde de fichas com vazão adaptativa (AIMD).
+
+    Cada chamada consome uma ficha; sem fichas, a chamada espera. A vazão sobe
+    um pouco a cada sucesso e cai pela metade a cada 429 do upstream.
+    """
+
+    def __init__(self, rate, capacity, min_rate, max_rate):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        # A ficha é reservada sob o lock e a espera acontece fora dele
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            self._refill()
+            return {'rate': round(self.rate, 3), 'tokens': round(self.tokens, 3), 'capacity': self.capacity}
+
+
+class CircuitBreaker:
+    """
+    Disjuntor por host: após `failure_threshold` falhas seguidas o circuito abre e
+    as chamadas falham na hora; passado `reset_timeout`, uma chamada de teste é
+    liberada e o resultado dela fecha ou reabre o circuito.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def on_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        # A chamada de teste terminou sem resultado sobre o host; libera outra
+        with self._lock:
+            self._probe_in_flight = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 3)
+            return {'state': self.state, 'consecutive_failures': self.failures, 'retry_in': retry_in}
+
+
+class _HostState:
+    def __init__(self):
+        self.bucket = TokenBucket(UPSTREAM_RATE, UPSTREAM_BURST, UPSTREAM_MIN_RATE, UPSTREAM_MAX_RATE)
+        self.breaker = CircuitBreaker(UPSTREAM_FAILURE_THRESHOLD, UPSTREAM_RESET_TIMEOUT)
+        self.counters = {'requests': 0, 'retries': 0, 'throttled': 0, 'failures': 0, 'rejected': 0}
+
+
+class UpstreamGateway:
+    """
+    Camada comum para chamadas às APIs externas (ComunicaPJE, DataJud).
+
+    Por host, aplica um limitador de vazão adaptativo, novas tentativas com espera
+    exponencial (respeitando Retry-After) e um disjuntor. Falhas definitivas chegam
+    ao chamador como as de sempre: exceções de `requests` ou a resposta com erro.
+    """
+
+    def __init__(self, max_retries=None):
+        self.max_retries = UPSTREAM_MAX_RETRIES if max_retries is None else max_retries
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url) -> _HostState:
+        host = urlparse(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState()
+            return state
+
+    @staticmethod
+    def _backoff(attempt) -> float:
+        # Espera exponencial com jitter completo
+        return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def _retry_after(response) -> Optional[float]:
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def _count(self, state, counter):
+        with self._lock:
+            state.counters[counter] += 1
+
+    def request(self, method, url, session=None, **kwargs) -> requests.Response:
+        state = self._host(url)
+        client = session or requests
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+
+            if not state.breaker.allow():
+                self._count(state, 'rejected')
+                raise CircuitOpenError(f'Circuito aberto para {urlparse(url).netloc}')
+
+            state.bucket.acquire()
+            self._count(state, 'requests')
+
+            try:
+                response = client.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                state.breaker.on_failure()
+                self._count(state, 'failures')
+                if last_attempt:
+                    raise
+                self._count(state, 'retries')
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.exceptions.RequestException:
+                # Demais erros de requests (corpo truncado, redirecionamentos, URL
+                # inválida...) contam como falha, mas não adianta repetir
+                state.breaker.on_failure()
+                self._count(state, 'failures')
+                raise
+            except BaseException:
+                # Qualquer outro erro não diz nada sobre o host, mas não pode deixar
+                # a chamada de teste do disjuntor presa para sempre
+                state.breaker.release_probe()
+                raise
+
+            if response.status_code not in RETRY_STATUS:
+                state.breaker.on_success()
+                state.bucket.on_success()
+                return response
+
+            if response.status_code == 429:
+                # Limite do upstream: desacelera, mas não conta como falha do host
+                state.bucket.on_throttle()
+                state.breaker.on_success()
+                self._count(state, 'throttled')
+            else:
+                state.breaker.on_failure()
+                self._count(state, 'failures')
+
+            if last_attempt:
+                return response
+
+            self._count(state, 'retries')
+            wait = self._retry_after(response)
+            # Devolve a conexão ao pool antes de tentar de novo
+            response.close()
+            time.sleep(min(UPSTREAM_BACKOFF_MAX, wait) if wait is not None else self._backoff(attempt))
+
+        return response
+
+    def get(self, url, session=None, **kwargs) -> requests.Response:
+        return self.request('GET', url, session=session, **kwargs)
+
+    def snapshot(self) -> Dict:
+        """Estado atual por host (fichas, vazão, disjuntor e contadores), para os admins."""
+        with self._lock:
+            hosts = dict(self._hosts)
+        result = {}
+        for host, state in hosts.items():
+            with self._lock:
+                counters = dict(state.counters)
+            result[host] = {
+                'rate_limiter': state.bucket.snapshot(),
+                'circuit_breaker': state.breaker.snapshot(),
+                'counters': counters,
+            }
+        return result
+
+
+gateway = UpstreamGateway()
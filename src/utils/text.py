@@ -0,0 +1,16 @@
+import unicodedata
+from functools import lru_cache
+
+
+@lru_cache(maxsize=65536)
+def _normalize_word(word: str) -> str:
+    decomposed = unicodedata.normalize('NFKD', word)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+def normalize(text: str) -> str:
+    """Remove acentos, ignora maiúsculas/minúsculas e colapsa espaços"""
+    # Normaliza palavra por palavra: o resultado é o mesmo, e o vocabulário
+    # das publicações se repete tanto que quase toda palavra já está no cache
+    return ' '.join(filter(None, map(_normalize_word, str(text).split())))
@@ -0,0 +1,47 @@
+import pytest
+from flask import Flask
+
+from src.models.user import db, User
+from src.models.plan import Plan
+from src.models.subscription import Subscription
+from src.models.publication import Publication, PublicationArchive, PublicationCounter, PublicationMatch
+from src.models.search_config import SearchConfig, SearchConfigTerm
+from src.models.search_target import SearchTarget
+from src.models.admin import Admin
+from src.models.search_job import SearchJob, JobLease
+from src.models.process_snapshot import ProcessSnapshot, ProcessMovement
+from src.models.migrations import upgrade_schema
+from src.routes.publication import publication_bp
+from src.routes.search_config import search_config_bp
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Aplicação com os blueprints de publicações sobre um banco SQLite temporário"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.register_blueprint(publication_bp, url_prefix='/api')
+    app.register_blueprint(search_config_bp, url_prefix='/api')
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='maria', email='maria@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user
@@ -0,0 +1,33 @@
+from src.services.autocomplete import AutocompleteIndex
+
+
+def _index(labels):
+    index = AutocompleteIndex()
+    index.sync({entry_id: (label, None) for entry_id, label in enumerate(labels)})
+    return index
+
+
+def test_prefix_and_infix_ranking():
+    index = _index(['Tribunal de Justiça de São Paulo', 'São Paulo', 'Justiça Federal', 'Paulo Afonso'])
+
+    assert [r['label'] for r in index.search('sao paulo')][:2] == ['São Paulo', 'Tribunal de Justiça de São Paulo']
+    assert index.search('paulo')[0]['label'] == 'Paulo Afonso'
+    # Trecho no meio de uma palavra só é encontrado pelos trigramas
+    assert [r['label'] for r in index.search('ustiç')] == ['Justiça Federal', 'Tribunal de Justiça de São Paulo']
+
+
+def test_prefix_scan_stops_at_the_first_non_matching_word():
+    index = _index(['alfa', 'alfabeto', 'beta'])
+
+    assert index._word_prefix_matches('alf') == {0, 1}
+    assert index._word_prefix_matches('z') == set()
+
+
+def test_sync_reindexes_only_changes():
+    index = _index(['Vara Cível', 'Vara Criminal'])
+
+    stats = index.sync({0: ('Vara Cível', None), 2: ('Vara do Trabalho', None)})
+
+    assert stats == {'added': 1, 'removed': 1, 'changed': 0}
+    assert [r['id'] for r in index.search('vara')] == [0, 2]
+    assert index.search('criminal') == []
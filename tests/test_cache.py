@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services import cache as cache_module
+from src.services.cache import SingleFlight, TTLCache
+
+
+def test_entries_expire_and_serve_stale_while_refreshing(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now[0])
+    cache = TTLCache()
+    values = iter(['v1', 'v2'])
+
+    assert cache.get_or_load('k', lambda: next(values), ttl=10, stale_ttl=10) == 'v1'
+    assert cache.get_or_load('k', lambda: 'nunca', ttl=10, stale_ttl=10) == 'v1'
+
+    # Vencida, mas dentro do stale_ttl: devolve o valor antigo e atualiza em segundo plano
+    now[0] += 15
+    assert cache.get_or_load('k', lambda: next(values), ttl=10, stale_ttl=10) == 'v1'
+    cache._executor.shutdown(wait=True)
+    assert cache.get_or_load('k', lambda: 'nunca', ttl=10, stale_ttl=10) == 'v2'
+
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['stale_hits'], stats['misses'], stats['refreshes']) == (2, 1, 1, 1)
+
+
+def test_uncacheable_values_and_lru_limit():
+    cache = TTLCache(max_entries=2)
+
+    error = {'error': True}
+    assert cache.get_or_load('erro', lambda: error, ttl=60, cacheable=lambda v: not v.get('error')) is error
+    assert cache.get_stats()['entries'] == 0
+
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get_or_load('a', lambda: None, ttl=60)
+    cache.set('c', 3, ttl=60)
+
+    # "b" era a menos usada quando "c" entrou
+    assert cache.get_or_load('a', lambda: None, ttl=60) == 1
+    assert cache.get_or_load('b', lambda: 'recarregado', ttl=60) == 'recarregado'
+
+
+def test_snapshot_survives_restart(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    TTLCache(snapshot_path=path).set('tribunais', ['TJSP'], ttl=60)
+
+    restored = TTLCache(snapshot_path=path)
+    assert restored.get_or_load('tribunais', lambda: [], ttl=60) == ['TJSP']
+
+
+def _coalesce(single_flight, fn, callers=4):
+    """Chama single_flight.do em paralelo, liberando a primeira execução só
+    quando as demais chamadas já estão esperando por ela"""
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(single_flight.do, 'k', blocked) for _ in range(callers)]
+        deadline = time.monotonic() + 5
+        while single_flight.get_stats()['coalesced'] < callers - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+    return outcomes
+
+
+def test_single_flight_shares_one_execution():
+    single_flight = SingleFlight()
+    executions = []
+
+    results = _coalesce(single_flight, lambda: executions.append(1) or {'data': [1]})
+
+    assert executions == [1]
+    assert all(result is results[0] for result in results)
+    assert single_flight.get_stats() == {'calls': 4, 'executions': 1, 'coalesced': 3, 'in_flight': 0}
+
+    # Terminada a execução, a chave volta a executar
+    assert single_flight.do('k', lambda: 'nova') == 'nova'
+
+
+def test_single_flight_propagates_the_error_to_every_caller():
+    single_flight = SingleFlight()
+    error = ValueError('upstream fora do ar')
+
+    def fail():
+        raise error
+
+    assert _coalesce(single_flight, fail) == [error] * 4
+    assert single_flight.get_stats()['in_flight'] == 0
+    with pytest.raises(ValueError):
+        single_flight.do('k', fail)
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services import comunicapje_service
+from src.services.certidao_cache import CertidaoCache
+
+
+def test_certidao_e_baixada_uma_vez_mesmo_com_pedidos_simultaneos(tmp_path):
+    cache = CertidaoCache(str(tmp_path), max_bytes=1024 * 1024)
+    downloads = []
+    liberar = threading.Event()
+
+    def baixar(hash_):
+        downloads.append(hash_)
+        liberar.wait(5)
+        return b'%PDF-certidao'
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(cache.obter_ou_baixar, 'abc123', baixar) for _ in range(4)]
+        time.sleep(0.05)
+        liberar.set()
+        caminhos = {future.result() for future in futures}
+
+    assert downloads == ['abc123']
+    assert caminhos == {os.path.join(str(tmp_path), 'ab', 'abc123.pdf')}
+    assert cache.obter_ou_baixar('abc123', lambda hash_: pytest.fail('não deveria baixar')) in caminhos
+    with open(caminhos.pop(), 'rb') as arquivo:
+        assert arquivo.read() == b'%PDF-certidao'
+
+
+def test_cache_remove_as_certidoes_usadas_ha_mais_tempo(tmp_path):
+    cache = CertidaoCache(str(tmp_path), max_bytes=250)
+    antiga = cache.gravar('antiga', b'x' * 100)
+    usada = cache.gravar('usada', b'x' * 100)
+    os.utime(antiga, (1, 1))
+    os.utime(usada, (2, 2))
+    assert cache.obter('usada') == usada  # O acerto conta como uso recente
+
+    cache.gravar('nova', b'x' * 100)
+
+    assert cache.obter('antiga') is None
+    assert cache.obter('usada') and cache.obter('nova')
+    with pytest.raises(ValueError):
+        cache.caminho('../fora')
+
+
+def test_certidoes_do_lote_sao_vinculadas_na_pasta_do_envio(tmp_path, monkeypatch):
+    cache = CertidaoCache(str(tmp_path / 'cache'), max_bytes=1024 * 1024)
+    monkeypatch.setattr(comunicapje_service, 'certidao_cache', cache)
+    downloads = []
+
+    def baixar(hash_, limitador=None):
+        downloads.append(hash_)
+        if hash_ == 'faltando':
+            raise ValueError('sem certidão')
+        return f'%PDF-{hash_}'.encode()
+
+    monkeypatch.setattr(comunicapje_service, '_baixar_certidao', baixar)
+    pasta = tmp_path / 'envio'
+    pasta.mkdir()
+
+    certidoes = comunicapje_service.baixar_certidoes(['h1', 'h2', 'h1', None, 'faltando'], str(pasta))
+
+    assert sorted(downloads) == ['faltando', 'h1', 'h2']
+    assert certidoes == {
+        'h1': str(pasta / 'certidao_h1.pdf'),
+        'h2': str(pasta / 'certidao_h2.pdf'),
+        'faltando': None,
+    }
+    assert (pasta / 'certidao_h2.pdf').read_bytes() == b'%PDF-h2'
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+import pytest
+
+from src.models.publication import Publication
+from src.models.search_target import SearchTarget
+from src.models.user import db, User
+from src.services import comunicapje_service
+from src.services.publication_archive_service import archive_publications
+from src.services.comunicapje_service import (
+    LimitadorPorHost, PaginacaoIncompletaError, _carregar_alvos, _processar_janela, _publicacao_de_item, _salvar_publicacoes,
+    iterar_comunicacoes, normalizar_oab
+)
+
+ITEM_SEM_HASH = {
+    'siglaTribunal': 'TJSP',
+    'numeroprocessocommascara': '0001234-56.2024.8.26.0100',
+    'datadisponibilizacao': '2024-05-10',
+    'tipoComunicacao': 'Intimação',
+    'texto': 'Fica a parte intimada.',
+}
+
+
+def test_item_sem_hash_recebe_hash_derivado_estavel():
+    primeira = _publicacao_de_item(dict(ITEM_SEM_HASH), 1)['source_hash']
+    segunda = _publicacao_de_item(dict(ITEM_SEM_HASH), 1)['source_hash']
+    outro_texto = _publicacao_de_item(dict(ITEM_SEM_HASH, texto='Outro texto.'), 1)['source_hash']
+
+    assert primeira and len(primeira) == 64
+    assert primeira == segunda
+    assert primeira != outro_texto
+
+
+def test_hash_do_comunicapje_tem_precedencia():
+    assert _publicacao_de_item(dict(ITEM_SEM_HASH, hash='abc'), 1)['source_hash'] == 'abc'
+
+
+def test_item_sem_hash_nao_e_gravado_duas_vezes(user):
+    linhas = [_publicacao_de_item(dict(ITEM_SEM_HASH), user.id)]
+
+    assert _salvar_publicacoes(linhas) == 1
+    assert _salvar_publicacoes(linhas) == 0
+    assert Publication.query.count() == 1
+
+
+def test_publicacao_arquivada_nao_e_gravada_de_novo(user):
+    linhas = [_publicacao_de_item(dict(ITEM_SEM_HASH, hash='h1'), user.id)]
+    _salvar_publicacoes(linhas)
+    archive_publications(older_than_days=0)
+
+    assert _salvar_publicacoes(linhas) == 0
+    assert Publication.query.count() == 0
+
+
+def _item(hash_):
+    return dict(ITEM_SEM_HASH, hash=hash_, texto=f'Texto {hash_}')
+
+
+def test_notificacao_traz_so_as_publicacoes_novas(user, monkeypatch):
+    outro = User(username='joao', email='joao@example.com')
+    db.session.add(outro)
+    db.session.commit()
+    user_id, outro_id = user.id, outro.id
+
+    itens = [_item('h1'), _item('h2')]
+    enviados = {}
+    monkeypatch.setattr(comunicapje_service, 'iterar_comunicacoes', lambda params, limitador: iter(itens))
+    monkeypatch.setattr(comunicapje_service, 'baixar_certidoes', lambda hashes, pasta, limitador=None: {})
+    monkeypatch.setattr(
+        comunicapje_service, 'enviar_email_notificacao',
+        lambda assunto, corpo, destinatario, anexos=None: enviados.update({destinatario: (assunto, corpo.read())})
+    )
+    dia = date(2024, 5, 10)
+    alvo = {'oab_number': '123', 'oab_uf': 'SP', 'target_str': 'SP123',
+            'assinantes': [{'user_id': user_id, 'email': 'maria@example.com'}]}
+
+    assert _processar_janela(alvo, dia, dia, None) == (2, 2)
+    assert enviados['maria@example.com'][0] == 'JurisAlerta: 2 Novas Publicações para SP123'
+
+    # O mesmo dia é consultado de novo, com um item e um assinante a mais
+    enviados.clear()
+    itens.append(_item('h3'))
+    alvo['assinantes'].append({'user_id': outro_id, 'email': 'joao@example.com'})
+
+    assert _processar_janela(alvo, dia, dia, None) == (3, 4)
+    assunto, corpo = enviados['maria@example.com']
+    assert assunto == 'JurisAlerta: 1 Novas Publicações para SP123'
+    assert 'Texto h3' in corpo and 'Texto h1' not in corpo
+    assert enviados['joao@example.com'][0] == 'JurisAlerta: 3 Novas Publicações para SP123'
+
+    # Nada novo: nenhum email
+    enviados.clear()
+    assert _processar_janela(alvo, dia, dia, None) == (3, 0)
+    assert enviados == {}
+
+
+def test_falha_inesperada_em_um_alvo_nao_interrompe_os_demais(user, monkeypatch):
+    db.session.add_all([
+        SearchTarget(user_id=user.id, oab_uf='SP', oab_number='111'),
+        SearchTarget(user_id=user.id, oab_uf='SP', oab_number='222'),
+    ])
+    db.session.commit()
+
+    def iterar(params, limitador):
+        if params['numeroOab'] == '111':
+            raise KeyError('items')
+        return iter([_item('h1')])
+
+    monkeypatch.setattr(comunicapje_service, 'iterar_comunicacoes', iterar)
+    monkeypatch.setattr(comunicapje_service, 'baixar_certidoes', lambda hashes, pasta, limitador=None: {})
+
+    resumo = comunicapje_service.run_daily_searches(max_workers=2)
+
+    assert resumo['processadas'] == 2
+    assert resumo['novas'] == 1
+    assert resumo['erros'] == [{'alvo': 'SP111', 'erro': "'items'"}]
+    sincronizados = dict(db.session.query(SearchTarget.oab_number, SearchTarget.last_synced_date))
+    assert sincronizados == {'111': None, '222': date.today() - timedelta(days=1)}
+
+
+def test_limitador_respeita_o_limite_de_cada_host(monkeypatch):
+    lock = threading.Lock()
+    ativas, maximo = Counter(), Counter()
+
+    def get(url, **kwargs):
+        host = urlparse(url).netloc
+        with lock:
+            ativas[host] += 1
+            maximo[host] = max(maximo[host], ativas[host])
+        time.sleep(0.02)
+        with lock:
+            ativas[host] -= 1
+
+    monkeypatch.setattr(comunicapje_service.gateway, 'get', get)
+    limitador = LimitadorPorHost(2)
+    urls = ['https://a.jus.br/api'] * 8 + ['https://b.jus.br/api'] * 8
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(limitador.get, urls))
+
+    assert maximo == {'a.jus.br': 2, 'b.jus.br': 2}
+
+
+def test_alvos_da_mesma_oab_viram_uma_unica_consulta(user):
+    outro = User(username='joao', email='joao@example.com')
+    db.session.add(outro)
+    db.session.commit()
+    user_id, outro_id = user.id, outro.id
+    db.session.add_all([
+        SearchTarget(user_id=user_id, oab_uf='sp', oab_number='012.345'),
+        SearchTarget(user_id=outro_id, oab_uf='SP', oab_number='12345'),
+        SearchTarget(user_id=user_id, oab_uf='SP', oab_number=' 12345 '),
+        SearchTarget(user_id=outro_id, oab_uf='RJ', oab_number='12345'),
+        SearchTarget(user_id=outro_id, oab_uf='SP', oab_number='999', is_active=False),
+    ])
+    db.session.commit()
+
+    alvos, total_alvos = _carregar_alvos(date.today())
+
+    assert normalizar_oab(' sp', '012.345') == ('SP', '12345')
+    assert total_alvos == 4
+    grupos = {alvo['target_str']: alvo for alvo in alvos}
+    assert sorted(grupos) == ['RJ12345', 'SP12345']
+    assert len(grupos['SP12345']['target_ids']) == 3
+    assert [assinante['user_id'] for assinante in grupos['SP12345']['assinantes']] == [user_id, outro_id]
+
+
+class _Resposta:
+    def __init__(self, corpo):
+        self.corpo = corpo
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.corpo
+
+
+class _LimitadorFalso:
+    """Devolve as páginas informadas e registra quais foram pedidas"""
+
+    def __init__(self, paginas, count):
+        self.paginas = paginas
+        self.count = count
+        self.pedidas = []
+
+    def get(self, url, params=None, **kwargs):
+        pagina = params['pagina']
+        self.pedidas.append(pagina)
+        items = self.paginas[pagina - 1] if pagina <= len(self.paginas) else []
+        return _Resposta({'count': self.count, 'items': items})
+
+
+def test_paginas_sao_pedidas_conforme_os_itens_sao_consumidos():
+    limitador = _LimitadorFalso([[1, 2], [3, 4], [5]], count=5)
+    itens = iterar_comunicacoes({'numeroOab': '123'}, limitador)
+
+    assert next(itens) == 1
+    assert limitador.pedidas == [1]
+    assert list(itens) == [2, 3, 4, 5]
+    assert limitador.pedidas == [1, 2, 3]
+
+
+def test_pagina_vazia_antes_do_total_nao_e_descartada_em_silencio():
+    limitador = _LimitadorFalso([[1, 2], [3]], count=6)
+    recebidos = []
+
+    with pytest.raises(PaginacaoIncompletaError):
+        for item in iterar_comunicacoes({'numeroOab': '123'}, limitador):
+            recebidos.append(item)
+
+    assert recebidos == [1, 2, 3]
+    assert limitador.pedidas == [1, 2, 3]
@@ -0,0 +1,52 @@
+from flask import Flask
+
+from src.routes.datajud import datajud_bp
+from src.services.datajud_service import DataJudService
+
+
+def _service(pages, monkeypatch):
+    service = DataJudService()
+    calls = []
+
+    def search_processes(page=1, size=10, **filters):
+        calls.append(page)
+        return {'data': pages[page - 1] if page <= len(pages) else []}
+
+    monkeypatch.setattr(service, 'search_processes', search_processes)
+    return service, calls
+
+
+def test_short_pages_do_not_end_the_stream(monkeypatch):
+    # O upstream limita a página a 2 itens, abaixo do size pedido
+    service, calls = _service([[1, 2], [3, 4], [5]], monkeypatch)
+
+    assert list(service.iter_processes(size=10)) == [1, 2, 3, 4, 5]
+    assert calls == [1, 2, 3, 4]
+
+
+def test_stream_stops_at_max_results_or_total(monkeypatch):
+    service, calls = _service([[1, 2], [3, 4], [5]], monkeypatch)
+    assert list(service.iter_processes(size=2, max_results=3)) == [1, 2, 3]
+    assert calls == [1, 2]
+
+    service = DataJudService()
+    calls = []
+
+    def search_processes(page=1, size=10, **filters):
+        calls.append(page)
+        return {'hits': {'total': {'value': 3}, 'hits': [[1, 2], [3]][page - 1]}}
+
+    monkeypatch.setattr(service, 'search_processes', search_processes)
+    assert list(service.iter_processes(size=2)) == [1, 2, 3]
+    assert calls == [1, 2]
+
+
+def test_stream_rejects_max_results_below_one():
+    app = Flask(__name__)
+    app.register_blueprint(datajud_bp, url_prefix='/api')
+    client = app.test_client()
+
+    for value in ('0', '-1'):
+        response = client.get(f'/api/datajud/processes/search?stream=1&max_results={value}')
+        assert response.status_code == 400
+        assert response.get_json()['error'] is True
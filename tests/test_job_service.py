@@ -0,0 +1,32 @@
+import time
+
+from src.models.search_job import JobLease, SearchJob
+from src.models.user import db
+from src.services import job_service
+
+
+def test_lease_is_renewed_while_a_long_run_reports_no_progress(app, monkeypatch):
+    monkeypatch.setattr(job_service, 'LEASE_HEARTBEAT_SECONDS', 0.05)
+    job = SearchJob(status='queued')
+    db.session.add(job)
+    db.session.flush()
+    assert job_service._acquire_lease(job_service.DAILY_SEARCH_LEASE, job.id)
+    db.session.commit()
+    job_id = job.id
+    acquired_until = db.session.get(JobLease, job_service.DAILY_SEARCH_LEASE).expires_at
+
+    renewed = {}
+
+    def long_run(**kwargs):
+        # Um único alvo demorado: nenhum progresso é reportado
+        time.sleep(0.3)
+        db.session.expire_all()
+        renewed['expires_at'] = db.session.get(JobLease, job_service.DAILY_SEARCH_LEASE).expires_at
+
+    monkeypatch.setattr(job_service, 'run_daily_searches', long_run)
+    job_service._run_daily_search_job(app, job_id, None, None)
+
+    assert renewed['expires_at'] > acquired_until
+    db.session.expire_all()
+    assert db.session.get(SearchJob, job_id).status == 'completed'
+    assert db.session.get(JobLease, job_service.DAILY_SEARCH_LEASE).job_id is None
@@ -0,0 +1,29 @@
+from sqlalchemy import text
+
+from src.models.migrations import upgrade_schema
+from src.models.search_config import SearchConfig
+from src.models.user import db
+
+
+def _legacy_config(user_id, name, keywords):
+    db.session.execute(text(
+        "INSERT INTO search_config (user_id, name, keywords, is_active) VALUES (:user_id, :name, :keywords, 1)"
+    ), {'user_id': user_id, 'name': name, 'keywords': keywords})
+    db.session.commit()
+
+
+def test_legacy_terms_are_migrated_once(app, user):
+    user_id = user.id
+    _legacy_config(user_id, 'Antiga', 'Acórdão, penhora,acórdão')
+    upgrade_schema()
+    db.session.expire_all()
+
+    config = SearchConfig.query.one()
+    assert config.get_keywords_list() == ['Acórdão', 'penhora']
+    assert config.keywords is None
+
+    # Com search_config_term preenchida, a varredura das colunas antigas não roda mais
+    _legacy_config(user_id, 'Escrita por versão antiga', 'sentença')
+    upgrade_schema()
+    db.session.expire_all()
+    assert SearchConfig.query.filter_by(name='Escrita por versão antiga').one().keywords == 'sentença'
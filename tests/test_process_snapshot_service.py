@@ -0,0 +1,41 @@
+from sqlalchemy import text
+
+from src.models.process_snapshot import ProcessSnapshot
+from src.models.user import db
+from src.services.process_snapshot_service import get_changes, refresh_process
+
+PROCESSO = '0001234-56.2024.8.26.0100'
+
+
+class FakeDataJud:
+    def __init__(self, *movements):
+        self.movements = list(movements)
+
+    def get_process_movements(self, processo_id):
+        return {'movimentos': self.movements}
+
+
+def test_refresh_records_only_new_movements(app):
+    datajud = FakeDataJud({'nome': 'Distribuição', 'dataHora': '2024-01-01'})
+    assert refresh_process(datajud, PROCESSO)['total_movements'] == 1
+
+    datajud.movements.append({'nome': 'Citação', 'dataHora': '2024-02-01'})
+    result = refresh_process(datajud, PROCESSO)
+
+    assert (result['new_count'], result['total_movements']) == (1, 2)
+    assert ProcessSnapshot.query.one().movement_count == 2
+    assert get_changes(PROCESSO)['count'] == 2
+
+
+def test_refresh_upserts_a_snapshot_created_concurrently(app):
+    # Outra requisição criou o snapshot entre a consulta e a gravação desta
+    db.session.execute(text(
+        "INSERT INTO process_snapshot (process_number, movement_count) VALUES (:number, 0)"
+    ), {'number': PROCESSO})
+    db.session.commit()
+
+    result = refresh_process(FakeDataJud({'nome': 'Distribuição'}), PROCESSO)
+
+    assert result['total_movements'] == 1
+    snapshot = ProcessSnapshot.query.one()
+    assert snapshot.movement_count == 1 and snapshot.last_refreshed_at is not None
@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from src.models.migrations import upgrade_schema
+from src.models.publication import Publication, PublicationArchive, PublicationCounter
+from src.models.user import db
+from src.services.publication_archive_service import archive_publications
+
+OLD = datetime.utcnow() - timedelta(days=400)
+
+
+def _publication(user, index, **values):
+    values.setdefault('publication_date', OLD)
+    publication = Publication(user_id=user.id, title=f'Publicação {index}',
+                              source_hash=f'hash-{index}', **values)
+    db.session.add(publication)
+    db.session.commit()
+    return publication
+
+
+def test_archived_ids_are_not_reused(app, client, user):
+    first = _publication(user, 1).id
+    second = _publication(user, 2).id
+
+    assert archive_publications(older_than_days=90)['archived'] == 2
+    assert Publication.query.count() == 0
+
+    # Com a tabela vazia, o SQLite sem AUTOINCREMENT voltaria a gerar o id 1
+    third = _publication(user, 3).id
+    assert third > second
+
+    response = client.get(f'/api/publications/{first}?include_archived=true')
+    assert response.status_code == 200
+    assert response.get_json()['title'] == 'Publicação 1'
+
+    # O próximo arquivamento não colide com os ids já arquivados
+    assert archive_publications(older_than_days=90)['archived'] == 1
+    assert {p.id for p in PublicationArchive.query} == {first, second, third}
+
+
+def test_archive_keeps_counters(app, user):
+    _publication(user, 1)
+    _publication(user, 2, is_read=True)
+
+    archive_publications(older_than_days=90)
+
+    counter = PublicationCounter.query.filter_by(user_id=user.id).one()
+    assert (counter.total, counter.unread) == (2, 1)
+
+
+def test_upgrade_rebuilds_publication_with_autoincrement(app, user):
+    _publication(user, 1)
+    _publication(user, 2)
+    archive_publications(older_than_days=90)
+    user_id = user.id
+    db.session.remove()
+
+    # Tabela no formato antigo, sem AUTOINCREMENT
+    with db.engine.begin() as connection:
+        connection.execute(text('DROP TABLE publication'))
+        connection.execute(text(
+            'CREATE TABLE publication (id INTEGER NOT NULL PRIMARY KEY, user_id INTEGER NOT NULL,'
+            ' title VARCHAR(500) NOT NULL, content TEXT, tribunal VARCHAR(100),'
+            ' publication_date DATETIME, source_url VARCHAR(500), process_number VARCHAR(100),'
+            ' source_hash VARCHAR(64), is_read BOOLEAN, created_at DATETIME)'
+        ))
+        connection.execute(text(
+            "INSERT INTO publication (id, user_id, title, source_hash) VALUES (1, :user_id, 'Antiga', 'h')"
+        ), {'user_id': user_id})
+
+    upgrade_schema()
+
+    sql = db.session.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'publication'")
+    ).scalar()
+    assert 'AUTOINCREMENT' in sql
+    assert Publication.query.one().title == 'Antiga'
+    # A sequência parte do maior id arquivado
+    publication = Publication(user_id=user_id, title='Nova', source_hash='nova')
+    db.session.add(publication)
+    db.session.commit()
+    assert publication.id == 3
+
+
+def test_archive_drops_hot_duplicate_of_archived_hash(app, user):
+    _publication(user, 1)
+    archive_publications(older_than_days=90)
+    # Gravada de novo por um caminho que não consultou o arquivo morto
+    _publication(user, 1)
+
+    assert archive_publications(older_than_days=90)['archived'] == 1
+    assert Publication.query.count() == 0
+    assert PublicationArchive.query.count() == 1
+    counter = PublicationCounter.query.filter_by(user_id=user.id).one()
+    assert (counter.total, counter.unread) == (1, 1)
+
+
+def test_mutations_reach_archived_publications(app, client, user):
+    first = _publication(user, 1).id
+    _publication(user, 2)
+    _publication(user, 3)
+    archive_publications(older_than_days=90)
+
+    assert client.put(f'/api/publications/{first}/read').status_code == 200
+    response = client.post('/api/publications/bulk/read', json={'user_id': user.id, 'ids': [first + 1]})
+    assert response.get_json() == {'updated': 1}
+    assert client.delete(f'/api/publications/{first + 2}').status_code == 204
+
+    counter = PublicationCounter.query.filter_by(user_id=user.id).one()
+    assert (counter.total, counter.unread) == (2, 0)
+
+    response = client.post('/api/publications/bulk/delete', json={'user_id': user.id, 'ids': [first]})
+    assert response.get_json() == {'deleted': 1}
+    assert client.put(f'/api/publications/{first}/unread').status_code == 404
+
+
+def test_search_and_match_reach_archived_publications(app, client, user):
+    user_id = user.id
+    archived = _publication(user, 1, content='Penhora de bens do executado').id
+    _publication(user, 2, content='Penhora on-line', publication_date=datetime.utcnow())
+    archive_publications(older_than_days=90)
+
+    response = client.get(f'/api/publications/user/{user_id}/search?q=penhora&include_total=1')
+    assert response.get_json()['total'] == 1
+
+    response = client.get(f'/api/publications/user/{user_id}/search?q=penhora&include_total=1&include_archived=1')
+    body = response.get_json()
+    assert body['total'] == 2
+    assert archived in [publication['id'] for publication in body['publications']]
+
+    client.post('/api/search-configs', json={'user_id': user_id, 'name': 'Penhora', 'keywords': ['penhora']})
+    response = client.post('/api/search-configs/match', json={'publication_id': archived})
+    assert response.status_code == 200
+    assert len(response.get_json()['matches']) == 1
+    assert client.post('/api/search-configs/match', json={'publication_id': archived + 100}).status_code == 404
@@ -0,0 +1,83 @@
+import json
+
+from src.models.publication import Publication
+from src.models.user import db
+from src.routes import publication as publication_routes
+from src.services.publication_ingest_service import insert_publications
+from src.services.publication_search_service import search_publications
+
+
+def _publications(user, count, **values):
+    for index in range(count):
+        db.session.add(Publication(user_id=user.id, title=f'Publicação {index}',
+                                   source_hash=f'hash-{index}', **values))
+    db.session.commit()
+
+
+def test_is_read_filter_only_accepts_json_booleans(client, user):
+    _publications(user, 2, is_read=False)
+
+    response = client.post('/api/publications/bulk/read', json={'user_id': user.id, 'filter': {'is_read': 'false'}})
+    assert response.status_code == 400
+
+    response = client.post('/api/publications/bulk/read', json={'user_id': user.id, 'filter': {'is_read': False}})
+    assert response.get_json() == {'updated': 2}
+
+
+def test_bulk_delete_with_empty_filter_requires_all(client, user):
+    _publications(user, 3)
+
+    for body in ({'user_id': user.id, 'filter': {}}, {'user_id': user.id, 'filter': {'is_read': None}}):
+        assert client.post('/api/publications/bulk/delete', json=body).status_code == 400
+    assert Publication.query.count() == 3
+
+    response = client.post('/api/publications/bulk/delete', json={'user_id': user.id, 'all': True})
+    assert response.get_json() == {'deleted': 3}
+
+
+def test_ingest_rejects_non_boolean_is_read(client, user):
+    response = client.post('/api/publications/bulk', json=[
+        {'user_id': user.id, 'title': 'A', 'is_read': 'false', 'source_hash': 'a'},
+        {'user_id': user.id, 'title': 'B', 'is_read': True, 'source_hash': 'b'},
+    ])
+
+    body = response.get_json()
+    assert (body['inserted'], body['errors']) == (1, [{'index': 0, 'error': 'is_read deve ser true ou false'}])
+    assert Publication.query.one().is_read is True
+
+
+def test_ndjson_ingest_streams_lines_and_enforces_the_limit(client, user, monkeypatch):
+    lines = [json.dumps({'user_id': user.id, 'title': f'P{i}', 'source_hash': f'h{i}'}) for i in range(3)]
+    body = '\n'.join(lines[:1] + ['{quebrado'] + lines[1:]) + '\n'
+
+    response = client.post('/api/publications/bulk', data=body, content_type='application/x-ndjson')
+    result = response.get_json()
+    assert (result['received'], result['inserted']) == (4, 3)
+    assert result['errors'] == [{'index': 1, 'error': 'JSON inválido'}]
+
+    monkeypatch.setattr(publication_routes, 'INGEST_MAX_ROWS', 2)
+    response = client.post('/api/publications/bulk', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 413
+    assert Publication.query.count() == 3
+
+
+def test_insert_publications_maps_generated_ids_back_to_the_rows(app, user):
+    user_id = user.id
+    db.session.add(Publication(user_id=user_id, title='Antiga', source_hash='b'))
+    db.session.commit()
+
+    inserted = insert_publications([
+        {'user_id': user_id, 'title': 'Sem hash 1', 'content': 'primeira', 'source_hash': None},
+        {'user_id': user_id, 'title': 'Com hash', 'content': 'segunda', 'source_hash': 'a'},
+        {'user_id': user_id, 'title': 'Repetida', 'content': 'terceira', 'source_hash': 'b'},
+        {'user_id': user_id, 'title': 'Repetida no lote', 'content': 'quarta', 'source_hash': 'a'},
+        {'user_id': user_id, 'title': 'Sem hash 2', 'content': 'quinta', 'source_hash': None},
+    ], chunk_size=3)
+    db.session.commit()
+
+    assert [row['title'] for row in inserted] == ['Sem hash 1', 'Com hash', 'Sem hash 2']
+    for row in inserted:
+        assert db.session.get(Publication, row['id']).title == row['title']
+    [result] = search_publications(user_id, 'quinta')['results']
+    assert result['title'] == 'Sem hash 2'
+    assert search_publications(user_id, 'quarta')['results'] == []
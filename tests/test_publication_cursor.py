@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from src.models.publication import Publication
+from src.models.user import db
+
+BASE = datetime(2024, 1, 1)
+
+
+def test_cursor_pages_cover_every_publication_once(app, client, user):
+    user_id = user.id
+    # Dois pares com o mesmo created_at: o id desempata
+    for index, minutes in enumerate([0, 1, 1, 2, 3, 3, 4]):
+        db.session.add(Publication(user_id=user_id, title=f'Publicação {index}',
+                                   source_hash=f'h{index}', created_at=BASE + timedelta(minutes=minutes)))
+    db.session.commit()
+    expected = [p.id for p in Publication.query.order_by(Publication.created_at.desc(),
+                                                          Publication.id.desc())]
+
+    seen, cursor = [], ''
+    while True:
+        body = client.get(f'/api/publications/user/{user_id}?limit=3&cursor={cursor}').get_json()
+        seen += [p['id'] for p in body['publications']]
+        if not body['has_more']:
+            assert body['next_cursor'] is None
+            break
+        cursor = body['next_cursor']
+
+    assert seen == expected
+
+
+def test_invalid_cursor_is_rejected(app, client, user):
+    response = client.get(f'/api/publications/user/{user.id}?cursor=nao-e-um-cursor')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Cursor inválido'}
+
+
+def test_cursor_pages_reach_publications_without_created_at(app, client, user):
+    user_id = user.id
+    for index in range(5):
+        db.session.add(Publication(user_id=user_id, title=f'Publicação {index}', source_hash=f'h{index}',
+                                   created_at=BASE + timedelta(minutes=index)))
+    db.session.commit()
+    # Linhas antigas, gravadas fora do ORM, podem não ter created_at
+    db.session.execute(Publication.__table__.update().values(created_at=None)
+                       .where(Publication.title.in_(['Publicação 2', 'Publicação 3', 'Publicação 4'])))
+    db.session.commit()
+    expected = [p.id for p in Publication.query.order_by(Publication.created_at.desc(),
+                                                          Publication.id.desc())]
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        response = client.get(f'/api/publications/user/{user_id}?limit=2&cursor={cursor}')
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [p['id'] for p in body['publications']]
+        cursor = body['next_cursor']
+
+    assert seen == expected
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from src.models.publication import Publication
+from src.models.user import db, User
+from src.routes import publication as publication_routes
+from src.services.publication_archive_service import archive_publications
+
+LONG_CONTENT = 'Intimação da parte autora para manifestação em 15 dias. ' * 20
+TODAY = datetime.utcnow().replace(microsecond=0)
+
+
+def _publications(user):
+    other = User(username='joao', email='joao@example.com')
+    db.session.add(other)
+    db.session.commit()
+    rows = [
+        Publication(user_id=user.id, title='Antiga', tribunal='TJSP', content=LONG_CONTENT,
+                    publication_date=datetime(2024, 1, 10), source_hash='a'),
+        Publication(user_id=user.id, title='Recente', tribunal='TJSP', content=LONG_CONTENT,
+                    publication_date=TODAY, source_hash='b'),
+        Publication(user_id=user.id, title='Lida', tribunal='TJRJ', content='curta',
+                    publication_date=TODAY, is_read=True, source_hash='c'),
+        Publication(user_id=other.id, title='De outro', tribunal='TJSP',
+                    publication_date=TODAY, source_hash='d'),
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    ids = [row.id for row in rows[:3]]
+    archive_publications(older_than_days=90)
+    return ids
+
+
+def _ndjson(client, user_id, query=''):
+    response = client.get(f'/api/publications/user/{user_id}/export?{query}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_export_streams_every_batch(app, client, user, monkeypatch):
+    user_id = user.id
+    archived, recent, read = _publications(user)
+    monkeypatch.setattr(publication_routes, 'EXPORT_BATCH_SIZE', 1)
+
+    rows = _ndjson(client, user_id)
+    assert [row['id'] for row in rows] == [recent, read]
+    assert rows[0]['content'] == LONG_CONTENT
+    assert rows[0]['publication_date'] == TODAY.isoformat()
+
+    # O arquivo morto vem depois das publicações recentes
+    rows = _ndjson(client, user_id, 'include_archived=1&include_content=false')
+    assert [row['id'] for row in rows] == [recent, read, archived]
+    assert all('content' not in row for row in rows)
+
+
+def test_csv_export_applies_the_filters(app, client, user):
+    user_id = user.id
+    archived, recent, _ = _publications(user)
+
+    response = client.get(
+        f'/api/publications/user/{user_id}/export?format=csv&tribunal=TJSP&is_read=false&include_archived=1'
+    )
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == f'attachment; filename=publications_{user_id}.csv'
+    header, *rows = csv.reader(io.StringIO(response.get_data(as_text=True)))
+    assert header == publication_routes.EXPORT_COLUMNS
+    assert [int(row[0]) for row in rows] == [recent, archived]
+    assert rows[1][header.index('content')] == LONG_CONTENT
+
+    date_from = (TODAY - timedelta(days=1)).isoformat()
+    rows = _ndjson(client, user_id, f'include_archived=1&date_from={date_from}&tribunal=TJSP')
+    assert [row['id'] for row in rows] == [recent]
+
+
+def test_export_rejects_unknown_format_and_bad_dates(app, client, user):
+    user_id = user.id
+
+    assert client.get(f'/api/publications/user/{user_id}/export?format=xml').status_code == 400
+    assert client.get(f'/api/publications/user/{user_id}/export?date_from=ontem').status_code == 400
+    assert client.get('/api/publications/user/999/export').status_code == 404
@@ -0,0 +1,107 @@
+import sqlite3
+
+from sqlalchemy import text
+
+from src.models.publication import Publication
+from src.models.user import db, User
+from src.services.comunicapje_service import _salvar_publicacoes
+from src.services.publication_ingest_service import ingest_publications
+from src.services.publication_search_service import index_new_publications, search_publications
+
+LONG_CONTENT = 'Acórdão proferido nos autos da apelação cível. ' * 20
+
+
+def _search(user_id, query):
+    return [result['id'] for result in search_publications(user_id, query)['results']]
+
+
+def test_orm_and_bulk_inserts_are_searchable(app, user):
+    user_id = user.id
+    publication = Publication(user_id=user.id, title='Intimação', content=LONG_CONTENT, source_hash='orm')
+    db.session.add(publication)
+    db.session.commit()
+
+    ingest_publications([{'user_id': user.id, 'title': 'Despacho', 'content': 'prazo de embargos',
+                          'source_hash': 'ingest'}])
+    _salvar_publicacoes([{'user_id': user.id, 'title': 'Sentença', 'content': 'julgo procedente',
+                          'source_hash': 'robo'}])
+
+    assert _search(user_id, 'acordao') == [publication.id]
+    assert len(_search(user_id, 'embargos')) == 1
+    assert len(_search(user_id, 'procedente')) == 1
+
+
+def test_writes_outside_the_app_do_not_need_app_functions(app, user):
+    publication = Publication(user_id=user.id, title='Intimação', content=LONG_CONTENT, source_hash='a')
+    db.session.add(publication)
+    db.session.commit()
+    publication_id, user_id = publication.id, user.id
+    db.session.remove()
+
+    # Conexão sem nenhuma função registrada pela aplicação, como a do sqlite3
+    connection = sqlite3.connect(db.engine.url.database)
+    connection.execute(
+        "INSERT INTO publication (user_id, title, content, source_hash) VALUES (?, 'Edital de leilão', 'bens', 'cli')",
+        (user_id,)
+    )
+    connection.commit()
+    connection.close()
+
+    # Inserções externas entram no índice na próxima gravação em lote da aplicação
+    index_new_publications()
+    db.session.commit()
+    assert len(_search(user_id, 'leilao')) == 1
+
+    connection = sqlite3.connect(db.engine.url.database)
+    connection.execute("DELETE FROM publication WHERE id = ?", (publication_id,))
+    connection.commit()
+    connection.close()
+
+    assert _search(user_id, 'intimacao') == []
+
+
+def test_index_does_not_keep_a_copy_of_the_text(app, user):
+    user_id = user.id
+    ingest_publications([{'user_id': user_id, 'title': 'Despacho', 'content': LONG_CONTENT,
+                          'source_hash': 'copy'}])
+
+    stored = db.session.execute(text('SELECT title, content FROM publication_fts')).all()
+
+    assert stored == [(None, None)]
+    [result] = search_publications(user_id, 'apelacao civel')['results']
+    assert result['title_highlight'] == 'Despacho'
+    # Trecho de 16 palavras começando duas antes da primeira ocorrência
+    assert result['snippet'] == (
+        '…autos da <mark>apelação</mark> <mark>cível</mark>. Acórdão proferido nos '
+        'autos da <mark>apelação</mark> <mark>cível</mark>. Acórdão proferido nos autos da…'
+    )
+
+
+def test_highlights_escape_the_source_text(app, user):
+    user_id = user.id
+    db.session.add(Publication(user_id=user_id, title='<script>alert(1)</script> Acórdão',
+                               content='<img src=x onerror=alert(1)> acórdão', source_hash='xss'))
+    db.session.commit()
+
+    [result] = search_publications(user_id, 'acordao')['results']
+
+    assert result['title_highlight'] == '&lt;script&gt;alert(1)&lt;/script&gt; <mark>Acórdão</mark>'
+    assert result['snippet'] == '&lt;img src=x onerror=alert(1)&gt; <mark>acórdão</mark>'
+
+
+def test_search_only_reaches_the_users_own_publications(app, user):
+    other = User(username='joao', email='joao@example.com')
+    db.session.add(other)
+    db.session.commit()
+    user_id, other_id = user.id, other.id
+    ingest_publications([
+        {'user_id': other_id, 'title': 'Sentença', 'content': 'julgo procedente', 'source_hash': f'o{i}'}
+        for i in range(5)
+    ] + [{'user_id': user_id, 'title': 'Sentença', 'content': 'julgo procedente', 'source_hash': 'm'}])
+
+    result = search_publications(user_id, 'procedente', include_total=True)
+
+    assert result['total'] == 1
+    assert search_publications(other_id, 'procedente', include_total=True)['total'] == 5
+    # O token do dono não é pesquisável como texto
+    assert search_publications(user_id, f'u{user_id}', include_total=True)['total'] == 0
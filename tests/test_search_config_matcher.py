@@ -0,0 +1,143 @@
+import json
+
+from src.models.publication import Publication, PublicationMatch
+from src.models.search_config import SearchConfig
+from src.models.user import db, User
+from src.services import search_config_matcher
+from src.services.comunicapje_service import _salvar_publicacoes
+from src.services.publication_archive_service import archive_publications
+from src.services.publication_ingest_service import ingest_publications
+from src.services.search_config_matcher import KeywordAutomaton, get_matcher
+from src.utils.text import normalize
+
+
+def test_automaton_finds_whole_words_only():
+    automaton = KeywordAutomaton(['acordao', 'embargos de declaracao', 'cao'])
+
+    assert automaton.find('o acordao rejeitou os embargos de declaracao') == {
+        'acordao', 'embargos de declaracao'
+    }
+    # "cao" aparece dentro de "declaracao", mas não como palavra
+    assert automaton.find('embargos de declaracao') == {'embargos de declaracao'}
+    assert automaton.find('acordaos') == set()
+
+
+def test_automaton_overlapping_patterns():
+    automaton = KeywordAutomaton(['ab', 'abc', 'bc', 'c'])
+
+    assert automaton.find('abc') == {'abc'}
+    assert automaton.find('ab c') == {'ab', 'c'}
+    assert len(automaton) == 4 and 'bc' in automaton
+
+
+def test_normalize_word_by_word_keeps_the_whole_text_result():
+    # Acentos soltos (´) viram espaço + acento combinante, e ligaduras viram duas letras
+    assert normalize('  Acórdão\u00a0DE  a´b ﬁm  ̀ Straße ') == 'acordao de a b fim strasse'
+
+
+def _config(user_id, keywords, tribunals=(), name='Alerta'):
+    config = SearchConfig(user_id=user_id, name=name)
+    config.set_terms('keyword', keywords)
+    config.set_terms('tribunal', list(tribunals))
+    db.session.add(config)
+    db.session.commit()
+    return config
+
+
+def test_matcher_reloads_when_configs_change_in_the_database(app, user):
+    config = _config(user.id, ['Acórdão'])
+    assert [m['config_id'] for m in get_matcher().match('Acordão publicado')] == [config.id]
+
+    # Outro worker altera a configuração: só o carimbo no banco avisa este processo
+    config.set_terms('keyword', ['sentença'])
+    db.session.commit()
+    assert get_matcher().match('Acordão publicado') == []
+    assert get_matcher().match('sentenca publicada')[0]['matched_keywords'] == ['sentenca']
+
+    db.session.delete(config)
+    db.session.commit()
+    assert get_matcher().match('sentenca publicada') == []
+    assert len(search_config_matcher.matcher) == 0
+
+
+def test_ingest_paths_record_matches_for_the_owner_only(app, user):
+    other = User(username='joao', email='joao@example.com')
+    db.session.add(other)
+    db.session.commit()
+    mine = _config(user.id, ['penhora'], tribunals=['TJSP']).id
+    _config(other.id, ['penhora'])
+
+    ingest_publications([{'user_id': user.id, 'title': 'Despacho', 'content': 'Defiro a penhora.',
+                          'tribunal': 'TJSP', 'source_hash': 'a'}])
+    _salvar_publicacoes([{'user_id': user.id, 'title': 'Penhora', 'content': None,
+                          'tribunal': 'TJRJ', 'source_hash': 'b'}])
+
+    [match] = PublicationMatch.query.all()
+    assert match.config_id == mine
+    assert json.loads(match.matched_keywords) == ['penhora']
+    assert db.session.get(Publication, match.publication_id).source_hash == 'a'
+
+
+def test_config_publications_survive_archiving(app, client, user):
+    config_id = _config(user.id, ['penhora']).id
+    ingest_publications([{'user_id': user.id, 'title': 'Despacho', 'content': 'Defiro a penhora.',
+                          'publication_date': '2020-01-01', 'source_hash': 'a'}])
+    archive_publications(older_than_days=90)
+
+    body = client.get(f'/api/search-configs/{config_id}/publications').get_json()
+    assert [p['source_hash'] for p in body['publications']] == ['a']
+    assert body['publications'][0]['archived'] is True
+
+    client.delete(f'/api/search-configs/{config_id}')
+    assert PublicationMatch.query.count() == 0
+
+
+def test_process_type_is_looked_up_in_the_title_during_ingest(app, user):
+    config_id = _config(user.id, ['penhora']).id
+    config = db.session.get(SearchConfig, config_id)
+    config.set_terms('process_type', ['Execução'])
+    db.session.commit()
+
+    ingest_publications([
+        {'user_id': user.id, 'title': 'Execução Fiscal 0001', 'content': 'Defiro a penhora.', 'source_hash': 'a'},
+        {'user_id': user.id, 'title': 'Cumprimento de Sentença', 'content': 'Defiro a penhora.', 'source_hash': 'b'},
+    ])
+
+    [match] = PublicationMatch.query.all()
+    assert match.config_id == config_id
+    assert db.session.get(Publication, match.publication_id).source_hash == 'a'
+
+
+def test_matcher_updates_only_what_changed(app, user):
+    first = _config(user.id, ['penhora'])
+    second = _config(user.id, ['arresto'], name='Outro')
+    current = get_matcher()
+    automaton = current._automaton
+
+    # Só o filtro de tribunal mudou: as palavras-chave são as mesmas e o autômato fica
+    first.set_terms('tribunal', ['TJSP'])
+    db.session.commit()
+    assert get_matcher()._automaton is automaton
+    assert current.match('penhora', tribunal='TJRJ') == []
+    assert [m['config_id'] for m in current.match('penhora', tribunal='TJSP')] == [first.id]
+
+    second.is_active = False
+    db.session.commit()
+    assert get_matcher()._automaton is not automaton
+    assert current.match('arresto') == []
+    assert len(current) == 1
+
+
+def test_match_is_limited_to_the_given_owners(app, user):
+    other = User(username='joao', email='joao@example.com')
+    db.session.add(other)
+    db.session.commit()
+    _config(user.id, ['penhora'])
+    other_config = _config(other.id, ['arresto'])
+
+    assert get_matcher().match('penhora e arresto', user_ids=[user.id])[0]['user_id'] == user.id
+    assert [m['config_id'] for m in get_matcher().match('penhora e arresto', user_ids=[other.id])] == [other_config.id]
+    assert get_matcher().match('sem termos', user_ids=[user.id, other.id]) == []
+    # O pré-filtro aceita o fim de palavra; o autômato confere a palavra inteira
+    assert get_matcher().match('a xpenhora', user_ids=[user.id]) == []
+    assert len(get_matcher().match('a xpenhora, penhora', user_ids=[user.id])) == 1
@@ -0,0 +1,130 @@
+import pytest
+import requests
+
+from src.services import upstream
+from src.services.upstream import CircuitBreaker, CircuitOpenError, TokenBucket, UpstreamGateway
+
+URL = 'https://api.example.test/items'
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Devolve (ou levanta) os resultados na ordem em que foram configurados"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(upstream.time, 'sleep', lambda seconds: None)
+
+
+def _open_breaker(gateway, reset_timeout=0):
+    breaker = gateway._host(URL).breaker
+    breaker.reset_timeout = reset_timeout
+    for _ in range(breaker.failure_threshold):
+        breaker.on_failure()
+    assert breaker.state == 'open'
+    return breaker
+
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+    breaker.on_failure()
+    assert breaker.state == 'closed'
+    breaker.on_failure()
+    assert breaker.state == 'open'
+
+    assert breaker.allow() is True   # chamada de teste
+    assert breaker.state == 'half_open'
+    assert breaker.allow() is False  # só uma por vez
+    breaker.on_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() is True
+
+
+def test_half_open_probe_with_non_connection_error_reopens_and_recovers():
+    gateway = UpstreamGateway(max_retries=0)
+    breaker = _open_breaker(gateway)
+
+    session = FakeSession(requests.exceptions.ChunkedEncodingError('truncado'), FakeResponse(200))
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        gateway.get(URL, session=session)
+    assert breaker.state == 'open'
+
+    # Passado o reset_timeout, uma nova chamada de teste é liberada e fecha o circuito
+    assert gateway.get(URL, session=session).status_code == 200
+    assert breaker.state == 'closed'
+
+
+def test_half_open_probe_with_unexpected_error_releases_probe():
+    gateway = UpstreamGateway(max_retries=0)
+    breaker = _open_breaker(gateway)
+
+    session = FakeSession(RuntimeError('bug'), FakeResponse(200))
+    with pytest.raises(RuntimeError):
+        gateway.get(URL, session=session)
+
+    assert gateway.get(URL, session=session).status_code == 200
+    assert breaker.state == 'closed'
+
+
+def test_open_breaker_rejects_without_calling_upstream():
+    gateway = UpstreamGateway(max_retries=0)
+    _open_breaker(gateway, reset_timeout=3600)
+    session = FakeSession(FakeResponse(200))
+
+    with pytest.raises(CircuitOpenError):
+        gateway.get(URL, session=session)
+    assert session.calls == 0
+
+
+def test_retryable_status_is_retried_and_discarded_response_closed():
+    gateway = UpstreamGateway(max_retries=2)
+    failed = FakeResponse(503)
+    session = FakeSession(failed, FakeResponse(200))
+
+    response = gateway.get(URL, session=session)
+
+    assert response.status_code == 200
+    assert session.calls == 2
+    assert failed.closed
+
+
+def test_last_retryable_response_is_returned_open():
+    gateway = UpstreamGateway(max_retries=1)
+    session = FakeSession(FakeResponse(502), FakeResponse(502))
+
+    response = gateway.get(URL, session=session)
+
+    assert response.status_code == 502
+    assert not response.closed
+
+
+def test_token_bucket_halves_rate_on_throttle_and_grows_on_success():
+    bucket = TokenBucket(rate=8, capacity=4, min_rate=1, max_rate=9)
+    bucket.on_throttle()
+    assert bucket.rate == 4
+    bucket.on_success()
+    assert bucket.rate == pytest.approx(4.1)
+    for _ in range(3):
+        bucket.on_throttle()
+    assert bucket.rate == 1